@@ -0,0 +1,174 @@
+# cache_loader.py
+
+import os
+import sqlite3
+import threading
+import time
+import traceback
+
+from cache_store import CacheStore
+
+
+class CacheLoader:
+    """
+    Открывает кэш в фоновом потоке, чтобы окно появлялось сразу.
+
+    Готовность отслеживается по плейлистам: база открывается за миллисекунды,
+    а долгим бывает только однократный перенос старого cache.json. Во время
+    переноса каждый плейлист становится доступен сразу после своей транзакции,
+    и плейлист, который ждет пользователь, переносится вне очереди.
+    """
+
+    def __init__(self, db_path: str, legacy_json_path: str):
+        self.db_path = db_path
+        self.legacy_json_path = legacy_json_path
+        self.store = None
+        self.load_seconds = None
+
+        self._cond = threading.Condition()
+        self._opened = False
+        self._finished = False
+        self._pending = set()  # плейлисты, которые еще переносятся из JSON
+        self._wanted = []      # плейлисты, которые нужно перенести вне очереди
+        self._thread = None
+
+        # Колбэки вызываются из фонового потока
+        self.on_playlist_ready = None  # (playlist_id или None для всей базы)
+        self.on_finished = None
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._run, name='cache-loader', daemon=True)
+        self._thread.start()
+
+    # --- Фоновая загрузка ---
+
+    def _open_store(self) -> CacheStore:
+        try:
+            return CacheStore(self.db_path)
+        except sqlite3.DatabaseError as e:
+            print(f"Ошибка при открытии базы кэша: {e}. Кэш будет сброшен.")
+            if os.path.exists(self.db_path):
+                os.replace(self.db_path, self.db_path + '.broken')
+            return CacheStore(self.db_path)
+
+    def _run(self):
+        started_at = time.perf_counter()
+        failed = False
+        try:
+            self._load()
+        except Exception as e:
+            failed = True
+            print(f"Ошибка при загрузке кэша: {e}")
+            traceback.print_exc()
+        finally:
+            # Что бы ни случилось, ожидающие потоки не должны зависнуть
+            with self._cond:
+                if self.store is None:
+                    print("Кэш будет работать в памяти до перезапуска приложения.")
+                    self.store = CacheStore(':memory:')
+                self._opened = True
+                self._finished = True
+                self._pending.clear()
+                self._wanted.clear()
+                self._cond.notify_all()
+            self.load_seconds = time.perf_counter() - started_at
+        if failed:
+            self._notify(None)
+        if self.on_finished:
+            self.on_finished()
+
+    def _load(self):
+        store = self._open_store()
+
+        legacy = None
+        if store.needs_migration(self.legacy_json_path):
+            legacy = store.read_legacy_json(self.legacy_json_path)
+
+        with self._cond:
+            self.store = store
+            self._opened = True
+            if legacy is not None:
+                self._pending = set(legacy[0])
+            self._cond.notify_all()
+        self._notify(None)
+
+        if legacy is not None:
+            self._migrate(store, *legacy)
+
+    def _migrate(self, store: CacheStore, playlists: dict, tracks: dict):
+        migrated_track_ids = set()
+        while True:
+            with self._cond:
+                playlist_id = self._next_pending()
+            if playlist_id is None:
+                break
+            entry = playlists[playlist_id]
+            store.import_playlist(playlist_id, entry, tracks)
+            migrated_track_ids.update(entry.get('track_ids', []))
+            with self._cond:
+                self._pending.discard(playlist_id)
+                self._cond.notify_all()
+            self._notify(playlist_id)
+
+        store.finish_migration(self.legacy_json_path, {
+            track_id: track for track_id, track in tracks.items() if track_id not in migrated_track_ids})
+        print(
+            f"Кэш перенесен из {self.legacy_json_path} в SQLite: "
+            f"{len(playlists)} плейлистов, {len(tracks)} треков.")
+
+    def _next_pending(self) -> str | None:
+        while self._wanted:
+            playlist_id = self._wanted.pop()
+            if playlist_id in self._pending:
+                return playlist_id
+        return next(iter(self._pending), None)
+
+    def _notify(self, playlist_id):
+        if self.on_playlist_ready:
+            self.on_playlist_ready(playlist_id)
+
+    # --- Готовность ---
+
+    def is_finished(self) -> bool:
+        with self._cond:
+            return self._finished
+
+    def wait_finished(self, timeout: float) -> bool:
+        """Ждет завершения загрузки не дольше timeout секунд."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._finished, timeout)
+
+    def is_playlist_ready(self, playlist_id: str) -> bool:
+        with self._cond:
+            return self._opened and playlist_id not in self._pending
+
+    def prioritize(self, playlist_id: str):
+        """Просит перенести плейлист следующим."""
+        with self._cond:
+            if playlist_id in self._pending:
+                self._wanted.append(playlist_id)
+
+    def wait_store(self) -> CacheStore:
+        """Ждет открытия базы (без переноса старого кэша)."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._opened)
+            return self.store
+
+    def wait_for_playlist(self, playlist_id: str, cancellation_check=None) -> CacheStore:
+        """Ждет, пока в базе появится нужный плейлист (в рабочих потоках)."""
+        self.prioritize(playlist_id)
+        return self._wait(lambda: self._opened and playlist_id not in self._pending,
+                          cancellation_check)
+
+    def wait_until_loaded(self, cancellation_check=None) -> CacheStore:
+        """Ждет полной загрузки кэша (в рабочих потоках)."""
+        return self._wait(lambda: self._finished, cancellation_check)
+
+    def _wait(self, predicate, cancellation_check=None) -> CacheStore:
+        with self._cond:
+            while not predicate():
+                if cancellation_check and cancellation_check():
+                    raise InterruptedError("Операция отменена.")
+                self._cond.wait(timeout=0.2)
+            return self.store
@@ -0,0 +1,893 @@
+# cache_store.py
+
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+
+from packed_ids import KEY_TYPECODE, TrackIdTable, count_duplicates, dedup, pack, to_bitmap, unpack
+from track_record import TrackRecord
+
+SCHEMA_VERSION = 3
+
+# Изменения копятся в открытой транзакции и фиксируются пачкой:
+# не реже раза в COMMIT_INTERVAL секунд или каждые COMMIT_MAX_OPS операций.
+# При сбое теряется только незафиксированный хвост.
+COMMIT_INTERVAL = 2.0
+COMMIT_MAX_OPS = 200
+# Как часто журнал WAL переносится в основной файл и обрезается
+CHECKPOINT_INTERVAL = 60.0
+
+# Бюджет кэша треков. В памяти держатся недавно использованные записи
+# (ограничение по числу и по примерному объему), в базе - не больше
+# TRACK_STORE_MAX_ENTRIES треков. Лишние вытесняются по давности
+# использования (LRU); треки, входящие в плейлисты из кэша, закреплены.
+TRACK_MEMORY_MAX_ENTRIES = 20000
+TRACK_MEMORY_MAX_BYTES = 16 * 1024 * 1024
+TRACK_STORE_MAX_ENTRIES = 100000
+# После вытеснения в базе остается эта доля бюджета, чтобы не чистить на каждом треке
+EVICTION_LOW_WATER = 0.9
+# Как часто проверяется бюджет базы и записываются отметки использования
+EVICTION_INTERVAL = 300.0
+
+# Поля трека, у которых есть своя колонка; остальные хранятся в extra (JSON)
+TRACK_COLUMNS = ('name', 'artist', 'album', 'cover_url', 'cover_path')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS playlists (
+    id TEXT PRIMARY KEY,
+    snapshot_id TEXT,
+    extra TEXT,
+    members BLOB
+);
+CREATE TABLE IF NOT EXISTS track_keys (
+    key INTEGER PRIMARY KEY,
+    track_id TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS tracks (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    artist TEXT,
+    album TEXT,
+    cover_url TEXT,
+    cover_path TEXT,
+    extra TEXT,
+    last_used REAL
+);
+CREATE INDEX IF NOT EXISTS idx_tracks_missing_cover
+    ON tracks(id) WHERE cover_url IS NOT NULL AND cover_path IS NULL;
+"""
+
+# Индексы по колонкам, которых может не быть в базе до обновления схемы
+_INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_tracks_last_used ON tracks(last_used);
+"""
+
+# SQLite ограничивает число параметров в одном запросе
+_SQL_BATCH = 500
+
+
+def _chunks(items: list, size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class CacheStore:
+    """
+    Кэш плейлистов и треков в SQLite вместо одного большого cache.json.
+    Изменения записываются по отдельности (upsert), а строки читаются только
+    тогда, когда к ним обращаются.
+
+    База работает в режиме WAL: каждое изменение дописывается в журнал,
+    а не переписывает файл. Фиксация откладывается и выполняется пачками
+    фоновым потоком, периодический checkpoint переносит журнал в основной
+    файл и обрезает его.
+
+    Для остального кода кэш выглядит как два словаря: playlists и tracks.
+    Треки возвращаются компактными записями TrackRecord. Значения - копии
+    строк: чтобы изменить трек, его нужно присвоить заново (track_cache[tid] = track)
+    или изменить отдельные поля через tracks.set_fields().
+
+    Кэш можно использовать из нескольких рабочих потоков одновременно.
+    Соединение с базой защищено одной блокировкой, а кэш треков в памяти,
+    таблица ID и счетчики - своими, поэтому чтение из памяти не ждет записи.
+    Несколько изменений внутри одного with store.transaction() применяются
+    атомарно; read_view() дает согласованное чтение нескольких значений.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.RLock()
+        # Глубина вложенных транзакций и новые ключи ID, записанные на каждом уровне
+        self._depth = 0
+        self._new_keys = []
+        # Таблица ключей менялась не только добавлением (очистка, удаление
+        # неиспользуемых ключей) с последней фиксации
+        self._keys_rewritten = False
+        # Транзакциями управляем сами (BEGIN/SAVEPOINT/COMMIT)
+        self._conn = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode = WAL')
+        self._conn.execute('PRAGMA synchronous = NORMAL')
+        self._conn.execute('PRAGMA foreign_keys = ON')
+        self._conn.executescript(_SCHEMA)
+        self._conn.execute(
+            "INSERT OR IGNORE INTO meta (key, value) VALUES ('schema_version', ?)",
+            (str(SCHEMA_VERSION),))
+
+        # Глобальная таблица ID треков: состав плейлистов хранится массивами ключей
+        self.track_ids = TrackIdTable()
+        self.track_ids.load(self._conn.execute(
+            'SELECT key, track_id FROM track_keys'))
+
+        self._pending_ops = 0
+        self._pending_since = None
+        self._last_checkpoint = time.monotonic()
+        self._last_eviction = time.monotonic()
+        self._stats = {'ops': 0, 'commits': 0, 'checkpoints': 0}
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(
+            target=self._flush_loop, name='cache-flusher', daemon=True)
+        self._flusher.start()
+
+        self.playlists = PlaylistCacheView(self)
+        self.tracks = TrackCacheView(self)
+        self._upgrade_schema()
+        self._conn.executescript(_INDEXES)
+
+    def _upgrade_schema(self):
+        """Обновляет базу, созданную предыдущими версиями приложения."""
+        version = int(self.get_meta('schema_version') or SCHEMA_VERSION)
+        if version >= SCHEMA_VERSION:
+            return
+        if version < 2:
+            # v1 -> v2: строки playlist_tracks превращаются в упакованные массивы ключей
+            with self.transaction() as conn:
+                columns = [row[1] for row in conn.execute(
+                    'PRAGMA table_info(playlists)')]
+                if 'members' not in columns:
+                    conn.execute('ALTER TABLE playlists ADD COLUMN members BLOB')
+                playlist_ids = [row[0] for row in conn.execute(
+                    'SELECT id FROM playlists')]
+                for playlist_id in playlist_ids:
+                    track_ids = [row[0] for row in conn.execute(
+                        'SELECT track_id FROM playlist_tracks WHERE playlist_id = ? ORDER BY position',
+                        (playlist_id,))]
+                    conn.execute('UPDATE playlists SET members = ? WHERE id = ?',
+                                 (self.playlists._pack(conn, track_ids), playlist_id))
+                conn.execute('DROP TABLE IF EXISTS playlist_tracks')
+        if version < 3:
+            # v2 -> v3: отметка последнего использования трека для вытеснения
+            with self.transaction() as conn:
+                columns = [row[1] for row in conn.execute(
+                    'PRAGMA table_info(tracks)')]
+                if 'last_used' not in columns:
+                    conn.execute('ALTER TABLE tracks ADD COLUMN last_used REAL')
+                conn.execute('UPDATE tracks SET last_used = ?', (time.time(),))
+        self.set_meta('schema_version', str(SCHEMA_VERSION))
+        self.flush()
+        print(f"База кэша обновлена до версии {SCHEMA_VERSION}.")
+
+    # --- Низкоуровневый доступ ---
+
+    def execute(self, sql: str, params=()) -> list:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def transaction(self):
+        """
+        Контекстный менеджер для одной логической операции записи.
+        Операция атомарна (SAVEPOINT), но фиксируется отложенно вместе с соседними.
+        Транзакции могут быть вложенными: все изменения внутри внешнего блока
+        применяются вместе или не применяются вовсе.
+        """
+        return _Transaction(self)
+
+    @contextmanager
+    def read_view(self):
+        """
+        Согласованное чтение: пока выполняется блок, другие потоки не могут
+        изменить кэш, и все прочитанное относится к одному состоянию.
+        Запись при этом ждет, поэтому блок должен быть коротким.
+        """
+        with self._lock:
+            yield self
+
+    def upsert_playlist(self, playlist_id: str, entry: dict, tracks: dict):
+        """
+        Атомарно записывает плейлист вместе с информацией о его треках:
+        другие потоки не увидят плейлист без треков. Уже известные треки
+        не перезаписываются, чтобы не потерять cover_path.
+        """
+        with self.transaction():
+            self.tracks.add_missing(tracks.items())
+            self.playlists[playlist_id] = entry
+
+    def _rolled_back(self, new_keys: list):
+        """Возвращает память в соответствие с базой после отката операции."""
+        if self._keys_rewritten:
+            # Удаленные ключи могли вернуться - таблица перечитывается из базы
+            self.track_ids.reset(self._conn.execute(
+                'SELECT key, track_id FROM track_keys'))
+        elif new_keys:
+            self.track_ids.restore_unsaved(new_keys)
+        self.tracks._memory.clear()
+
+    def _clear_track_keys(self, conn):
+        """Удаляет все ключи ID: вызывается, когда в кэше не осталось плейлистов."""
+        conn.execute('DELETE FROM track_keys')
+        self._keys_rewritten = True
+        self.track_ids.reset()
+
+    def prune_track_keys(self) -> int:
+        """
+        Удаляет из таблицы ID ключи треков, которых нет ни в одном плейлисте
+        из кэша (плейлист удален или изменился, трек вытеснен). Освобожденные
+        ключи выдаются новым ID повторно. Возвращает число удаленных ключей.
+        """
+        with self.transaction() as conn:
+            return self._prune_track_keys(conn, self.playlists._referenced_keys(conn))
+
+    def _prune_track_keys(self, conn, referenced) -> int:
+        table = self.track_ids
+        unused = table.unused_keys(to_bitmap(referenced, table.key_limit()))
+        if not unused:
+            return 0
+        for batch in _chunks(unused, _SQL_BATCH):
+            placeholders = ','.join('?' * len(batch))
+            conn.execute(f'DELETE FROM track_keys WHERE key IN ({placeholders})', batch)
+        self._keys_rewritten = True
+        table.discard(unused)
+        return len(unused)
+
+    # --- Отложенная фиксация ---
+
+    def _after_write(self):
+        """Учитывает завершенную операцию; вызывается под блокировкой."""
+        self._pending_ops += 1
+        self._stats['ops'] += 1
+        if self._pending_since is None:
+            self._pending_since = time.monotonic()
+        if self._pending_ops >= COMMIT_MAX_OPS:
+            self._commit()
+
+    def _commit(self):
+        if self._depth:
+            # Внутри незавершенной операции фиксировать нельзя - она перестанет быть атомарной
+            return
+        if self._conn.in_transaction:
+            self._conn.execute('COMMIT')
+            self._stats['commits'] += 1
+        self._keys_rewritten = False
+        self._pending_ops = 0
+        self._pending_since = None
+
+    def flush(self):
+        """Немедленно фиксирует накопленные изменения."""
+        with self._lock:
+            self._commit()
+
+    def checkpoint(self):
+        """Переносит журнал WAL в основной файл базы и обрезает журнал."""
+        with self._lock:
+            self._commit()
+            self._conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            self._stats['checkpoints'] += 1
+            self._last_checkpoint = time.monotonic()
+
+    def _flush_loop(self):
+        while not self._closed.wait(COMMIT_INTERVAL / 4):
+            try:
+                with self._lock:
+                    if self._closed.is_set():
+                        return
+                    if self._pending_since is not None and \
+                            time.monotonic() - self._pending_since >= COMMIT_INTERVAL:
+                        self._commit()
+                if time.monotonic() - self._last_checkpoint >= CHECKPOINT_INTERVAL:
+                    self.checkpoint()
+                if time.monotonic() - self._last_eviction >= EVICTION_INTERVAL:
+                    self._last_eviction = time.monotonic()
+                    self.tracks.enforce_budget()
+            except sqlite3.Error as e:
+                print(f"Ошибка фоновой записи кэша: {e}")
+
+    def stats(self) -> dict:
+        """Счетчики: операций записи, фиксаций и checkpoint'ов."""
+        with self._lock:
+            return dict(self._stats)
+
+    def get_meta(self, key: str) -> str | None:
+        rows = self.execute('SELECT value FROM meta WHERE key = ?', (key,))
+        return rows[0][0] if rows else None
+
+    def set_meta(self, key: str, value: str):
+        with self.transaction() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, value))
+
+    def clear(self):
+        with self.transaction() as conn:
+            conn.execute('DELETE FROM playlists')
+            conn.execute('DELETE FROM tracks')
+            self._clear_track_keys(conn)
+            self.tracks._memory.clear()
+
+    def close(self):
+        """Фиксирует хвост изменений, обрезает журнал и закрывает базу."""
+        with self._lock:
+            if self._closed.is_set():
+                return
+            self.tracks.enforce_budget()
+            track_stats = self.tracks.stats()
+            self.checkpoint()
+            self._closed.set()
+            self._conn.close()
+        stats = self._stats
+        print(
+            f"Кэш: {stats['ops']} изменений записано за {stats['commits']} фиксаций, "
+            f"checkpoint'ов: {stats['checkpoints']}.")
+        print(format_track_stats(track_stats))
+
+    # --- Миграция ---
+
+    def needs_migration(self, json_path: str) -> bool:
+        return os.path.exists(json_path) and not self.get_meta('migrated_from_json')
+
+    def read_legacy_json(self, json_path: str) -> tuple[dict, dict] | None:
+        """Читает старый cache.json. Возвращает (плейлисты, треки) или None."""
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                cached_data = json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            print(f"Ошибка при чтении старого файла кэша: {e}. Миграция пропущена.")
+            return None
+        return cached_data.get('playlist_cache', {}), cached_data.get('track_cache', {})
+
+    def import_playlist(self, playlist_id: str, entry: dict, tracks: dict):
+        """Переносит один плейлист вместе с его треками одной транзакцией."""
+        playlist_tracks = [(track_id, tracks[track_id])
+                           for track_id in dict.fromkeys(entry.get('track_ids', []))
+                           if track_id in tracks]
+        with self.transaction() as conn:
+            self.tracks._upsert_many(conn, playlist_tracks)
+            self.playlists._upsert(conn, playlist_id, entry)
+
+    def finish_migration(self, json_path: str, tracks: dict):
+        """
+        Переносит оставшиеся треки, отмечает миграцию выполненной и
+        переименовывает старый файл в cache.json.migrated.
+        """
+        with self.transaction() as conn:
+            self.tracks._upsert_many(conn, tracks.items())
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_from_json', '1')")
+        # Старый файл убираем только после того, как перенос зафиксирован
+        self.flush()
+        os.replace(json_path, json_path + '.migrated')
+
+    def migrate_from_json(self, json_path: str) -> bool:
+        """Однократно переносит все данные из старого cache.json."""
+        if not self.needs_migration(json_path):
+            return False
+        legacy = self.read_legacy_json(json_path)
+        if legacy is None:
+            return False
+
+        playlists, tracks = legacy
+        migrated_track_ids = set()
+        for playlist_id, entry in playlists.items():
+            self.import_playlist(playlist_id, entry, tracks)
+            migrated_track_ids.update(entry.get('track_ids', []))
+        self.finish_migration(json_path, {
+            track_id: track for track_id, track in tracks.items() if track_id not in migrated_track_ids})
+        print(
+            f"Кэш перенесен из {json_path} в SQLite: "
+            f"{len(playlists)} плейлистов, {len(tracks)} треков.")
+        return True
+
+
+class _Transaction:
+    def __init__(self, store: CacheStore):
+        self.store = store
+
+    def __enter__(self):
+        store = self.store
+        store._lock.acquire()
+        try:
+            conn = store._conn
+            if not conn.in_transaction:
+                conn.execute('BEGIN')
+            conn.execute(f'SAVEPOINT cache_op_{store._depth}')
+        except BaseException:
+            store._lock.release()
+            raise
+        store._depth += 1
+        store._new_keys.append([])
+        return conn
+
+    def __exit__(self, exc_type, exc, tb):
+        store = self.store
+        conn = store._conn
+        store._depth -= 1
+        savepoint = f'cache_op_{store._depth}'
+        new_keys = store._new_keys.pop()
+        try:
+            if exc_type is None:
+                conn.execute(f'RELEASE {savepoint}')
+                if store._depth:
+                    # Ключи вложенной операции откатятся вместе с внешней
+                    store._new_keys[-1].extend(new_keys)
+                else:
+                    store._after_write()
+            else:
+                # Откатываем только эту операцию, накопленные соседние сохраняются
+                conn.execute(f'ROLLBACK TO {savepoint}')
+                conn.execute(f'RELEASE {savepoint}')
+                store._rolled_back(new_keys)
+        finally:
+            store._lock.release()
+        return False
+
+
+def _record_size(track: TrackRecord) -> int:
+    """
+    Примерный объем записи в памяти. Интернированные строки (исполнитель,
+    альбом, ссылка на обложку) общие для многих записей и не учитываются.
+    """
+    size = sys.getsizeof(track) + sys.getsizeof(track.id) + sys.getsizeof(track.name)
+    if isinstance(track.cover_path, str):
+        size += sys.getsizeof(track.cover_path)
+    if track.extra:
+        size += sys.getsizeof(track.extra) + sum(
+            sys.getsizeof(value) for value in track.extra.values())
+    return size
+
+
+def format_track_stats(stats: dict) -> str:
+    return (
+        f"Кэш треков: в базе {stats['stored']} (вытеснено {stats['store_evictions']}), "
+        f"в памяти {stats['entries']} записей, {stats['bytes'] / 1024 / 1024:.1f} МБ "
+        f"(вытеснено {stats['evictions']}); попаданий в память {stats['hit_ratio']:.0%}, "
+        f"в кэш {stats['store_hit_ratio']:.0%}.")
+
+
+class TrackMemoryCache:
+    """
+    Недавно использованные треки в памяти поверх базы. Ограничен и числом
+    записей, и примерным объемом; при переполнении вытесняются давно не
+    использованные записи (LRU). Хранит собственные экземпляры, наружу отдает копии.
+    """
+
+    def __init__(self, max_entries: int = TRACK_MEMORY_MAX_ENTRIES,
+                 max_bytes: int = TRACK_MEMORY_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # ID трека -> (запись, размер); порядок = порядок использования
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def get_many(self, track_ids) -> dict:
+        """Копии найденных записей {ID: запись}; учитывает попадания и промахи."""
+        found = {}
+        with self._lock:
+            entries = self._entries
+            for track_id in track_ids:
+                entry = entries.get(track_id)
+                if entry is None:
+                    self._stats['misses'] += 1
+                    continue
+                entries.move_to_end(track_id)
+                self._stats['hits'] += 1
+                found[track_id] = entry[0].copy()
+        return found
+
+    def contains(self, track_id: str) -> bool:
+        with self._lock:
+            return track_id in self._entries
+
+    def put_many(self, records):
+        with self._lock:
+            entries = self._entries
+            for record in records:
+                size = _record_size(record)
+                old = entries.pop(record.id, None)
+                if old is not None:
+                    self._bytes -= old[1]
+                entries[record.id] = (record, size)
+                self._bytes += size
+            while entries and (len(entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, (_, size) = entries.popitem(last=False)
+                self._bytes -= size
+                self._stats['evictions'] += 1
+
+    def discard_many(self, track_ids):
+        with self._lock:
+            for track_id in track_ids:
+                entry = self._entries.pop(track_id, None)
+                if entry is not None:
+                    self._bytes -= entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['bytes'] = self._bytes
+        return stats
+
+
+class TrackCacheView(MutableMapping):
+    """
+    Словарь {ID трека: данные трека} поверх таблицы tracks.
+
+    Перед базой стоит ограниченный кэш в памяти (TrackMemoryCache). Размер
+    самой базы тоже ограничен: enforce_budget() удаляет давно не
+    использованные треки, кроме тех, что входят в плейлисты из кэша, -
+    например, треки, встреченные только в разовом поиске.
+    """
+
+    _SELECT = 'SELECT id, name, artist, album, cover_url, cover_path, extra FROM tracks'
+
+    def __init__(self, store: CacheStore, max_stored: int = TRACK_STORE_MAX_ENTRIES):
+        self.store = store
+        self.max_stored = max_stored
+        self._memory = TrackMemoryCache()
+        self._stats_lock = threading.Lock()
+        # Отметки использования копятся в памяти и записываются при проверке бюджета
+        self._touched = {}
+        self._stats = {'store_hits': 0, 'not_found': 0, 'store_evictions': 0}
+
+    @staticmethod
+    def _row_to_track(row) -> TrackRecord:
+        extra = json.loads(row[6]) if row[6] else {}
+        return TrackRecord(row[0], *row[1:6], **extra)
+
+    @staticmethod
+    def _track_to_row(track_id: str, track: dict) -> tuple:
+        extra = {key: value for key, value in track.items()
+                 if key != 'id' and key not in TRACK_COLUMNS}
+        return (track_id, *(track.get(column) for column in TRACK_COLUMNS),
+                json.dumps(extra, ensure_ascii=False) if extra else None)
+
+    @staticmethod
+    def _insert_rows(conn, rows, on_conflict: str = 'REPLACE'):
+        now = time.time()
+        conn.executemany(
+            f'INSERT OR {on_conflict} INTO tracks '
+            '(id, name, artist, album, cover_url, cover_path, extra, last_used) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            ((*row, now) for row in rows))
+
+    def _upsert_many(self, conn, items) -> list[tuple]:
+        rows = [self._track_to_row(track_id, track) for track_id, track in items]
+        self._insert_rows(conn, rows)
+        return rows
+
+    def _write(self, items):
+        """Записывает треки и обновляет их копии в памяти в той же транзакции."""
+        with self.store.transaction() as conn:
+            rows = self._upsert_many(conn, items)
+            self._memory.put_many(self._row_to_track(row) for row in rows)
+
+    def _touch(self, track_ids):
+        now = time.time()
+        with self._stats_lock:
+            self._touched.update(dict.fromkeys(track_ids, now))
+
+    def __getitem__(self, track_id: str) -> TrackRecord:
+        tracks = self.get_many([track_id])
+        if not tracks:
+            raise KeyError(track_id)
+        return tracks[0]
+
+    def __setitem__(self, track_id: str, track: dict):
+        self._write([(track_id, track)])
+
+    def __delitem__(self, track_id: str):
+        with self.store.transaction() as conn:
+            if conn.execute('DELETE FROM tracks WHERE id = ?', (track_id,)).rowcount == 0:
+                raise KeyError(track_id)
+            self._memory.discard_many([track_id])
+
+    def __contains__(self, track_id) -> bool:
+        if self._memory.contains(track_id):
+            return True
+        return bool(self.store.execute('SELECT 1 FROM tracks WHERE id = ?', (track_id,)))
+
+    def __iter__(self):
+        for (track_id,) in self.store.execute('SELECT id FROM tracks'):
+            yield track_id
+
+    def __len__(self) -> int:
+        return self.store.execute('SELECT COUNT(*) FROM tracks')[0][0]
+
+    def values(self) -> list[TrackRecord]:
+        """Все треки одним запросом (без отдельного запроса на каждый ID)."""
+        rows = self.store.execute(self._SELECT)
+        return [self._row_to_track(row) for row in rows]
+
+    def update(self, other=(), **kwargs):
+        """Добавляет/обновляет много треков в одной транзакции."""
+        items = list(other.items() if hasattr(other, 'items') else other)
+        items.extend(kwargs.items())
+        if items:
+            self._write(items)
+
+    def clear(self):
+        with self.store.transaction() as conn:
+            conn.execute('DELETE FROM tracks')
+            self._memory.clear()
+
+    def add_missing(self, items) -> int:
+        """
+        Добавляет только треки, которых еще нет в кэше. Проверка и запись -
+        одна операция, поэтому параллельный поток не потеряет свои изменения.
+        Возвращает число добавленных треков.
+        """
+        rows = [self._track_to_row(track_id, track) for track_id, track in items]
+        if not rows:
+            return 0
+        with self.store.transaction() as conn:
+            changes_before = conn.total_changes
+            self._insert_rows(conn, rows, on_conflict='IGNORE')
+            return conn.total_changes - changes_before
+
+    def set_fields(self, track_id: str, **fields) -> bool:
+        """
+        Атомарно меняет отдельные поля трека (например, cover_path), не
+        перезаписывая остальные. Возвращает False, если трека нет в кэше.
+        """
+        unknown = set(fields).difference(TRACK_COLUMNS)
+        if unknown:
+            raise ValueError(f"Нельзя изменить поля трека: {', '.join(sorted(unknown))}")
+        assignments = ', '.join(f'{column} = ?' for column in fields)
+        with self.store.transaction() as conn:
+            updated = conn.execute(
+                f'UPDATE tracks SET {assignments} WHERE id = ?',
+                (*fields.values(), track_id)).rowcount
+            self._memory.discard_many([track_id])
+        return bool(updated)
+
+    def get_many(self, track_ids) -> list[TrackRecord]:
+        """Треки по списку ID в том же порядке; отсутствующие пропускаются."""
+        track_ids = list(track_ids)
+        unique_ids = set(track_ids)
+        found = self._memory.get_many(unique_ids)
+        rest = [track_id for track_id in unique_ids if track_id not in found]
+        loaded = []
+        if rest:
+            # Чтение из базы и запись в память - под блокировкой хранилища,
+            # чтобы параллельная запись не оставила в памяти старую версию
+            with self.store._lock:
+                for batch in _chunks(rest, _SQL_BATCH):
+                    placeholders = ','.join('?' * len(batch))
+                    rows = self.store.execute(
+                        f'{self._SELECT} WHERE id IN ({placeholders})', batch)
+                    loaded.extend(self._row_to_track(row) for row in rows)
+                self._memory.put_many(loaded)
+            for track in loaded:
+                found[track.id] = track.copy()
+        with self._stats_lock:
+            self._stats['store_hits'] += len(loaded)
+            self._stats['not_found'] += len(rest) - len(loaded)
+        self._touch(found)
+        return [found[track_id] for track_id in track_ids if track_id in found]
+
+    def missing(self, track_ids) -> list[str]:
+        """ID из списка, которых еще нет в кэше (в исходном порядке)."""
+        track_ids = list(track_ids)
+        unknown = [track_id for track_id in set(track_ids)
+                   if not self._memory.contains(track_id)]
+        known = set(track_ids).difference(unknown)
+        for batch in _chunks(unknown, _SQL_BATCH):
+            placeholders = ','.join('?' * len(batch))
+            known.update(row[0] for row in self.store.execute(
+                f'SELECT id FROM tracks WHERE id IN ({placeholders})', batch))
+        return [track_id for track_id in track_ids if track_id not in known]
+
+    def without_cover(self) -> list[TrackRecord]:
+        """Треки, у которых есть ссылка на обложку, но обложка еще не скачана."""
+        rows = self.store.execute(
+            f'{self._SELECT} WHERE cover_url IS NOT NULL AND cover_path IS NULL')
+        return [self._row_to_track(row) for row in rows]
+
+    # --- Бюджет и вытеснение ---
+
+    def enforce_budget(self) -> int:
+        """
+        Записывает отметки использования и, если треков в базе больше
+        max_stored, удаляет давно не использованные до EVICTION_LOW_WATER
+        от бюджета. Закрепленные треки не удаляются. В том же проходе из
+        таблицы ID удаляются ключи, на которые не ссылается ни один плейлист.
+        Возвращает число удаленных треков.
+        """
+        with self._stats_lock:
+            touched, self._touched = self._touched, {}
+        with self.store.transaction() as conn:
+            if touched:
+                conn.executemany(
+                    'UPDATE tracks SET last_used = ? WHERE id = ?',
+                    ((used_at, track_id) for track_id, used_at in touched.items()))
+            referenced = self.store.playlists._referenced_keys(conn)
+            pruned = self.store._prune_track_keys(conn, referenced)
+            if pruned:
+                print(f"Таблица ID треков: удалено {pruned} неиспользуемых ключей.")
+            stored = conn.execute('SELECT COUNT(*) FROM tracks').fetchone()[0]
+            if stored <= self.max_stored:
+                return 0
+
+            to_evict = stored - int(self.max_stored * EVICTION_LOW_WATER)
+            pinned = set(self.store.track_ids.decode(referenced))
+            victims = []
+            cursor = conn.execute('SELECT id FROM tracks ORDER BY last_used')
+            for (track_id,) in cursor:
+                if track_id not in pinned:
+                    victims.append(track_id)
+                    if len(victims) >= to_evict:
+                        break
+            cursor.close()
+            if not victims:
+                return 0
+            conn.executemany('DELETE FROM tracks WHERE id = ?',
+                             ((track_id,) for track_id in victims))
+            self._memory.discard_many(victims)
+
+        with self._stats_lock:
+            self._stats['store_evictions'] += len(victims)
+        print(
+            f"Кэш треков: вытеснено {len(victims)} давно не использованных треков "
+            f"(в базе было {stored}, закреплено {len(pinned)}).")
+        return len(victims)
+
+    def stats(self) -> dict:
+        """Размер кэша, вытеснения и доли попаданий (в память и в кэш в целом)."""
+        stats = self._memory.stats()
+        with self._stats_lock:
+            stats.update(self._stats)
+        stats['stored'] = len(self)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+        stats['store_hit_ratio'] = (
+            (stats['hits'] + stats['store_hits']) / lookups if lookups else 0.0)
+        return stats
+
+
+class PlaylistCacheView(MutableMapping):
+    """
+    Словарь {ID плейлиста: {'snapshot_id', 'track_ids', ...}} поверх таблицы
+    playlists. Состав плейлиста хранится упакованным массивом ключей из
+    глобальной таблицы ID треков; в список строк он превращается только при
+    обращении к плейлисту. members() отдает массив без преобразования.
+    """
+
+    def __init__(self, store: CacheStore):
+        self.store = store
+
+    @staticmethod
+    def _referenced_keys(conn) -> array:
+        """Ключи треков, входящих хотя бы в один плейлист из кэша (без повторов)."""
+        keys = array(KEY_TYPECODE)
+        for (members,) in conn.execute('SELECT members FROM playlists'):
+            keys.extend(unpack(members))
+        return dedup(keys)
+
+    def _pack(self, conn, track_ids) -> bytes:
+        """Кодирует ID в ключи и записывает новые ключи в ту же транзакцию."""
+        table = self.store.track_ids
+        keys = table.encode(track_ids)
+        new_pairs = table.take_unsaved()
+        if new_pairs:
+            # При откате операции пары вернутся в число несохраненных
+            self.store._new_keys[-1].extend(new_pairs)
+            conn.executemany(
+                'INSERT OR IGNORE INTO track_keys (key, track_id) VALUES (?, ?)', new_pairs)
+        return pack(keys)
+
+    def _upsert(self, conn, playlist_id: str, entry: dict):
+        extra = {key: value for key, value in entry.items()
+                 if key not in ('snapshot_id', 'track_ids')}
+        conn.execute(
+            'INSERT INTO playlists (id, snapshot_id, extra, members) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT(id) DO UPDATE SET snapshot_id = excluded.snapshot_id, '
+            'extra = excluded.extra, members = excluded.members',
+            (playlist_id, entry.get('snapshot_id'),
+             json.dumps(extra, ensure_ascii=False) if extra else None,
+             self._pack(conn, entry.get('track_ids', []))))
+
+    def __getitem__(self, playlist_id: str) -> dict:
+        # Ключи расшифровываются под той же блокировкой, под которой прочитаны:
+        # иначе их могли бы успеть освободить и выдать другим ID
+        with self.store.read_view():
+            rows = self.store.execute(
+                'SELECT snapshot_id, extra, members FROM playlists WHERE id = ?', (playlist_id,))
+            if not rows:
+                raise KeyError(playlist_id)
+            snapshot_id, extra, members = rows[0]
+            track_ids = self.store.track_ids.decode(unpack(members))
+        entry = json.loads(extra) if extra else {}
+        entry['snapshot_id'] = snapshot_id
+        entry['track_ids'] = track_ids
+        return entry
+
+    def members(self, playlist_id: str):
+        """Состав плейлиста массивом ключей (None, если плейлиста нет в кэше)."""
+        rows = self.store.execute(
+            'SELECT members FROM playlists WHERE id = ?', (playlist_id,))
+        return unpack(rows[0][0]) if rows else None
+
+    def contains_many(self, playlist_id: str, track_ids) -> list[bool] | None:
+        """
+        Для каждого ID - входит ли он в плейлист (None, если плейлиста нет в кэше).
+        Сравнение идет по ключам, состав плейлиста в строки не превращается.
+        """
+        with self.store.read_view():
+            members = self.members(playlist_id)
+            if members is None:
+                return None
+            table = self.store.track_ids
+            bitmap = to_bitmap(members, table.key_limit())
+            result = []
+            for track_id in track_ids:
+                key = table.key_of(track_id)
+                result.append(key is not None and key < len(bitmap) and bool(bitmap[key]))
+        return result
+
+    def count_duplicates(self, playlist_id: str) -> int | None:
+        """Число повторных вхождений треков в плейлисте (None, если его нет в кэше)."""
+        members = self.members(playlist_id)
+        return None if members is None else count_duplicates(members)
+
+    def __setitem__(self, playlist_id: str, entry: dict):
+        with self.store.transaction() as conn:
+            self._upsert(conn, playlist_id, entry)
+
+    def __delitem__(self, playlist_id: str):
+        with self.store.transaction() as conn:
+            if conn.execute('DELETE FROM playlists WHERE id = ?', (playlist_id,)).rowcount == 0:
+                raise KeyError(playlist_id)
+
+    def discard(self, playlist_id: str) -> bool:
+        """Удаляет плейлист, если он есть (без отдельной проверки и гонки с ней)."""
+        with self.store.transaction() as conn:
+            return conn.execute('DELETE FROM playlists WHERE id = ?', (playlist_id,)).rowcount > 0
+
+    def __contains__(self, playlist_id) -> bool:
+        return bool(self.store.execute('SELECT 1 FROM playlists WHERE id = ?', (playlist_id,)))
+
+    def __iter__(self):
+        for (playlist_id,) in self.store.execute('SELECT id FROM playlists'):
+            yield playlist_id
+
+    def __len__(self) -> int:
+        return self.store.execute('SELECT COUNT(*) FROM playlists')[0][0]
+
+    def clear(self):
+        with self.store.transaction() as conn:
+            conn.execute('DELETE FROM playlists')
+            self.store._clear_track_keys(conn)
+
+    def get_snapshot_id(self, playlist_id: str) -> str | None:
+        """snapshot_id без чтения списка треков."""
+        rows = self.store.execute(
+            'SELECT snapshot_id FROM playlists WHERE id = ?', (playlist_id,))
+        return rows[0][0] if rows else None
@@ -17,7 +17,9 @@ class ExportDialog(QDialog):
 
         format_layout = QHBoxLayout()
         self.format_combo = QComboBox()
-        self.format_combo.addItems(["CSV", "JSON", "TXT"])
+        for label, export_format in (("CSV", "csv"), ("JSON", "json"),
+                                     ("JSON Lines", "jsonl"), ("TXT", "txt")):
+            self.format_combo.addItem(label, export_format)
         format_layout.addWidget(self.format_combo)
         layout.addLayout(format_layout)
 
@@ -33,6 +35,12 @@ class ExportDialog(QDialog):
             csv_layout.addWidget(checkbox)
         layout.addWidget(self.csv_group)
 
+        self.json_group = QGroupBox("Настройки JSON")
+        json_layout = QVBoxLayout(self.json_group)
+        self.json_compact = QCheckBox("Компактный JSON (без отступов)")
+        json_layout.addWidget(self.json_compact)
+        layout.addWidget(self.json_group)
+
         self.txt_group = QGroupBox("Настройки TXT")
         txt_layout = QVBoxLayout(self.txt_group)
         self.txt_template = QLineEdit()
@@ -53,16 +61,19 @@ class ExportDialog(QDialog):
     def update_options_visibility(self, text):
         """Показывает или скрывает опции в зависимости от выбранного формата."""
         self.csv_group.setVisible(text == "CSV")
+        self.json_group.setVisible(text == "JSON")
         self.txt_group.setVisible(text == "TXT")
 
     def get_settings(self):
         """Возвращает выбранные пользователем настройки."""
         settings = {
-            "format": self.format_combo.currentText().lower()
+            "format": self.format_combo.currentData()
         }
         if settings["format"] == "csv":
             settings["columns"] = [
                 key for key, checkbox in self.csv_columns.items() if checkbox.isChecked()]
+        elif settings["format"] == "json":
+            settings["compact"] = self.json_compact.isChecked()
         elif settings["format"] == "txt":
             settings["template"] = self.txt_template.text()
         return settings
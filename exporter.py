@@ -3,45 +3,178 @@
 import csv
 import json
 
+# Поля трека, которые попадают в экспорт
+EXPORT_FIELDS = ['id', 'name', 'artist', 'album']
 
-def export_to_csv(track_data: list[dict], filename: str, fieldnames: list[str], **kwargs):
-    try:
-        with open(filename, 'w', newline='', encoding='utf-8-sig') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-            for track in track_data:
-                row_to_write = {key: track.get(key, "") for key in fieldnames}
-                writer.writerow(row_to_write)
-        print(f"Данные успешно экспортированы в {filename}")
-        return True
-    except Exception as e:
-        print(f"Ошибка при записи в CSV-файл: {e}")
-        return False
+# Как часто (в треках) сообщать о прогрессе и проверять отмену
+EXPORT_PROGRESS_STEP = 500
 
 
-def export_to_json(track_data: list[dict], filename: str, **kwargs):
-    try:
-        with open(filename, 'w', encoding='utf-8') as jsonfile:
-            json.dump(track_data, jsonfile, ensure_ascii=False, indent=4)
-        print(f"Данные успешно экспортированы в {filename}")
-        return True
-    except Exception as e:
-        print(f"Ошибка при записи в JSON-файл: {e}")
-        return False
+def iter_cached_tracks(track_ids, track_cache: dict, fields: list[str] = EXPORT_FIELDS):
+    """
+    Выдает записи для экспорта по одной, беря данные прямо из кэша треков.
+    Треки, которых нет в кэше, пропускаются.
+    """
+    for track_id in track_ids:
+        track = track_cache.get(track_id)
+        if track is None:
+            continue
+        yield {key: track.get(key, "") for key in fields}
+
+
+def _write_tracks(tracks, write_one, cancellation_check=None, progress_callback=None,
+                  total: int | None = None) -> int:
+    """Пишет треки по одному, периодически проверяя отмену и сообщая о прогрессе."""
+    count = 0
+    for track in tracks:
+        write_one(track)
+        count += 1
+        if count % EXPORT_PROGRESS_STEP == 0:
+            if cancellation_check and cancellation_check():
+                raise InterruptedError("Операция отменена.")
+            if progress_callback and total:
+                progress_callback(count, total)
+    if progress_callback and total:
+        progress_callback(count, total)
+    return count
+
+
+# Параметры открытия файла для каждого формата (кодировка, перевод строк)
+EXPORT_FILE_OPTIONS = {
+    'csv': {'encoding': 'utf-8-sig', 'newline': ''},
+    'json': {'encoding': 'utf-8', 'newline': None},
+    'jsonl': {'encoding': 'utf-8', 'newline': None},
+    'txt': {'encoding': 'utf-8', 'newline': None},
+}
+
+
+def write_csv(stream, track_data, fieldnames: list[str], cancellation_check=None,
+              progress_callback=None, total: int | None = None) -> int:
+    writer = csv.DictWriter(stream, fieldnames=fieldnames)
+    writer.writeheader()
+    return _write_tracks(
+        track_data,
+        lambda track: writer.writerow(
+            {key: track.get(key, "") for key in fieldnames}),
+        cancellation_check, progress_callback, total)
+
+
+def write_json(stream, track_data, compact: bool = False, cancellation_check=None,
+               progress_callback=None, total: int | None = None) -> int:
+    """
+    Пишет JSON-массив потоково, по одному треку. compact=True - без отступов
+    и пробелов; иначе вывод совпадает с json.dump(..., indent=4).
+    """
+    state = {'first': True}
+
+    def write_one(track):
+        if compact:
+            text = json.dumps(track, ensure_ascii=False, separators=(',', ':'))
+            prefix = '' if state['first'] else ','
+        else:
+            text = '    ' + json.dumps(
+                track, ensure_ascii=False, indent=4).replace('\n', '\n    ')
+            prefix = '\n' if state['first'] else ',\n'
+        stream.write(prefix + text)
+        state['first'] = False
 
+    stream.write('[')
+    count = _write_tracks(track_data, write_one,
+                          cancellation_check, progress_callback, total)
+    stream.write(']' if compact or state['first'] else '\n]')
+    return count
 
-def export_to_txt(track_data: list[dict], filename: str, template_string: str, **kwargs):
+
+def write_jsonl(stream, track_data, cancellation_check=None,
+                progress_callback=None, total: int | None = None) -> int:
+    """Пишет JSON Lines: по одному треку на строку."""
+    return _write_tracks(
+        track_data,
+        lambda track: stream.write(
+            json.dumps(track, ensure_ascii=False) + '\n'),
+        cancellation_check, progress_callback, total)
+
+
+def write_txt(stream, track_data, template_string: str, cancellation_check=None,
+              progress_callback=None, total: int | None = None) -> int:
+    def write_one(track):
+        try:
+            stream.write(template_string.format(**track) + '\n')
+        except KeyError as e:
+            print(f"В шаблоне указан неверный ключ: {e}. Пропуск строки.")
+
+    return _write_tracks(track_data, write_one,
+                         cancellation_check, progress_callback, total)
+
+
+def _export_to_file(filename: str, export_format: str, format_name: str, write_fn, *args, **kwargs):
     try:
-        with open(filename, 'w', encoding='utf-8') as txtfile:
-            for track in track_data:
-                try:
-                    line = template_string.format(**track) + '\n'
-                    txtfile.write(line)
-                except KeyError as e:
-                    print(
-                        f"В шаблоне указан неверный ключ: {e}. Пропуск строки.")
+        with open(filename, 'w', **EXPORT_FILE_OPTIONS[export_format]) as stream:
+            write_fn(stream, *args, **kwargs)
         print(f"Данные успешно экспортированы в {filename}")
         return True
+    except InterruptedError:
+        raise
     except Exception as e:
-        print(f"Ошибка при записи в TXT-файл: {e}")
+        print(f"Ошибка при записи в {format_name}-файл: {e}")
         return False
+
+
+def export_to_csv(track_data, filename: str, fieldnames: list[str], cancellation_check=None,
+                  progress_callback=None, total: int | None = None, **kwargs):
+    return _export_to_file(filename, 'csv', 'CSV', write_csv, track_data, fieldnames,
+                           cancellation_check, progress_callback, total)
+
+
+def export_to_json(track_data, filename: str, compact: bool = False, cancellation_check=None,
+                   progress_callback=None, total: int | None = None, **kwargs):
+    return _export_to_file(filename, 'json', 'JSON', write_json, track_data, compact,
+                           cancellation_check, progress_callback, total)
+
+
+def export_to_jsonl(track_data, filename: str, cancellation_check=None,
+                    progress_callback=None, total: int | None = None, **kwargs):
+    return _export_to_file(filename, 'jsonl', 'JSONL', write_jsonl, track_data,
+                           cancellation_check, progress_callback, total)
+
+
+def export_to_txt(track_data, filename: str, template_string: str, cancellation_check=None,
+                  progress_callback=None, total: int | None = None, **kwargs):
+    return _export_to_file(filename, 'txt', 'TXT', write_txt, track_data, template_string,
+                           cancellation_check, progress_callback, total)
+
+
+def write_cached_tracks(stream, track_ids: list[str], track_cache: dict, settings: dict,
+                        cancellation_check=None, progress_callback=None) -> int:
+    """
+    Пишет треки из кэша в открытый текстовый поток в выбранном формате.
+    settings - результат ExportDialog.get_settings(). Возвращает число треков.
+    """
+    export_format = settings['format']
+    fields = settings.get('columns') if export_format == 'csv' else EXPORT_FIELDS
+    tracks = iter_cached_tracks(track_ids, track_cache, fields)
+    options = {
+        'cancellation_check': cancellation_check,
+        'progress_callback': progress_callback,
+        'total': len(track_ids)
+    }
+
+    if export_format == 'csv':
+        return write_csv(stream, tracks, fields, **options)
+    elif export_format == 'json':
+        return write_json(stream, tracks, compact=settings.get('compact', False), **options)
+    elif export_format == 'jsonl':
+        return write_jsonl(stream, tracks, **options)
+    elif export_format == 'txt':
+        return write_txt(stream, tracks, settings['template'], **options)
+    raise ValueError(f"Неподдерживаемый формат экспорта: {export_format}")
+
+
+def export_cached_tracks(track_ids: list[str], track_cache: dict, filename: str, settings: dict,
+                         cancellation_check=None, progress_callback=None, **kwargs):
+    """Экспортирует треки из кэша в файл в выбранном формате."""
+    export_format = settings['format']
+    if export_format not in EXPORT_FILE_OPTIONS:
+        raise ValueError(f"Неподдерживаемый формат экспорта: {export_format}")
+    return _export_to_file(filename, export_format, export_format.upper(), write_cached_tracks,
+                           track_ids, track_cache, settings, cancellation_check, progress_callback)
@@ -0,0 +1,124 @@
+# http_session.py
+
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Сколько разных хостов держим в пуле (API, CDN обложек, проверка сети)
+POOL_CONNECTIONS = 10
+# Сколько соединений держим на один хост. Должно быть не меньше числа
+# потоков, которые параллельно ходят в API (страницы, пакеты треков, обложки).
+POOL_MAXSIZE = 16
+# Таймауты по умолчанию: (подключение, чтение) в секундах
+DEFAULT_TIMEOUT = (5, 15)
+
+# Адрес для проверки подключения к интернету (см. has_internet_connection)
+CONNECTIVITY_PROBE_URL = 'http://www.google.com'
+
+# Адрес API Spotify: запросы к нему идут через планировщик (см. request_scheduler.py)
+SPOTIFY_API_PREFIX = 'https://api.spotify.com/'
+
+_session = None
+_session_lock = threading.Lock()
+
+
+class PooledSession(requests.Session):
+    """
+    Сессия requests с общим пулом keep-alive соединений и таймаутом по умолчанию.
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT):
+        super().__init__()
+        self.timeout = timeout
+        self.headers['Connection'] = 'keep-alive'
+
+        # Повторы на уровне транспорта. POST не повторяется: при обрыве после
+        # отправки добавление могло уже выполниться, и повтор создаст дубликаты
+        retry = Retry(
+            total=3,
+            connect=None,
+            read=False,
+            allowed_methods=frozenset(['GET', 'HEAD', 'PUT', 'DELETE']),
+            status=3,
+            backoff_factor=0.3,
+            status_forcelist=(429, 500, 502, 503, 504),
+            respect_retry_after_header=True,
+        )
+        adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS,
+                              pool_maxsize=POOL_MAXSIZE, max_retries=retry)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+        # Проверка сети должна отвечать за один таймаут, без повторов и пауз
+        self.mount(CONNECTIVITY_PROBE_URL, HTTPAdapter(max_retries=0))
+
+    def request(self, method, url, **kwargs):
+        # spotipy передает свой таймаут явно, остальным вызовам подставляем наш
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        return super().request(method, url, **kwargs)
+
+
+def get_session() -> PooledSession:
+    """Возвращает общую для всего приложения HTTP-сессию (создается при первом вызове)."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = PooledSession()
+    return _session
+
+
+def mount_scheduler(scheduler, prefix: str = SPOTIFY_API_PREFIX, session=None):
+    """
+    Подключает планировщик запросов ко всем URL с указанным префиксом.
+    Префикс можно направить на локальный тестовый сервер.
+    """
+    from request_scheduler import ScheduledAdapter
+
+    session = session or get_session()
+    session.mount(prefix, ScheduledAdapter(
+        scheduler, pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE))
+
+
+def pool_stats() -> dict:
+    """
+    Возвращает статистику пулов соединений по хостам:
+    сколько соединений было открыто и сколько запросов через них прошло.
+    """
+    if _session is None:
+        return {}
+
+    stats = {}
+    seen_adapters = set()
+    for adapter in _session.adapters.values():
+        if id(adapter) in seen_adapters:
+            continue
+        seen_adapters.add(id(adapter))
+
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools[key]
+            host_stats = stats.setdefault(
+                f"{pool.scheme}://{pool.host}", {'connections': 0, 'requests': 0})
+            host_stats['connections'] += pool.num_connections
+            host_stats['requests'] += pool.num_requests
+
+    for host_stats in stats.values():
+        host_stats['reused'] = max(
+            0, host_stats['requests'] - host_stats['connections'])
+    return stats
+
+
+def print_pool_stats():
+    """Выводит статистику пулов в консоль, чтобы убедиться в переиспользовании соединений."""
+    stats = pool_stats()
+    if not stats:
+        print("HTTP-пул: запросов не было.")
+        return
+    for host, host_stats in stats.items():
+        print(
+            f"HTTP-пул {host}: запросов {host_stats['requests']}, "
+            f"открыто соединений {host_stats['connections']}, "
+            f"повторно использовано {host_stats['reused']}.")
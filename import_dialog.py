@@ -19,7 +19,7 @@ class ImportDialog(QDialog):
         file_group = QGroupBox("1. Выберите файл")
         file_layout = QHBoxLayout(file_group)
         self.filepath_edit = QLineEdit()
-        self.filepath_edit.setPlaceholderText("Путь к файлу .csv или .json")
+        self.filepath_edit.setPlaceholderText("Путь к файлу .csv, .json или .jsonl")
         self.filepath_edit.setReadOnly(True)
         self.browse_button = QPushButton("Обзор...")
         file_layout.addWidget(self.filepath_edit)
@@ -66,7 +66,7 @@ class ImportDialog(QDialog):
             self,
             "Выберите файл для импорта",
             "",
-            "CSV и JSON файлы (*.csv *.json)"
+            "CSV, JSON и JSON Lines файлы (*.csv *.json *.jsonl)"
         )
         if filename:
             self.filepath_edit.setText(filename)
@@ -0,0 +1,285 @@
+# import_journal.py
+
+import hashlib
+import json
+import os
+import threading
+
+from import_resolver import REASON_NOT_FOUND, resolve_queries
+from importer import iter_file
+from search_cache import normalize_query
+from spotify_client import PLAYLIST_WRITE_LIMIT, WriteBatchError
+
+IMPORT_JOURNAL_DIR = os.path.join('.app_cache', 'imports')
+
+
+class ImportJournal:
+    """
+    Журнал контрольных точек импорта. Записи дописываются в конец файла
+    (по одной JSON-строке), поэтому прерванный импорт можно продолжить:
+    найденные строки не ищутся заново, созданный плейлист не создается
+    повторно, а уже добавленные пакеты треков пропускаются.
+
+    Виды записей:
+      resolved - ответ на текстовый запрос (query, track_id);
+      target   - целевой плейлист (id, name);
+      plan     - окончательный список ID для добавления;
+      batch    - номер успешно добавленного пакета;
+      uncertain - пакет, ответ на который не получен: перед продолжением
+                  нужно проверить по плейлисту, был ли он добавлен.
+    """
+
+    def __init__(self, settings: dict, journal_dir: str = IMPORT_JOURNAL_DIR):
+        self.journal_dir = journal_dir
+        self.path = os.path.join(
+            journal_dir, f"{self.fingerprint(settings)}.jsonl")
+        self._lock = threading.Lock()
+        self._file = None  # открывается при первой записи и держится до close()
+
+        self.resolved = {}
+        self.target_id = None
+        self.target_name = None
+        self.plan = None
+        self._committed_batches = set()
+        self.uncertain_batches = set()
+
+    @staticmethod
+    def fingerprint(settings: dict) -> str:
+        """Ключ импорта: тот же источник с тем же содержимым и та же цель."""
+        if 'items' in settings:
+            # Вставленный текст: источник определяется самими строками
+            digest = hashlib.sha1(
+                '\n'.join(settings['items']).encode('utf-8')).hexdigest()
+            source = f"items|{digest}"
+        else:
+            filepath = os.path.abspath(settings['filepath'])
+            try:
+                stat = os.stat(filepath)
+                source = f"{filepath}|{stat.st_size}|{int(stat.st_mtime)}"
+            except OSError:
+                source = filepath
+        key = f"{source}|{settings.get('mode')}|{settings.get('target')}"
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    # --- Чтение ---
+
+    def load(self) -> bool:
+        """Восстанавливает состояние из файла. Возвращает True, если было что продолжать."""
+        if not os.path.exists(self.path):
+            return False
+
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Последняя строка могла оборваться при аварийном завершении
+                    continue
+                self._apply(record)
+
+        print(
+            f"Найден журнал прерванного импорта: {len(self.resolved)} найденных строк, "
+            f"добавлено пакетов: {len(self._committed_batches)}.")
+        return True
+
+    def _apply(self, record: dict):
+        kind = record.get('type')
+        if kind == 'resolved':
+            self.resolved[record['query']] = record.get('track_id')
+        elif kind == 'target':
+            self.target_id = record['id']
+            self.target_name = record.get('name')
+        elif kind == 'plan':
+            self.plan = record['track_ids']
+            # Новый план делает старые отметки о пакетах недействительными
+            self._committed_batches = set()
+            self.uncertain_batches = set()
+        elif kind == 'batch':
+            self._committed_batches.add(record['index'])
+            self.uncertain_batches.discard(record['index'])
+        elif kind == 'uncertain':
+            self.uncertain_batches.add(record['index'])
+
+    @property
+    def next_batch(self) -> int:
+        """Номер первого пакета, который еще не был добавлен."""
+        index = 0
+        while index in self._committed_batches:
+            index += 1
+        return index
+
+    # --- Запись ---
+
+    def _append(self, record: dict, durable: bool = False):
+        """
+        Дописывает запись в журнал. durable=True дожидается записи на диск -
+        нужно для отметок о выполненных изменениях в Spotify.
+        """
+        with self._lock:
+            if self._file is None:
+                os.makedirs(self.journal_dir, exist_ok=True)
+                # Построчная буферизация: каждая запись сразу уходит в ОС
+                self._file = open(self.path, 'a', encoding='utf-8', buffering=1)
+            self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            if durable:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+            self._apply(record)
+
+    def record_resolved(self, query: str, track_id: str | None, reason: str | None = None):
+        # Ошибки поиска не запоминаем - такие строки стоит поискать снова
+        if track_id is None and reason and reason != REASON_NOT_FOUND:
+            return
+        self._append({'type': 'resolved', 'query': normalize_query(
+            query), 'track_id': track_id})
+
+    def record_target(self, playlist_id: str, name: str):
+        self._append({'type': 'target', 'id': playlist_id,
+                     'name': name}, durable=True)
+
+    def record_plan(self, track_ids: list[str]):
+        self._append(
+            {'type': 'plan', 'track_ids': list(track_ids)}, durable=True)
+
+    def record_batch(self, index: int):
+        self._append({'type': 'batch', 'index': index}, durable=True)
+
+    def record_uncertain(self, index: int):
+        self._append({'type': 'uncertain', 'index': index}, durable=True)
+
+    def close(self):
+        """Закрывает файл журнала; сам журнал остается для продолжения импорта."""
+        with self._lock:
+            self._close()
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def complete(self):
+        """Импорт завершен - журнал больше не нужен."""
+        with self._lock:
+            self._close()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+
+# --- Этапы импорта без интерфейса ---
+
+def prepare_import(settings: dict, journal: ImportJournal, client, playlists: list[dict],
+                   cancellation_check=None, progress_callback=None) -> dict:
+    """
+    ЭТАП 1: находит ID треков и определяет целевой плейлист, ничего не добавляя.
+    Если по журналу этот импорт уже согласован и прерван, возвращает его план
+    с resume=True. Целевой плейлист записывается в журнал в обоих режимах.
+    """
+    if journal.plan is not None and journal.target_id:
+        print(
+            f"Продолжение импорта в '{journal.target_name}' "
+            f"с пакета {journal.next_batch + 1}.")
+        return {
+            "ok": True,
+            "found_ids": journal.plan,
+            "unresolved": [],
+            "target_id": journal.target_id,
+            "target_name": journal.target_name,
+            "mode": settings['mode'],
+            "journal": journal,
+            "resume": True
+        }
+
+    # 1. Парсинг и поиск Spotify ID: ID и ссылки разбираются локально,
+    #    уникальные текстовые запросы ищутся параллельно
+    if 'items' in settings:
+        source = settings['items']
+    else:
+        source = iter_file(settings['filepath'])
+    resolved = resolve_queries(
+        source,
+        lambda query: client.find_track_id(query, raise_errors=True),
+        cancellation_check=cancellation_check,
+        progress_callback=progress_callback,
+        on_resolved=journal.record_resolved,
+        known=journal.resolved)
+    if not resolved['rows']:
+        raise ValueError("В файле не найдено записей для импорта.")
+    found_track_ids = resolved['track_ids']
+    unresolved = resolved['unresolved']
+    print(
+        f"Импорт: найдено {len(found_track_ids)} треков, "
+        f"выполнено поисковых запросов: {resolved['searched']}.")
+    for row_number, item, reason in unresolved:
+        print(f"  Строка {row_number}: '{item}' - {reason}")
+
+    if not found_track_ids:
+        raise ValueError("Не найдено ни одного трека для добавления.")
+
+    # 2. Определение целевого плейлиста
+    if journal.target_id:
+        # Плейлист уже был выбран (или создан) при прошлом запуске
+        target_playlist_id = journal.target_id
+        target_playlist_name = journal.target_name
+    elif settings['mode'] == 'create':
+        target_playlist_name = settings['target']
+        target_playlist_id = client.create_new_playlist(name=target_playlist_name)
+        if not target_playlist_id:
+            raise Exception(
+                f"Не удалось создать плейлист '{target_playlist_name}'")
+        journal.record_target(target_playlist_id, target_playlist_name)
+    else:
+        target_playlist_id = settings['target']
+        # Находим имя существующего плейлиста по его ID
+        target_playlist_name = next(
+            (p['name'] for p in playlists if p['id'] == target_playlist_id), "Неизвестный плейлист")
+        # Без цели в журнале прерванный импорт не продолжился бы, а начался заново
+        journal.record_target(target_playlist_id, target_playlist_name)
+
+    return {
+        "ok": True,
+        "found_ids": found_track_ids,
+        "unresolved": unresolved,
+        "target_id": target_playlist_id,
+        "target_name": target_playlist_name,
+        "mode": settings['mode'],
+        "journal": journal
+    }
+
+
+def add_planned_tracks(journal: ImportJournal, client, playlist_id: str, track_ids: list[str],
+                       cancellation_check=None, progress_callback=None):
+    """
+    ЭТАП 3: добавляет треки плана, отмечая в журнале каждый добавленный пакет.
+    Пакеты, добавленные до прерывания, пропускаются.
+    """
+    if journal.uncertain_batches:
+        _check_uncertain_batches(journal, client, playlist_id, track_ids)
+    try:
+        client.add_tracks_to_playlist(
+            playlist_id=playlist_id, track_ids=track_ids,
+            cancellation_check=cancellation_check,
+            progress_callback=progress_callback,
+            start_batch=journal.next_batch,
+            on_batch_committed=lambda index, _batch: journal.record_batch(index))
+    except WriteBatchError as e:
+        if e.uncertain:
+            # Повторять пакет вслепую нельзя - при продолжении он будет проверен
+            journal.record_uncertain(e.index)
+        raise
+    finally:
+        journal.close()
+    journal.complete()
+
+
+def _check_uncertain_batches(journal: ImportJournal, client, playlist_id: str, track_ids: list[str]):
+    """
+    Пакет без ответа мог быть добавлен. Добавленный пакет оказывается в конце
+    плейлиста, поэтому он считается записанным, если конец плейлиста совпадает с ним.
+    """
+    playlist_track_ids = client.get_playlist_track_ids(playlist_id)
+    for index in sorted(journal.uncertain_batches):
+        start = index * PLAYLIST_WRITE_LIMIT
+        batch = track_ids[start:start + PLAYLIST_WRITE_LIMIT]
+        if batch and playlist_track_ids[-len(batch):] == batch:
+            print(f"Пакет {index + 1} уже добавлен в плейлист - пропускаем.")
+            journal.record_batch(index)
@@ -0,0 +1,141 @@
+# import_resolver.py
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from importer import extract_track_id
+from search_cache import normalize_query
+
+# Сколько поисковых запросов выполняется одновременно.
+# Общий планировщик запросов все равно ограничивает их частоту.
+RESOLVE_WORKERS = 8
+
+REASON_EMPTY = "пустая строка"
+REASON_NOT_FOUND = "трек не найден в Spotify"
+REASON_SEARCH_ERROR = "ошибка поиска"
+
+
+def resolve_queries(items, find_track_id, max_workers: int = RESOLVE_WORKERS,
+                    cancellation_check=None, progress_callback=None,
+                    on_resolved=None, known: dict | None = None,
+                    total_rows: int | None = None) -> dict:
+    """
+    Превращает строки импорта (ID, URI, ссылки или "Исполнитель - Название") в ID треков.
+
+    items может быть генератором: строки читаются по мере поступления,
+    и поиск начинается, пока файл еще дочитывается. ID, URI и ссылки
+    разбираются локально. Текстовые запросы избавляются от повторов и ищутся
+    параллельно через find_track_id; число запросов "в полете" ограничено,
+    поэтому чтение не убегает далеко вперед поиска.
+    known - уже известные ответы {нормализованный запрос: ID или None},
+    например из журнала прерванного импорта. on_resolved(query, track_id, reason)
+    вызывается сразу после ответа на каждый уникальный запрос.
+    total_rows - число строк, если оно известно заранее (для списков берется
+    len(items)); пока оно неизвестно и файл не дочитан, прогресс передается
+    с общим числом 0 - неопределенный индикатор.
+
+    Возвращает словарь:
+      track_ids  - найденные ID в порядке строк исходного файла;
+      unresolved - список (номер строки, строка, причина) для ненайденных строк;
+      searched   - сколько поисковых запросов реально выполнено;
+      rows       - сколько строк прочитано.
+    """
+    # Для каждой строки храним только (ID, None) или (None, ключ запроса)
+    row_entries = []
+    queries = {}  # ключ -> исходный текст запроса (для отчета и on_resolved)
+    rows_per_key = {}
+    answers = {key: (track_id, None if track_id else REASON_NOT_FOUND)
+               for key, track_id in (known or {}).items()}
+    futures = {}
+    in_flight = set()
+    max_in_flight = max(1, max_workers) * 4
+    progress = {'done': 0}
+    if total_rows is None and hasattr(items, '__len__'):
+        total_rows = len(items)
+    # Общее число строк для прогресса: 0, пока оно неизвестно
+    progress_total = total_rows or 0
+
+    def search(query):
+        try:
+            track_id = find_track_id(query)
+            return track_id, None if track_id else REASON_NOT_FOUND
+        except Exception as e:
+            return None, f"{REASON_SEARCH_ERROR}: {e}"
+
+    def collect(timeout):
+        nonlocal in_flight
+        if cancellation_check and cancellation_check():
+            for future in in_flight:
+                future.cancel()
+            raise InterruptedError("Операция отменена.")
+        if not in_flight:
+            return
+        finished, in_flight = wait(
+            in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in finished:
+            key = futures.pop(future)
+            answers[key] = future.result()
+            progress['done'] += rows_per_key[key]
+            if on_resolved:
+                on_resolved(queries[key], *answers[key])
+        if finished and progress_callback:
+            progress_callback(progress['done'], progress_total)
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        # Шаг 1: чтение строк, локальный разбор и запуск поиска новых запросов
+        for item in items:
+            item = (item or '').strip()
+            track_id = extract_track_id(item) if item else None
+            if track_id or not item:
+                row_entries.append((track_id, None))
+                progress['done'] += 1
+                continue
+
+            key = normalize_query(item)
+            row_entries.append((None, key))
+            rows_per_key[key] = rows_per_key.get(key, 0) + 1
+            if key in queries or key in answers:
+                # Повтор уже найденного или ищущегося запроса
+                if key in answers:
+                    progress['done'] += 1
+                continue
+
+            queries[key] = item
+            future = executor.submit(search, item)
+            futures[future] = key
+            in_flight.add(future)
+            while len(in_flight) >= max_in_flight:
+                collect(timeout=0.2)
+            if len(row_entries) % 1000 == 0:
+                collect(timeout=0)
+
+        # Шаг 2: все строки прочитаны - теперь общее число известно
+        progress_total = len(row_entries)
+        if progress_callback and row_entries:
+            progress_callback(progress['done'], progress_total)
+        while in_flight:
+            collect(timeout=0.2)
+        if cancellation_check and cancellation_check():
+            raise InterruptedError("Операция отменена.")
+
+    # Шаг 3: сборка результата в исходном порядке строк
+    track_ids = []
+    unresolved = []
+    for row_number, (track_id, key) in enumerate(row_entries, start=1):
+        if key is None:
+            if track_id:
+                track_ids.append(track_id)
+            else:
+                unresolved.append((row_number, '', REASON_EMPTY))
+            continue
+        track_id, reason = answers[key]
+        if track_id:
+            track_ids.append(track_id)
+        else:
+            unresolved.append((row_number, queries.get(key, key), reason))
+
+    return {
+        'track_ids': track_ids,
+        'unresolved': unresolved,
+        'searched': len(queries),
+        'rows': len(row_entries)
+    }
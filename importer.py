@@ -1,8 +1,16 @@
 import os
+import re
 import csv
 import json
 from urllib.parse import urlparse, unquote
 
+# ID трека в Spotify - 22 символа base62
+TRACK_ID_RE = re.compile(r'^[0-9A-Za-z]{22}$')
+# spotify:track:ID, open.spotify.com/track/ID (в т.ч. /intl-xx/track/ID?si=...).
+# Единственная грамматика ссылок: ею пользуются и импорт файлов, и вставка текста.
+TRACK_LINK_RE = re.compile(
+    r'(spotify:track:|open\.spotify\.com/(?:intl-[\w-]+/)?track/)([0-9A-Za-z]{22})(?![0-9A-Za-z])')
+
 
 def _find_header_mappings(headers: list[str]) -> dict:
     """
@@ -27,76 +35,238 @@ def _find_header_mappings(headers: list[str]) -> dict:
     return mappings
 
 
-def parse_file(filepath: str) -> list[str]:
-    """Определяет тип файла и вызывает соответствующий парсер."""
+# Виды строк во вставленном тексте
+LINE_ID = 'id'
+LINE_URI = 'uri'
+LINE_URL = 'url'
+LINE_QUERY = 'query'
+
+
+def _find_track_ref(text: str) -> tuple[str, str] | None:
+    """
+    Ищет в строке ссылку на трек по единой грамматике TRACK_LINK_RE.
+    Возвращает (вид ссылки, ID трека) или None для текстового запроса.
+    """
+    text = text.strip()
+    if TRACK_ID_RE.match(text):
+        return LINE_ID, text
+    match = TRACK_LINK_RE.search(text)
+    if match:
+        kind = LINE_URI if match.group(1).startswith('spotify:') else LINE_URL
+        return kind, match.group(2)
+    # parse_csv оставляет от URI вида spotify:track:ID только "track:ID"
+    if text.startswith('track:') and TRACK_ID_RE.match(text[6:]):
+        return LINE_URI, text[6:]
+    return None
+
+
+def classify_line(line: str) -> tuple[str, str] | None:
+    """
+    Определяет вид строки: ID трека, URI, ссылка или запрос "Исполнитель - Название".
+    Возвращает (вид, значение), где значение - ID трека или текст запроса.
+    Для пустой строки возвращает None.
+    """
+    line = line.strip()
+    if not line:
+        return None
+    return _find_track_ref(line) or (LINE_QUERY, line)
+
+
+def parse_pasted_text(text: str) -> tuple[list[str], dict]:
+    """
+    Разбирает вставленный текст построчно без промежуточных файлов.
+    Возвращает список строк для импорта (ID для ссылок, URI и ID, текст для
+    запросов) и счетчики видов строк.
+    """
+    items = []
+    counts = {LINE_ID: 0, LINE_URI: 0, LINE_URL: 0, LINE_QUERY: 0}
+    for line in text.splitlines():
+        classified = classify_line(line)
+        if classified is None:
+            continue
+        kind, value = classified
+        counts[kind] += 1
+        items.append(value)
+    return items, counts
+
+
+def extract_track_id(text: str) -> str | None:
+    """
+    Возвращает ID трека, если строка - это ID, URI или ссылка на трек Spotify.
+    Для текстовых запросов ("Исполнитель - Название") возвращает None.
+    """
+    ref = _find_track_ref(text)
+    return ref[1] if ref else None
+
+
+# Размер блока, которым читается JSON-массив
+JSON_READ_CHUNK = 64 * 1024
+
+_JSON_WHITESPACE_RE = re.compile(r'[ \t\n\r]*')
+
+
+def iter_file(filepath: str):
+    """
+    Определяет тип файла и возвращает генератор строк для поиска треков.
+    Файл читается по мере потребления, поэтому поиск может начинаться
+    до того, как файл прочитан целиком.
+    """
     _, extension = os.path.splitext(filepath)
     extension = extension.lower()
 
     if extension == '.csv':
-        return parse_csv(filepath)
+        return iter_csv(filepath)
     elif extension == '.json':
-        return parse_json(filepath)
+        return iter_json(filepath)
+    elif extension == '.jsonl':
+        return iter_jsonl(filepath)
     else:
         raise ValueError(f"Неподдерживаемый формат файла: {extension}")
 
 
-def parse_csv(filepath: str) -> list[str]:
-    """Читает CSV и извлекает данные для поиска треков, используя гибкое сопоставление колонок."""
-    queries = []
+def parse_file(filepath: str) -> list[str]:
+    """Определяет тип файла и возвращает все строки для поиска списком."""
+    return list(iter_file(filepath))
+
+
+def _record_to_query(record: dict, mappings: dict) -> str | None:
+    """Извлекает из записи ID трека или запрос "Исполнитель - Название"."""
+    if 'uri' in mappings and record.get(mappings['uri']):
+        return os.path.basename(unquote(urlparse(record[mappings['uri']]).path))
+    if 'id' in mappings and record.get(mappings['id']):
+        return record[mappings['id']]
+    if 'name' in mappings and 'artist' in mappings and record.get(mappings['name']) and record.get(mappings['artist']):
+        return f"{record[mappings['artist']]} - {record[mappings['name']]}"
+    return None
+
+
+def _iter_queries(records):
+    """
+    Превращает поток записей-словарей в поток запросов.
+    Сопоставление колонок определяется по первой записи.
+    """
+    mappings = None
+    for record in records:
+        if not isinstance(record, dict):
+            continue
+        if mappings is None:
+            mappings = _find_header_mappings(list(record.keys()))
+        query = _record_to_query(record, mappings)
+        if query:
+            yield query
+
+
+def iter_csv(filepath: str):
+    """Читает CSV построчно и выдает данные для поиска треков."""
     try:
-        with open(filepath, mode='r', encoding='utf-8-sig') as csvfile:
+        with open(filepath, mode='r', encoding='utf-8-sig', newline='') as csvfile:
             reader = csv.DictReader(csvfile)
             if not reader.fieldnames:
-                return []
-
+                return
             mappings = _find_header_mappings(reader.fieldnames)
-
             for row in reader:
-                if 'uri' in mappings and row.get(mappings['uri']):
-                    track_id = os.path.basename(
-                        unquote(urlparse(row[mappings['uri']]).path))
-                    queries.append(track_id)
-                elif 'id' in mappings and row.get(mappings['id']):
-                    queries.append(row[mappings['id']])
-                elif 'name' in mappings and 'artist' in mappings and row.get(mappings['name']) and row.get(mappings['artist']):
-                    query = f"{row[mappings['artist']]} - {row[mappings['name']]}"
-                    queries.append(query)
+                query = _record_to_query(row, mappings)
+                if query:
+                    yield query
     except Exception as e:
         print(f"Ошибка чтения CSV: {e}")
         raise
-    return queries
 
 
-def parse_json(filepath: str) -> list[str]:
-    """Читает JSON и извлекает данные для поиска, используя гибкое сопоставление колонок."""
-    queries = []
+def _iter_json_array(jsonfile, chunk_size: int = JSON_READ_CHUNK):
+    """
+    Потоково разбирает JSON-массив верхнего уровня: читает файл блоками
+    и выдает элементы по одному, не загружая весь файл в память.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    eof = False
+
+    def fill() -> bool:
+        # Отбрасываем уже разобранную часть и дочитываем следующий блок
+        nonlocal buffer, pos, eof
+        chunk = jsonfile.read(chunk_size)
+        if not chunk:
+            eof = True
+            return False
+        buffer = buffer[pos:] + chunk
+        pos = 0
+        return True
+
+    def next_char() -> str:
+        # Первый непробельный символ начиная с pos ('' - конец файла)
+        nonlocal pos
+        while True:
+            pos = _JSON_WHITESPACE_RE.match(buffer, pos).end()
+            if pos < len(buffer):
+                return buffer[pos]
+            if not fill():
+                return ''
+
+    if next_char() != '[':
+        raise TypeError("JSON должен содержать непустой список объектов")
+    pos += 1
+    if next_char() in (']', ''):
+        raise TypeError("JSON должен содержать непустой список объектов")
+
+    while True:
+        next_char()
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+                # Элемент прочитан целиком, только если за ним уже виден
+                # разделитель: число на границе блока ("1" + ".5") может продолжаться
+                after = _JSON_WHITESPACE_RE.match(buffer, end).end()
+                if (after < len(buffer) and buffer[after] in ',]') or eof or not fill():
+                    break
+            except json.JSONDecodeError:
+                # Элемент прочитан не полностью - дочитываем следующий блок
+                if eof or not fill():
+                    raise
+        pos = end
+        yield item
+
+        char = next_char()
+        if char == ',':
+            pos += 1
+        elif char == ']':
+            return
+        else:
+            raise json.JSONDecodeError("Ожидалась ',' или ']'", buffer, pos)
+
+
+def iter_json(filepath: str):
+    """Потоково читает JSON-массив и выдает данные для поиска треков."""
     try:
         with open(filepath, mode='r', encoding='utf-8') as jsonfile:
-            data = json.load(jsonfile)
-            if not isinstance(data, list) or not data:
-                raise TypeError(
-                    "JSON должен содержать непустой список объектов")
-
-            first_item = data[0]
-            if not isinstance(first_item, dict):
-                return []
-
-            mappings = _find_header_mappings(list(first_item.keys()))
-
-            for track in data:
-                if not isinstance(track, dict):
-                    continue
-                # Логика приоритетов, аналогичная CSV
-                if 'uri' in mappings and track.get(mappings['uri']):
-                    track_id = os.path.basename(
-                        unquote(urlparse(track[mappings['uri']]).path))
-                    queries.append(track_id)
-                elif 'id' in mappings and track.get(mappings['id']):
-                    queries.append(track[mappings['id']])
-                elif 'name' in mappings and 'artist' in mappings and track.get(mappings['name']) and track.get(mappings['artist']):
-                    query = f"{track[mappings['artist']]} - {track[mappings['name']]}"
-                    queries.append(query)
+            yield from _iter_queries(_iter_json_array(jsonfile))
     except Exception as e:
         print(f"Ошибка чтения JSON: {e}")
         raise
-    return queries
+
+
+def iter_jsonl(filepath: str):
+    """Читает JSON Lines (по объекту на строку) и выдает данные для поиска треков."""
+    def records(jsonlfile):
+        for line in jsonlfile:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+    try:
+        with open(filepath, mode='r', encoding='utf-8') as jsonlfile:
+            yield from _iter_queries(records(jsonlfile))
+    except Exception as e:
+        print(f"Ошибка чтения JSON Lines: {e}")
+        raise
+
+
+def parse_csv(filepath: str) -> list[str]:
+    """Читает CSV и извлекает данные для поиска треков, используя гибкое сопоставление колонок."""
+    return list(iter_csv(filepath))
+
+
+def parse_json(filepath: str) -> list[str]:
+    """Читает JSON и извлекает данные для поиска, используя гибкое сопоставление колонок."""
+    return list(iter_json(filepath))
@@ -0,0 +1,218 @@
+# library_export.py
+
+import io
+import json
+import re
+import tarfile
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from exporter import EXPORT_FILE_OPTIONS, write_cached_tracks
+
+# Сколько устаревших плейлистов обновляется одновременно
+LIBRARY_EXPORT_WORKERS = 4
+# Файл плейлиста для tar собирается в памяти до этого размера, дальше - на диске
+TAR_SPOOL_SIZE = 8 * 1024 * 1024
+MANIFEST_NAME = 'manifest.json'
+
+_UNSAFE_FILENAME_RE = re.compile(r'[\\/:*?"<>|\x00-\x1f]+')
+
+
+def _member_name(index: int, name: str, extension: str, used: set) -> str:
+    """Безопасное и уникальное имя файла плейлиста внутри архива."""
+    base = _UNSAFE_FILENAME_RE.sub('_', name).strip(' .') or 'playlist'
+    member = f"{index:03d} {base[:100]}.{extension}"
+    suffix = 2
+    while member in used:
+        member = f"{index:03d} {base[:100]} ({suffix}).{extension}"
+        suffix += 1
+    used.add(member)
+    return member
+
+
+class _ArchiveWriter:
+    """Единый интерфейс записи текстовых файлов в zip или tar."""
+
+    def __init__(self, path: str):
+        lower = path.lower()
+        self.is_zip = lower.endswith('.zip')
+        if self.is_zip:
+            self.archive = zipfile.ZipFile(
+                path, 'w', compression=zipfile.ZIP_DEFLATED)
+        elif lower.endswith(('.tar.gz', '.tgz')):
+            self.archive = tarfile.open(path, 'w:gz')
+        elif lower.endswith('.tar'):
+            self.archive = tarfile.open(path, 'w')
+        else:
+            raise ValueError(
+                "Архив должен иметь расширение .zip, .tar или .tar.gz")
+        self.bytes_written = 0
+
+    def write_text(self, member: str, write_fn, encoding: str = 'utf-8', newline=None):
+        """Создает файл member и передает write_fn(stream) текстовый поток для записи."""
+        if self.is_zip:
+            with self.archive.open(member, 'w') as raw:
+                stream = io.TextIOWrapper(
+                    raw, encoding=encoding, newline=newline)
+                result = write_fn(stream)
+                stream.flush()
+                stream.detach()
+            self.bytes_written += self.archive.getinfo(member).file_size
+            return result
+
+        # Tar требует знать размер заранее - сначала пишем во временный буфер
+        with tempfile.SpooledTemporaryFile(max_size=TAR_SPOOL_SIZE) as raw:
+            stream = io.TextIOWrapper(raw, encoding=encoding, newline=newline)
+            result = write_fn(stream)
+            stream.flush()
+            stream.detach()
+            info = tarfile.TarInfo(member)
+            info.size = raw.tell()
+            info.mtime = int(time.time())
+            raw.seek(0)
+            self.archive.addfile(info, raw)
+            self.bytes_written += info.size
+        return result
+
+    def close(self):
+        self.archive.close()
+
+
+def export_library(playlists: list[dict], playlist_cache: dict, track_cache: dict,
+                   archive_path: str, settings: dict, get_snapshot_id, refresh_playlist,
+                   max_workers: int = LIBRARY_EXPORT_WORKERS,
+                   cancellation_check=None, progress_callback=None, **kwargs) -> dict:
+    """
+    Экспортирует все плейлисты (включая "Понравившиеся") в один архив,
+    по файлу на плейлист, плюс manifest.json с описанием.
+
+    Данные берутся из кэша. Из API параллельно загружаются только плейлисты,
+    у которых snapshot_id изменился с момента последнего кэширования
+    (refresh_playlist(playlist_id, snapshot_id, cancellation_check)).
+    get_snapshot_id(playlist_id) возвращает актуальный snapshot_id.
+    """
+    started_at = time.monotonic()
+    export_format = settings['format']
+    file_options = EXPORT_FILE_OPTIONS[export_format]
+    total_steps = len(playlists) * 2
+    steps_done = 0
+
+    def step(message: str):
+        nonlocal steps_done
+        steps_done += 1
+        print(f"[{steps_done}/{total_steps}] {message}")
+        if progress_callback:
+            progress_callback(steps_done, total_steps)
+
+    def check_cancelled():
+        if cancellation_check and cancellation_check():
+            raise InterruptedError("Операция отменена.")
+
+    # Шаг 1: какие плейлисты устарели
+    snapshots = {}
+    stale = []
+    stale_ids = set()
+    for playlist in playlists:
+        check_cancelled()
+        snapshot_id = playlist.get('snapshot_id') or get_snapshot_id(
+            playlist['id'])
+        snapshots[playlist['id']] = snapshot_id
+        cached = playlist_cache.get(playlist['id'])
+        if not cached or not snapshot_id or cached.get('snapshot_id') != snapshot_id:
+            stale.append(playlist)
+            stale_ids.add(playlist['id'])
+
+    # Шаг 2: параллельное обновление устаревших плейлистов
+    errors = {}
+    fresh_count = len(playlists) - len(stale)
+    for playlist in playlists:
+        if playlist['id'] not in stale_ids:
+            step(f"'{playlist['name']}' актуален в кэше")
+    if stale:
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            futures = {
+                executor.submit(refresh_playlist, playlist['id'], snapshots[playlist['id']],
+                                cancellation_check): playlist
+                for playlist in stale}
+            try:
+                for future in as_completed(futures):
+                    playlist = futures[future]
+                    try:
+                        future.result()
+                        step(f"'{playlist['name']}' обновлен")
+                    except InterruptedError:
+                        raise
+                    except Exception as e:
+                        errors[playlist['id']] = str(e)
+                        step(f"'{playlist['name']}' не обновлен: {e}")
+            except InterruptedError:
+                for future in futures:
+                    future.cancel()
+                raise
+    check_cancelled()
+
+    # Шаг 3: запись архива (последовательно - архивы не поддерживают параллельную запись)
+    manifest = {
+        'exported_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'format': export_format,
+        'playlists': []
+    }
+    total_tracks = 0
+    used_names = {MANIFEST_NAME}
+    archive = _ArchiveWriter(archive_path)
+    try:
+        for index, playlist in enumerate(playlists, start=1):
+            check_cancelled()
+            cached = playlist_cache.get(playlist['id'])
+            if not cached:
+                step(f"'{playlist['name']}' пропущен: нет данных в кэше")
+                manifest['playlists'].append({
+                    'id': playlist['id'], 'name': playlist['name'], 'file': None,
+                    'error': errors.get(playlist['id'], "нет данных в кэше")})
+                continue
+
+            track_ids = cached.get('track_ids', [])
+            member = _member_name(
+                index, playlist['name'], export_format, used_names)
+            count = archive.write_text(
+                member,
+                lambda stream: write_cached_tracks(
+                    stream, track_ids, track_cache, settings, cancellation_check),
+                **file_options)
+            total_tracks += count
+
+            entry = {'id': playlist['id'], 'name': playlist['name'], 'file': member,
+                     'snapshot_id': cached.get('snapshot_id'), 'tracks': count,
+                     'refreshed': playlist['id'] in stale_ids and playlist['id'] not in errors}
+            if playlist['id'] in errors:
+                entry['error'] = errors[playlist['id']]
+            manifest['playlists'].append(entry)
+            step(f"'{playlist['name']}' записан: {count} треков")
+
+        archive.write_text(
+            MANIFEST_NAME,
+            lambda stream: json.dump(manifest, stream, ensure_ascii=False, indent=4))
+    finally:
+        archive.close()
+
+    elapsed = max(time.monotonic() - started_at, 1e-6)
+    stats = {
+        'playlists': len(playlists),
+        'refreshed': len(stale) - len(errors),
+        'from_cache': fresh_count,
+        'failed': len(errors),
+        'tracks': total_tracks,
+        'bytes': archive.bytes_written,
+        'seconds': elapsed,
+        'tracks_per_second': total_tracks / elapsed,
+        'archive': archive_path
+    }
+    print(
+        f"Экспорт библиотеки: {stats['playlists']} плейлистов "
+        f"(обновлено {stats['refreshed']}, из кэша {stats['from_cache']}, "
+        f"ошибок {stats['failed']}), {total_tracks} треков за {elapsed:.1f} с "
+        f"({stats['tracks_per_second']:.0f} треков/с, "
+        f"{stats['bytes'] / elapsed / 1024:.0f} КБ/с).")
+    return stats
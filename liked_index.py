@@ -0,0 +1,54 @@
+# liked_index.py
+
+import threading
+import time
+
+# Через сколько секунд после последней сверки с сервером индекс считается устаревшим
+LIKED_INDEX_MAX_AGE = 15 * 60
+
+
+class LikedIndex:
+    """
+    Локальное множество ID треков из 'Понравившихся'.
+    Строится по кэшу плейлиста 'liked_songs' и обновляется при добавлении и
+    удалении лайков, поэтому проверка принадлежности не требует запросов к API.
+    """
+
+    def __init__(self, max_age: float = LIKED_INDEX_MAX_AGE):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._track_ids = set()
+        self._verified_at = None
+
+    def rebuild(self, track_ids, verified: bool = True):
+        """
+        Полностью заменяет содержимое индекса.
+        verified=False - данные взяты из старого кэша и еще не сверены с сервером.
+        """
+        with self._lock:
+            self._track_ids = set(track_ids)
+            self._verified_at = time.monotonic() if verified else None
+
+    def add(self, track_ids):
+        with self._lock:
+            self._track_ids.update(track_ids)
+
+    def discard(self, track_ids):
+        with self._lock:
+            self._track_ids.difference_update(track_ids)
+
+    def is_stale(self) -> bool:
+        with self._lock:
+            return self._verified_at is None or time.monotonic() - self._verified_at > self.max_age
+
+    def contains_many(self, track_ids) -> list[bool]:
+        with self._lock:
+            return [track_id in self._track_ids for track_id in track_ids]
+
+    def __contains__(self, track_id) -> bool:
+        with self._lock:
+            return track_id in self._track_ids
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._track_ids)
@@ -1,3 +1,7 @@
+import time
+# Точка отсчета для измерения времени до готовности интерфейса
+STARTUP_STARTED_AT = time.perf_counter()
+
 import sys
 import os
 import webbrowser
@@ -24,18 +28,28 @@ from PyQt6.QtGui import QPixmap, QPainter, QPainterPath
 from ui_main_window import MainWindow
 from auth_manager import AuthManager, REDIRECT_URI
 from spotify_client import SpotifyClient
-from exporter import export_to_csv, export_to_json, export_to_txt
+from cache_loader import CacheLoader
+from request_scheduler import PRIORITY_BACKGROUND, cancellation_scope
+from search_cache import SearchCache
+from exporter import export_cached_tracks
+from library_export import export_library
 from export_dialog import ExportDialog
 from import_dialog import ImportDialog
-from importer import parse_file
+from import_journal import ImportJournal, add_planned_tracks, prepare_import
 from paste_text_dialog import PasteTextDialog
 
 import requests  # <-- ДОБАВЬТЕ ЭТОТ ИМПОРТ
+from http_session import CONNECTIVITY_PROBE_URL, get_session, print_pool_stats
 
 from ai_assistant import AIAssistant
 from api_key_dialog import ApiKeyDialog
 from ai_dialog import AiDialog
 
+# Сколько секунд при выходе ждать окончания загрузки кэша перед закрытием базы
+CACHE_CLOSE_WAIT = 3.0
+# Сколько секунд при выходе ждать остановки каждой фоновой задачи
+BACKGROUND_STOP_WAIT = 3.0
+
 
 def has_internet_connection():
     """
@@ -43,7 +57,8 @@ def has_internet_connection():
     """
     try:
         # Отправляем легкий HEAD-запрос с коротким таймаутом (3 секунды)
-        requests.head("http://www.google.com", timeout=3)
+        # Общая сессия держит соединение открытым между проверками
+        get_session().head(CONNECTIVITY_PROBE_URL, timeout=3)
         return True
     except (requests.ConnectionError, requests.Timeout):
         return False
@@ -145,7 +160,9 @@ class Worker(QObject):
             self.kwargs['cancellation_check'] = cancellation_checker
             self.kwargs['progress_callback'] = self.progress.emit
 
-            result = self.fn(*self.args, **self.kwargs)
+            # Паузы перед повторами запросов тоже прерываются отменой
+            with cancellation_scope(cancellation_checker):
+                result = self.fn(*self.args, **self.kwargs)
 
             # Если задача не была прервана, отправляем сигнал о завершении
             if not thread.isInterruptionRequested():
@@ -168,6 +185,8 @@ class SpotifyApp(QObject):
     Главный класс приложения, связывающий UI и логику.
     """
     code_received_signal = pyqtSignal(str)
+    # ID плейлиста, данные которого появились в кэше ('' - база кэша открыта)
+    cache_playlist_ready = pyqtSignal(str)
 
     def __init__(self):
         super().__init__()
@@ -183,24 +202,33 @@ class SpotifyApp(QObject):
         self.playlists = []
         self.current_playlist_id = None
         self.current_playlist_name = ""
+        self.current_track_ids = []  # ID треков, показанных в таблице
         self.is_playlist_view = False
 
         self.cache_file = os.path.join('.app_cache', 'cache.json')
+        self.cache_db_file = os.path.join('.app_cache', 'cache.sqlite3')
         self.covers_dir = os.path.join('.app_cache', 'covers')
         self.settings_file = os.path.join('.app_cache', 'settings.json')
         self.settings = {}
         self.load_settings()
 
-        # Инициализируем кэши
-        self.playlist_cache = {}
-        self.track_cache = {}
-
-        # --> НОВОЕ: Загружаем кэш из файла при запуске <--
-
+        # Кэш открывается в фоне; playlist_cache и track_cache - свойства,
+        # которые при первом обращении дожидаются открытия базы
+        self._waiting_for_playlist = None  # (ID плейлиста, snapshot_id)
+        self._liked_index_seeded = False
+        self.cache_playlist_ready.connect(self.on_cache_playlist_ready)
         self.load_cache()
 
+        # Кэш результатов поиска живет между сессиями
+        self.search_cache = SearchCache(
+            os.path.join('.app_cache', 'search_cache.json'))
+        self.search_cache.load()
+
         self.thread = None
         self.worker = None
+        # Фоновые задачи (синхронизация, обложки, импорт): имя -> (поток, worker).
+        # Выполняются параллельно с интерактивной задачей и друг с другом
+        self.background_tasks = {}
 
         # --> НОВОЕ: Создаем виджеты для строки состояния заранее <--
         self.status_progress_bar = QProgressBar()
@@ -233,6 +261,7 @@ class SpotifyApp(QObject):
         self.window.track_table.customContextMenuRequested.connect(
             self.show_track_context_menu)
         self.window.export_button.clicked.connect(self.export_tracks)
+        self.window.export_library_button.clicked.connect(self.export_library)
         self.window.import_button.clicked.connect(self.open_import_dialog)
         self.window.paste_text_button.clicked.connect(
             self.open_paste_text_dialog)
@@ -271,8 +300,10 @@ class SpotifyApp(QObject):
             # Очищаем кэши в памяти
             self.playlist_cache.clear()
             self.track_cache.clear()
+            self.search_cache.clear()
+            self.search_cache.save()
 
-            # Удаляем файлы кэша с диска
+            # Удаляем старый файл кэша с диска, если он остался
             if os.path.exists(self.cache_file):
                 os.remove(self.cache_file)
                 print("Файл кэша плейлистов удален.")
@@ -513,7 +544,9 @@ class SpotifyApp(QObject):
             raise ValueError("Не был определен целевой плейлист.")
 
         self.spotify_client.add_tracks_to_playlist(
-            playlist_id=target_id, track_ids=track_ids)
+            playlist_id=target_id, track_ids=track_ids,
+            cancellation_check=kwargs.get('cancellation_check'),
+            progress_callback=kwargs.get('progress_callback'))
 
         # Возвращаем ID измененного плейлиста и сообщение об успехе
         return {
@@ -653,49 +686,116 @@ class SpotifyApp(QObject):
         self.update_status("Список моделей обновлен.")
 
     def load_cache(self):
-        """Загружает кэш плейлистов и треков из файла."""
-        if not os.path.exists(self.cache_file):
-            print("Файл кэша не найден. Будет создан новый.")
+        """
+        Запускает фоновое открытие кэша плейлистов и треков в SQLite.
+        Старый cache.json при первом запуске переносится в базу по плейлистам.
+        """
+        self.cache_loader = CacheLoader(self.cache_db_file, self.cache_file)
+        self.cache_loader.on_playlist_ready = lambda playlist_id: self.cache_playlist_ready.emit(
+            playlist_id or '')
+        self.cache_loader.on_finished = self._on_cache_loaded
+        self.cache_loader.start()
+
+    def _on_cache_loaded(self):
+        """Вызывается из фонового потока после полной загрузки кэша."""
+        print(
+            f"Кэш загружен в фоне за {self.cache_loader.load_seconds * 1000:.0f} мс: "
+            f"{len(self.playlist_cache)} плейлистов и {len(self.track_cache)} треков.")
+
+    @property
+    def cache_store(self):
+        return self.cache_loader.wait_store()
+
+    @property
+    def playlist_cache(self):
+        return self.cache_loader.wait_store().playlists
+
+    @property
+    def track_cache(self):
+        return self.cache_loader.wait_store().tracks
+
+    def on_cache_playlist_ready(self, playlist_id: str):
+        """Слот: часть кэша стала доступна. Продолжает ожидающие ее действия."""
+        if self.spotify_client and not self._liked_index_seeded:
+            self._seed_liked_index()
+
+        if self._waiting_for_playlist:
+            waiting_id, snapshot_id = self._waiting_for_playlist
+            if self.cache_loader.is_playlist_ready(waiting_id):
+                self._waiting_for_playlist = None
+                if self.is_playlist_view and self.current_playlist_id == waiting_id:
+                    self._on_snapshot_received(snapshot_id)
+
+    def _seed_liked_index(self):
+        """Заполняет индекс лайков из кэша прошлой сессии, когда он доступен."""
+        if not self.cache_loader.is_playlist_ready('liked_songs'):
             return
-
-        try:
-            with open(self.cache_file, 'r', encoding='utf-8') as f:
-                cached_data = json.load(f)
-                self.playlist_cache = cached_data.get('playlist_cache', {})
-                self.track_cache = cached_data.get('track_cache', {})
-                print(
-                    f"Кэш успешно загружен. Загружено {len(self.playlist_cache)} плейлистов и {len(self.track_cache)} треков.")
-        except (json.JSONDecodeError, IOError) as e:
-            print(f"Ошибка при чтении файла кэша: {e}. Кэш будет сброшен.")
-            self.playlist_cache = {}
-            self.track_cache = {}
+        self._liked_index_seeded = True
+        cached_liked = self.playlist_cache.get('liked_songs')
+        # До сверки с сервером индекс считается устаревшим
+        if cached_liked and self.spotify_client.liked_index.is_stale():
+            self.spotify_client.liked_index.rebuild(
+                cached_liked.get('track_ids', []), verified=False)
+
+    def report_time_to_interactive(self):
+        """Печатает время от запуска до первой отрисовки окна."""
+        elapsed_ms = (time.perf_counter() - STARTUP_STARTED_AT) * 1000
+        state = "готов" if self.cache_loader.is_finished() else "загружается в фоне"
+        print(f"Интерфейс готов через {elapsed_ms:.0f} мс (кэш {state}).")
 
     def save_cache(self):
-        """Сохраняет текущий кэш в файл."""
-        try:
-            with open(self.cache_file, 'w', encoding='utf-8') as f:
-                cache_to_save = {
-                    'playlist_cache': self.playlist_cache,
-                    'track_cache': self.track_cache
-                }
-                json.dump(cache_to_save, f, indent=4)
-                print("Кэш успешно сохранен.")
-        except IOError as e:
-            print(f"Ошибка при сохранении кэша: {e}")
+        """
+        Закрывает базу кэша. Все изменения уже записаны в момент обновления,
+        поэтому переписывать кэш целиком не нужно.
+        """
+        if not self.cache_loader.wait_finished(CACHE_CLOSE_WAIT):
+            # Перенос старого кэша продолжится при следующем запуске,
+            # но уже сделанные изменения фиксируем
+            store = self.cache_loader.store
+            if store is not None:
+                store.flush()
+            print("Кэш еще загружается: изменения зафиксированы, закрытие базы пропущено.")
+            return
+        self.cache_store.close()
+        print("Кэш успешно сохранен.")
+
+    def print_network_stats(self):
+        """Выводит статистику сетевого слоя: пулы соединений и объединенные запросы."""
+        print_pool_stats()
+        if self.spotify_client:
+            stats = self.spotify_client.coalescing_stats()
+            print(
+                f"Объединение запросов: всего {stats['calls']}, выполнено {stats['executed']}, "
+                f"сэкономлено {stats['coalesced']}.")
+        stats = self.search_cache.stats()
+        print(
+            f"Кэш поиска: {stats['entries']} запросов, попаданий {stats['hits']}, "
+            f"промахов {stats['misses']} ({stats['hit_ratio']:.0%}), вытеснено {stats['evictions']}.")
 
-    def display_tracks_from_playlist(self, item):
-        """ФАЗА 1 (Инициатор): Запускает быструю проверку snapshot_id."""
+    def display_tracks_from_playlist(self, item, fresh=False):
+        """
+        ФАЗА 1 (Инициатор): Запускает быструю проверку snapshot_id.
+        fresh=True (явное обновление) - версия запрашивается у сервера, а не берется из индекса.
+        """
         row = self.window.playlist_list.row(item)
         playlist = self.playlists[row]
         self.current_playlist_id = playlist['id']
         self.current_playlist_name = playlist['name']
         self.is_playlist_view = True
 
+        # snapshot_id недавно получен со списком плейлистов - решаем сразу, без запроса
+        indexed_snapshot_id = None if fresh else self.spotify_client.get_indexed_snapshot_id(
+            self.current_playlist_id)
+        if indexed_snapshot_id:
+            self._on_snapshot_received(indexed_snapshot_id)
+            return
+
         # Запускаем короткую задачу только для проверки состояния кэша
         self.run_long_task(
             self.spotify_client.get_playlist_snapshot_id,
             self._on_snapshot_received,  # Переходим к Фазе 2
             self.current_playlist_id,
+            fresh,
             label_text="Проверка плейлиста..."
         )
 
@@ -748,6 +848,68 @@ class SpotifyApp(QObject):
 
         self.thread.start()
 
+    def run_background_task(self, name, fn, on_finish, *args, label_text="Фоновая операция..."):
+        """
+        Запускает задачу в фоновой полосе: без оверлея и индикатора, рядом с
+        интерактивной задачей и другими фоновыми. Новая интерактивная задача
+        фоновые не отменяет. Задача с тем же именем заменяет прежнюю - та
+        получает запрос на отмену.
+        """
+        if not has_internet_connection():
+            self.update_status(
+                "❌ Ошибка: отсутствует подключение к интернету.")
+            return
+
+        previous = self.background_tasks.get(name)
+        if previous and previous[0].isRunning():
+            previous[0].requestInterruption()
+            previous[0].quit()
+
+        print(f"Фоновая задача '{name}': {label_text}")
+        self.update_status(label_text)
+
+        thread = QThread()
+        worker = Worker(fn, *args)
+        worker.moveToThread(thread)
+
+        thread.started.connect(worker.run)
+        worker.finished.connect(on_finish)
+        worker.error.connect(self.on_background_task_error)
+
+        # Очистка: поток завершается и после ошибки, окно при этом не блокировалось
+        worker.finished.connect(thread.quit)
+        worker.error.connect(thread.quit)
+        worker.finished.connect(worker.deleteLater)
+        thread.finished.connect(thread.deleteLater)
+        thread.finished.connect(
+            lambda: self._on_background_task_finished(name, thread))
+
+        self.background_tasks[name] = (thread, worker)
+        thread.start()
+
+    def _on_background_task_finished(self, name, thread):
+        # Задачу могли уже заменить новой с тем же именем
+        if self.background_tasks.get(name, (None,))[0] is thread:
+            del self.background_tasks[name]
+
+    def on_background_task_error(self, error_info):
+        """Ошибка фоновой задачи: без модального окна, чтобы не прерывать работу."""
+        _exc_type, exc_value, exc_traceback = error_info
+        print("Произошла ошибка в фоновой задаче:")
+        print(exc_traceback)
+        self.update_status(f"Ошибка фоновой операции: {str(exc_value).split(':')[0]}")
+
+    def stop_background_tasks(self):
+        """Отменяет фоновые задачи и ждет их остановки: после этого закрывается кэш."""
+        tasks = list(self.background_tasks.values())
+        for thread, _worker in tasks:
+            if thread.isRunning():
+                thread.requestInterruption()
+                thread.quit()
+        for thread, _worker in tasks:
+            if not thread.wait(int(BACKGROUND_STOP_WAIT * 1000)):
+                print("Фоновая задача не успела остановиться до выхода.")
+
     def restore_ui(self):
         """Восстанавливает интерфейс, скрывая оверлей и виджеты."""
         # --> ИЗМЕНЕНИЕ: Скрываем оверлей и сбрасываем его курсор <--
@@ -761,10 +923,16 @@ class SpotifyApp(QObject):
         self.update_status("Готово.", timeout=2000)
 
     def update_progress(self, current_value, max_value):
-        """Слот для обновления прогресс-бара в строке состояния."""
+        """
+        Слот для обновления прогресс-бара в строке состояния.
+        max_value == 0 означает, что общий объем еще неизвестен.
+        """
         if max_value > 0:
             percent = int((current_value / max_value) * 100)
+            self.status_progress_bar.setRange(0, 100)
             self.status_progress_bar.setValue(percent)
+        else:
+            self.status_progress_bar.setRange(0, 0)
 
     def on_thread_finished(self):
         self.thread = None
@@ -815,7 +983,14 @@ class SpotifyApp(QObject):
         Рабочий метод: проходит по списку плейлистов с сервера и обновляет
         кэш только для тех, которые уже были кэшированы и изменились.
         Возвращает список ID обновленных плейлистов.
+        Запросы идут с фоновым приоритетом, пропуская вперед действия пользователя.
         """
+        self.cache_loader.wait_until_loaded(cancellation_check)
+        with self.spotify_client.scheduler.priority(PRIORITY_BACKGROUND):
+            return self._sync_cached_playlists(
+                playlists_from_server, cancellation_check, progress_callback)
+
+    def _sync_cached_playlists(self, playlists_from_server, cancellation_check=None, progress_callback=None):
         cached_playlist_ids = set(self.playlist_cache.keys())
         playlists_to_check = [p for p in playlists_from_server if p.get(
             'id') in cached_playlist_ids]
@@ -838,8 +1013,12 @@ class SpotifyApp(QObject):
 
             current_snapshot_id = self.spotify_client.get_playlist_snapshot_id(
                 playlist_id)
-            cached_snapshot_id = self.playlist_cache[playlist_id].get(
-                'snapshot_id')
+            cached_snapshot_id = self.playlist_cache.get_snapshot_id(playlist_id)
+
+            if playlist_id == 'liked_songs' and current_snapshot_id == cached_snapshot_id:
+                # Кэш "Понравившихся" подтвержден сервером - индекс лайков актуален
+                self.spotify_client.liked_index.rebuild(
+                    self.playlist_cache[playlist_id].get('track_ids', []))
 
             if current_snapshot_id != cached_snapshot_id:
                 print(
@@ -898,10 +1077,14 @@ class SpotifyApp(QObject):
         self.window.login_button.setEnabled(False)
         self.window.refresh_button.setEnabled(True)
         self.window.cache_all_button.setEnabled(True)
+        self.window.export_library_button.setEnabled(True)
         self.window.ai_button.setEnabled(True)
         self.window.import_button.setEnabled(True)
         self.window.paste_text_button.setEnabled(True)
-        self.spotify_client = SpotifyClient(self.auth_manager.sp_oauth)
+        self.spotify_client = SpotifyClient(
+            self.auth_manager.sp_oauth, search_cache=self.search_cache)
+        # Индекс лайков из кэша прошлой сессии (или когда кэш догрузится)
+        self._seed_liked_index()
         self.load_user_playlists()
 
     def load_user_playlists(self):
@@ -926,7 +1109,8 @@ class SpotifyApp(QObject):
         # 2. Если включен режим показа обложек, запускаем их фоновую дозагрузку
         if self.window.show_covers_action.isChecked():
             print("Режим обложек включен, запускаю проверку и дозагрузку...")
-            self.run_long_task(
+            self.run_background_task(
+                'covers',
                 self._download_covers_worker,
                 self.on_covers_downloaded,  # Указываем, что делать после загрузки
                 label_text="Загрузка обложек..."
@@ -951,14 +1135,26 @@ class SpotifyApp(QObject):
     def _on_snapshot_received(self, current_snapshot_id):
         """ФАЗА 2 (Решение): Вызывается после получения snapshot_id."""
         playlist_id = self.current_playlist_id
-        cached_playlist = self.playlist_cache.get(playlist_id)
+
+        # Кэш еще загружается: ждем только этот плейлист, не блокируя окно
+        if not self.cache_loader.is_playlist_ready(playlist_id):
+            self._waiting_for_playlist = (playlist_id, current_snapshot_id)
+            self.cache_loader.prioritize(playlist_id)
+            self.update_status("Загрузка плейлиста из кэша...", 0)
+            return
+
+        # Плейлист и его треки читаются согласованно, пока рабочие потоки пишут в кэш
+        with self.cache_store.read_view() as store:
+            cached_playlist = store.playlists.get(playlist_id)
+            is_hit = cached_playlist and cached_playlist.get(
+                'snapshot_id') == current_snapshot_id
+            if is_hit:
+                tracks_to_display = store.tracks.get_many(
+                    cached_playlist['track_ids'])
 
         # Сценарий А: КЭШ-ХИТ. Отображаем мгновенно из кэша.
-        if cached_playlist and cached_playlist.get('snapshot_id') == current_snapshot_id:
+        if is_hit:
             print(f"КЭШ-ХИТ для плейлиста {playlist_id}. Загрузка из кэша.")
-            track_ids = cached_playlist['track_ids']
-            tracks_to_display = [self.track_cache[tid]
-                                 for tid in track_ids if tid in self.track_cache]
             # Напрямую вызываем финальный слот
             self.on_tracks_loaded(tracks_to_display)
             return
@@ -983,18 +1179,16 @@ class SpotifyApp(QObject):
             return []
 
         # 2. Находим, информацию о каких треках нам нужно загрузить
-        new_ids_to_fetch = [
-            tid for tid in found_ids if tid not in self.track_cache]
+        new_ids_to_fetch = self.track_cache.missing(found_ids)
 
         # 3. Если есть новые треки, загружаем их детали и обновляем кэш
         if new_ids_to_fetch:
             new_details = self.spotify_client.get_tracks_details(
                 new_ids_to_fetch)
-            self.track_cache.update(new_details)
+            self.track_cache.add_missing(new_details.items())
 
         # 4. Собираем предварительный список треков для этой операции
-        tracks_for_this_search = [self.track_cache[tid]
-                                  for tid in found_ids if tid in self.track_cache]
+        tracks_for_this_search = self.track_cache.get_many(found_ids)
 
         # 5. Если опция включена, сразу скачиваем для них недостающие обложки
         if self.window.show_covers_action.isChecked():
@@ -1003,26 +1197,44 @@ class SpotifyApp(QObject):
                 tracks_for_this_search, cancellation_check)
 
         # 6. Возвращаем полностью готовый для отображения список
-        return [self.track_cache[tid] for tid in found_ids if tid in self.track_cache]
+        return self.track_cache.get_many(found_ids)
 
     def _fetch_and_cache_playlist(self, playlist_id, snapshot_id, cancellation_check=None, progress_callback=None, **kwargs):
         """ФАЗА 3 (Рабочий): Загружает все необходимые данные и обновляет кэши."""
-        track_ids = self.spotify_client.get_playlist_track_ids(
-            playlist_id, cancellation_check, progress_callback)
+        track_ids = self._fetch_playlist_into_cache(
+            playlist_id, snapshot_id, cancellation_check, progress_callback)
+
+        return self.track_cache.get_many(track_ids)
+
+    def _fetch_playlist_into_cache(self, playlist_id, snapshot_id, cancellation_check=None, progress_callback=None) -> list[str]:
+        """
+        Загружает плейлист за один проход (ID и информация о треках вместе)
+        и обновляет оба кэша. Возвращает список ID треков.
+        """
+        cache_entry = {"snapshot_id": snapshot_id}
+        if playlist_id == 'liked_songs':
+            # "Понравившиеся" догружаются инкрементально: только новые треки сверху
+            cached_liked = self.playlist_cache.get('liked_songs') or {}
+            liked = self.spotify_client.get_liked_tracks_incremental(
+                cached_liked.get('track_ids', []), cached_liked.get(
+                    'newest_added_at'),
+                cancellation_check, progress_callback)
+            track_ids, track_details = liked['track_ids'], liked['details']
+            cache_entry['newest_added_at'] = liked['newest_added_at']
+            self.spotify_client.liked_index.rebuild(track_ids)
+        else:
+            track_ids, track_details = self.spotify_client.get_playlist_tracks_hydrated(
+                playlist_id, cancellation_check, progress_callback)
         if cancellation_check and cancellation_check():
             raise InterruptedError("Отменено.")
 
-        self.playlist_cache[playlist_id] = {
-            "snapshot_id": snapshot_id, "track_ids": track_ids}
-        new_track_ids = [
-            tid for tid in track_ids if tid not in self.track_cache]
-
-        if new_track_ids:
-            new_track_details = self.spotify_client.get_tracks_details(
-                new_track_ids)
-            self.track_cache.update(new_track_details)
+        cache_entry['track_ids'] = track_ids
+        # Плейлист и его треки записываются одной операцией; уже известные
+        # треки не перезаписываются, чтобы не потерять cover_path
+        self.cache_store.upsert_playlist(
+            playlist_id, cache_entry, track_details)
 
-        return [self.track_cache[tid] for tid in track_ids if tid in self.track_cache]
+        return track_ids
 
     def cache_all_playlists(self):
         """Инициирует процесс кэширования всех плейлистов."""
@@ -1038,7 +1250,14 @@ class SpotifyApp(QObject):
     def _cache_all_playlists_worker(self, playlists_to_cache, cancellation_check=None, progress_callback=None, **kwargs):
         """
         Рабочий метод: проходит по всем плейлистам и обновляет их кэш при необходимости.
+        Запросы идут с фоновым приоритетом.
         """
+        self.cache_loader.wait_until_loaded(cancellation_check)
+        with self.spotify_client.scheduler.priority(PRIORITY_BACKGROUND):
+            return self._cache_all_playlists(
+                playlists_to_cache, cancellation_check, progress_callback)
+
+    def _cache_all_playlists(self, playlists_to_cache, cancellation_check=None, progress_callback=None):
         total_playlists = len(playlists_to_cache)
         for i, playlist in enumerate(playlists_to_cache):
             if cancellation_check and cancellation_check():
@@ -1048,8 +1267,13 @@ class SpotifyApp(QObject):
             if progress_callback:
                 progress_callback(i, total_playlists)
 
-            # Мы могли бы добавить проверку snapshot_id здесь для еще большей оптимизации,
-            # но для простоты просто вызываем обновление.
+            # snapshot_id берется из индекса плейлистов, поэтому проверка бесплатна
+            indexed_snapshot_id = self.spotify_client.get_indexed_snapshot_id(
+                playlist['id'])
+            if indexed_snapshot_id and \
+                    self.playlist_cache.get_snapshot_id(playlist['id']) == indexed_snapshot_id:
+                continue
+
             self._update_one_playlist_in_cache(
                 playlist['id'], cancellation_check=cancellation_check)
 
@@ -1067,22 +1291,10 @@ class SpotifyApp(QObject):
         current_snapshot_id = self.spotify_client.get_playlist_snapshot_id(
             playlist_id)
 
-        track_ids = self.spotify_client.get_playlist_track_ids(
-            playlist_id, cancellation_check, progress_callback)
-        if cancellation_check and cancellation_check():
-            raise InterruptedError("Отменено.")
-
-        self.playlist_cache[playlist_id] = {
-            "snapshot_id": current_snapshot_id, "track_ids": track_ids}
-        new_track_ids = [
-            tid for tid in track_ids if tid not in self.track_cache]
+        track_ids = self._fetch_playlist_into_cache(
+            playlist_id, current_snapshot_id, cancellation_check, progress_callback)
 
-        if new_track_ids:
-            new_track_details = self.spotify_client.get_tracks_details(
-                new_track_ids)
-            self.track_cache.update(new_track_details)
-
-        return [self.track_cache[tid] for tid in track_ids if tid in self.track_cache]
+        return self.track_cache.get_many(track_ids)
 
     def _download_covers_for_tracks(self, tracks_to_check: list[dict], cancellation_check=None, progress_callback=None):
         """
@@ -1108,13 +1320,13 @@ class SpotifyApp(QObject):
 
             filepath = os.path.join(self.covers_dir, f"{track['id']}.jpg")
             try:
-                response = requests.get(track['cover_url'])
+                response = get_session().get(track['cover_url'])
                 response.raise_for_status()
                 with open(filepath, 'wb') as f:
                     f.write(response.content)
-                # Сразу обновляем наш кэш в памяти
-                if track['id'] in self.track_cache:
-                    self.track_cache[track['id']]['cover_path'] = filepath
+                # Меняем только cover_path, не затирая параллельные изменения трека
+                track['cover_path'] = filepath
+                self.track_cache.set_fields(track['id'], cover_path=filepath)
             except requests.RequestException as e:
                 print(f"Не удалось скачать обложку для {track['id']}: {e}")
 
@@ -1124,6 +1336,7 @@ class SpotifyApp(QObject):
         """
         current_snapshot_id = self.spotify_client.get_playlist_snapshot_id(
             playlist_id)
+        self.cache_loader.wait_for_playlist(playlist_id, cancellation_check)
         cached_playlist = self.playlist_cache.get(playlist_id)
 
         # Сценарий А: КЭШ-ХИТ. Плейлист не менялся.
@@ -1132,38 +1345,22 @@ class SpotifyApp(QObject):
             track_ids = cached_playlist['track_ids']
             # Проверяем, нужно ли догрузить обложки для треков из кэша
             if self.window.show_covers_action.isChecked():
-                tracks_to_check = [self.track_cache[tid]
-                                   for tid in track_ids if tid in self.track_cache]
+                tracks_to_check = self.track_cache.get_many(track_ids)
                 self._download_covers_for_tracks(
                     tracks_to_check, cancellation_check, progress_callback)
 
             # Собираем финальный список из кэша ПОСЛЕ возможной дозагрузки обложек
-            return [self.track_cache[tid] for tid in track_ids if tid in self.track_cache]
+            return self.track_cache.get_many(track_ids)
 
         # Сценарий Б: КЭШ-ПРОМАХ. Плейлист новый или был изменен.
         print(f"КЭШ-ПРОМАХ для плейлиста {playlist_id}.")
 
-        # Шаг 1: Загружаем ID треков
-        track_ids = self.spotify_client.get_playlist_track_ids(
-            playlist_id, cancellation_check, progress_callback)
-        if cancellation_check and cancellation_check():
-            raise InterruptedError("Отменено.")
-
-        # Шаг 2: Обновляем кэш плейлистов (L1)
-        self.playlist_cache[playlist_id] = {
-            "snapshot_id": current_snapshot_id, "track_ids": track_ids}
-
-        # Шаг 3: Находим и загружаем детали для неизвестных треков
-        new_track_ids = [
-            tid for tid in track_ids if tid not in self.track_cache]
-        if new_track_ids:
-            new_track_details = self.spotify_client.get_tracks_details(
-                new_track_ids)
-            self.track_cache.update(new_track_details)
+        # Шаги 1-3: Загружаем ID треков вместе с их информацией и обновляем оба кэша
+        track_ids = self._fetch_playlist_into_cache(
+            playlist_id, current_snapshot_id, cancellation_check, progress_callback)
 
         # Шаг 4: Собираем предварительный список треков для проверки/загрузки обложек
-        current_playlist_tracks = [self.track_cache[tid]
-                                   for tid in track_ids if tid in self.track_cache]
+        current_playlist_tracks = self.track_cache.get_many(track_ids)
 
         # Шаг 5: Если опция включена, скачиваем недостающие обложки
         if self.window.show_covers_action.isChecked():
@@ -1172,7 +1369,7 @@ class SpotifyApp(QObject):
                 current_playlist_tracks, cancellation_check)
 
         # Шаг 6 (ФИНАЛ): Собираем итоговый список из кэша, который теперь точно содержит все данные
-        return [self.track_cache[tid] for tid in track_ids if tid in self.track_cache]
+        return self.track_cache.get_many(track_ids)
 
     def refresh_track_view(self):
         """Запускает умную перезагрузку для текущего плейлиста."""
@@ -1181,7 +1378,7 @@ class SpotifyApp(QObject):
             items = self.window.playlist_list.findItems(
                 self.current_playlist_name, Qt.MatchFlag.MatchExactly)
             if items:
-                self.display_tracks_from_playlist(items[0])
+                self.display_tracks_from_playlist(items[0], fresh=True)
 
     def search_and_display_tracks(self):
         """Инициирует фоновый поиск треков, сбрасывая выделение плейлиста."""
@@ -1207,7 +1404,8 @@ class SpotifyApp(QObject):
         )
 
     def export_tracks(self):
-        if self.window.track_table.rowCount() == 0:
+        track_ids = self._current_view_track_ids()
+        if not track_ids:
             return self.update_status("Нет данных для экспорта.")
         dialog = ExportDialog(self.window)
         if not dialog.exec():
@@ -1215,32 +1413,71 @@ class SpotifyApp(QObject):
         settings = dialog.get_settings()
         if not settings:
             return self.update_status("Ошибка: не все поля для импорта заполнены.")
-        track_data = [{
-            "id": self.window.track_table.item(row, 0).data(Qt.ItemDataRole.UserRole),
-            "name": self.window.track_table.item(row, 0).text(),
-            "artist": self.window.track_table.item(row, 1).text(),
-            "album": self.window.track_table.item(row, 2).text(),
-        } for row in range(self.window.track_table.rowCount())]
         file_extensions = {
-            "csv": "CSV Files (*.csv)", "json": "JSON Files (*.json)", "txt": "Text Files (*.txt)"}
+            "csv": "CSV Files (*.csv)", "json": "JSON Files (*.json)",
+            "jsonl": "JSON Lines Files (*.jsonl)", "txt": "Text Files (*.txt)"}
         default_filename = os.path.join(
             'data', f"{self.current_playlist_name}.{settings['format']}")
         filename, _ = QFileDialog.getSaveFileName(
             self.window, "Сохранить как...", default_filename, file_extensions[settings['format']]
         )
         if filename:
-            exporter_fn, args = None, ()
-            if settings['format'] == 'csv':
-                exporter_fn, args = export_to_csv, (
-                    track_data, filename, settings['columns'])
-            elif settings['format'] == 'json':
-                exporter_fn, args = export_to_json, (track_data, filename)
-            elif settings['format'] == 'txt':
-                exporter_fn, args = export_to_txt, (
-                    track_data, filename, settings['template'])
-            if exporter_fn:
-                self.run_long_task(exporter_fn, self.on_export_finished, *args,
-                                   label_text=f"Экспорт в {settings['format'].upper()}...")
+            # Данные берутся из кэша треков в фоновом потоке и пишутся потоково
+            self.run_long_task(export_cached_tracks, self.on_export_finished,
+                               track_ids, self.track_cache, filename, settings,
+                               label_text=f"Экспорт в {settings['format'].upper()}...")
+
+    def export_library(self):
+        """Экспортирует все плейлисты и 'Понравившиеся' в один архив."""
+        if not self.spotify_client or not self.playlists:
+            return self.update_status("Сначала загрузите список плейлистов.")
+        dialog = ExportDialog(self.window)
+        dialog.setWindowTitle("Экспорт библиотеки")
+        if not dialog.exec():
+            return
+        settings = dialog.get_settings()
+        default_filename = os.path.join(
+            'data', f"spotify_library_{time.strftime('%Y-%m-%d')}.zip")
+        archive_path, _ = QFileDialog.getSaveFileName(
+            self.window, "Сохранить архив как...", default_filename,
+            "ZIP-архив (*.zip);;TAR.GZ-архив (*.tar.gz);;TAR-архив (*.tar)"
+        )
+        if archive_path:
+            self.run_long_task(
+                self._export_library_worker,
+                self.on_library_export_finished,
+                list(self.playlists), archive_path, settings,
+                label_text="Экспорт библиотеки..."
+            )
+
+    def _export_library_worker(self, playlists, archive_path, settings, cancellation_check=None,
+                               progress_callback=None, **kwargs):
+        """
+        Рабочий метод: обновляет устаревшие плейлисты с фоновым приоритетом
+        и записывает архив. Результат - статистика экспорта.
+        """
+        self.cache_loader.wait_until_loaded(cancellation_check)
+        scheduler = self.spotify_client.scheduler
+        with scheduler.priority(PRIORITY_BACKGROUND):
+            return export_library(
+                playlists, self.playlist_cache, self.track_cache, archive_path, settings,
+                get_snapshot_id=self.spotify_client.get_playlist_snapshot_id,
+                refresh_playlist=scheduler.bind_priority(
+                    self._fetch_playlist_into_cache),
+                cancellation_check=cancellation_check,
+                progress_callback=progress_callback)
+
+    def on_library_export_finished(self, stats):
+        self.update_status(
+            f"Библиотека экспортирована: {stats['playlists']} плейлистов, "
+            f"{stats['tracks']} треков за {stats['seconds']:.1f} с "
+            f"(обновлено из Spotify: {stats['refreshed']}, ошибок: {stats['failed']}).")
+
+    def _current_view_track_ids(self) -> list[str]:
+        """ID треков текущего вида: весь плейлист из кэша или показанные результаты."""
+        if self.is_playlist_view and self.current_playlist_id in self.playlist_cache:
+            return list(self.playlist_cache[self.current_playlist_id].get('track_ids', []))
+        return list(self.current_track_ids)
 
     # main.py, внутри класса SpotifyApp
 
@@ -1254,7 +1491,7 @@ class SpotifyApp(QObject):
             self.window,
             "Выберите файл для импорта",
             "data",  # Начальная директория
-            "CSV и JSON файлы (*.csv *.json)"
+            "CSV, JSON и JSON Lines файлы (*.csv *.json *.jsonl)"
         )
 
         # Если файл был выбран, переходим к следующему шагу
@@ -1268,15 +1505,16 @@ class SpotifyApp(QObject):
 
         paste_dialog = PasteTextDialog(self.window)
         if paste_dialog.exec():
-            # Если пользователь вставил текст и сохранил временный CSV
-            csv_filepath = paste_dialog.get_csv_filepath()
-            if csv_filepath:
-                # Переходим к тому же самому шагу, что и при импорте из файла
-                self._show_import_playlist_options(csv_filepath)
+            # Строки уже разобраны в памяти - передаем их сразу в импорт
+            items = paste_dialog.get_items()
+            if items:
+                self._show_import_playlist_options(
+                    paste_dialog.describe(), items=items)
 
-    def _show_import_playlist_options(self, filepath: str):
+    def _show_import_playlist_options(self, filepath: str, items: list[str] | None = None):
         """
-        Принимает путь к файлу и открывает диалог для выбора плейлиста.
+        Принимает путь к файлу (или описание вставленного текста вместе с
+        готовыми строками items) и открывает диалог для выбора плейлиста.
         """
         import os
         dialog = ImportDialog(self.playlists, self.window)
@@ -1290,12 +1528,19 @@ class SpotifyApp(QObject):
         if dialog.exec():
             settings = dialog.get_import_settings()
             if settings:
+                if items is not None:
+                    # Вставленный текст: файла нет, строки передаются напрямую
+                    settings.pop('filepath', None)
+                    settings['items'] = items
+                    source_name = "вставленного текста"
+                else:
+                    source_name = os.path.basename(filepath)
                 # Запускаем первый этап импорта (поиск) в фоновом потоке
                 self.run_long_task(
                     self._perform_import,
                     self.on_import_search_finished,  # Указываем, какой метод вызвать по завершении
                     settings,
-                    label_text=f"Поиск треков из {os.path.basename(filepath)}..."
+                    label_text=f"Поиск треков из {source_name}..."
                 )
             else:
                 self.update_status(
@@ -1306,57 +1551,17 @@ class SpotifyApp(QObject):
         ЭТАП 1: Парсит файл, находит ID треков и определяет целевой плейлист.
         Ничего не добавляет, только собирает информацию.
         """
+        journal = None
         try:
-            # 1. Парсинг и поиск Spotify ID
-            queries_or_ids = parse_file(settings['filepath'])
-            total_to_find = len(queries_or_ids)
-            if total_to_find == 0:
-                raise ValueError("В файле не найдено записей для импорта.")
-
-            found_track_ids = []
-            for i, item in enumerate(queries_or_ids):
-                if cancellation_check and cancellation_check():
-                    raise InterruptedError("Операция отменена.")
-                if progress_callback:
-                    progress_callback(i + 1, total_to_find)
-
-                if len(item) == 22 and item.isalnum():
-                    found_track_ids.append(item)
-                else:
-                    track_id = self.spotify_client.find_track_id(query=item)
-                    if track_id:
-                        found_track_ids.append(track_id)
-
-            if not found_track_ids:
-                raise ValueError("Не найдено ни одного трека для добавления.")
-
-            # 2. Определение целевого плейлиста
-            target_playlist_id = None
-            target_playlist_name = ""
-            if settings['mode'] == 'create':
-                target_playlist_name = settings['target']
-                target_playlist_id = self.spotify_client.create_new_playlist(
-                    name=target_playlist_name)
-                if not target_playlist_id:
-                    raise Exception(
-                        f"Не удалось создать плейлист '{target_playlist_name}'")
-            else:
-                target_playlist_id = settings['target']
-                # Находим имя существующего плейлиста по его ID
-                target_playlist_name = next(
-                    (p['name'] for p in self.playlists if p['id'] == target_playlist_id), "Неизвестный плейлист")
-
-            # 3. Возвращаем всю собранную информацию для следующего шага
-            return {
-                "ok": True,
-                "found_ids": found_track_ids,
-                "target_id": target_playlist_id,
-                "target_name": target_playlist_name,
-                "mode": settings['mode']
-            }
-
+            # Если этот импорт уже запускался и был прерван - продолжаем его
+            journal = ImportJournal(settings)
+            journal.load()
+            return prepare_import(settings, journal, self.spotify_client, self.playlists,
+                                  cancellation_check, progress_callback)
         except Exception as e:
             traceback.print_exc()
+            if journal:
+                journal.close()
             return {"ok": False, "error": str(e)}
 
     def on_import_search_finished(self, result: dict):
@@ -1371,6 +1576,10 @@ class SpotifyApp(QObject):
         target_id = result['target_id']
         target_name = result['target_name']
 
+        # Продолжение прерванного импорта: список треков уже согласован
+        if result.get('resume'):
+            return self._start_import_add(result, found_ids)
+
         # --- НАЧАЛО НОВОЙ ЛОГИКИ: Проверка дубликатов внутри файла ---
 
         # Сохраняем уникальные ID в порядке их появления
@@ -1395,22 +1604,30 @@ class SpotifyApp(QObject):
             if clicked_button == unique_btn:
                 found_ids = unique_ids_in_file  # Используем только уникальные ID
             elif clicked_button != all_btn:  # Если "Отмена" или окно закрыто
+                result['journal'].close()
                 return self.update_status("Импорт отменен.")
 
         # --- КОНЕЦ НОВОЙ ЛОГИКИ ---
 
         # Если добавляем в существующий плейлист, проверяем дубликаты с ним
         if result['mode'] == 'add':
-            existing_ids = self.spotify_client.get_playlist_track_ids(
-                target_id)
-            duplicates_with_playlist = [
-                track_id for track_id in found_ids if track_id in existing_ids]
+            in_playlist = None
+            if self._is_cached_playlist_fresh(target_id):
+                # Состав из кэша актуален - проверяем по нему, без запроса к API
+                in_playlist = self.playlist_cache.contains_many(
+                    target_id, found_ids)
+            if in_playlist is None:
+                existing_ids = set(
+                    self.spotify_client.get_playlist_track_ids(target_id))
+                in_playlist = [
+                    track_id in existing_ids for track_id in found_ids]
+            duplicates_with_playlist = sum(in_playlist)
 
             if duplicates_with_playlist:
                 msg_box = QMessageBox(self.window)
                 msg_box.setWindowTitle("Найдены дубликаты в плейлисте")
                 msg_box.setText(
-                    f"В плейлисте «{target_name}» уже есть <b>{len(duplicates_with_playlist)}</b> из импортируемых треков.")
+                    f"В плейлисте «{target_name}» уже есть <b>{duplicates_with_playlist}</b> из импортируемых треков.")
                 msg_box.setInformativeText("Добавить дубликаты все равно?")
 
                 add_all_btn = msg_box.addButton(
@@ -1422,33 +1639,65 @@ class SpotifyApp(QObject):
 
                 clicked_button = msg_box.clickedButton()
                 if clicked_button == skip_btn:
-                    found_ids = [
-                        track_id for track_id in found_ids if track_id not in existing_ids]
+                    found_ids = [track_id for track_id, is_duplicate in zip(
+                        found_ids, in_playlist) if not is_duplicate]
                 elif clicked_button != add_all_btn:
+                    result['journal'].close()
                     return self.update_status("Импорт отменен.")
 
         if not found_ids:
+            result['journal'].complete()
             return self.update_status("Нет новых треков для добавления.")
 
-        # ЭТАП 3: Запускаем финальную задачу по добавлению треков
-        self.run_long_task(
-            self.spotify_client.add_tracks_to_playlist,
-            # --> ИСПРАВЛЕНИЕ: Передаем target_id в лямбда-функцию <--
+        result['journal'].record_plan(found_ids)
+        self._start_import_add(result, found_ids)
+
+    def _start_import_add(self, result: dict, found_ids: list[str]):
+        """ЭТАП 3: Запускает финальную задачу по добавлению треков."""
+        target_id = result['target_id']
+        target_name = result['target_name']
+        # Импорты разных файлов идут параллельно, один и тот же - только один раз
+        task_name = f"import:{result['journal'].path}"
+        if task_name in self.background_tasks:
+            result['journal'].close()
+            return self.update_status(f"Этот импорт в '{target_name}' уже выполняется.")
+        # Треки добавляются в фоне: пока идет импорт, можно работать с другими плейлистами
+        self.run_background_task(
+            task_name,
+            self._import_add_worker,
             lambda _: self.on_import_add_finished(
-                len(found_ids), target_name, target_id),
-            target_id,
-            found_ids,
+                len(found_ids), target_name, target_id, len(result.get('unresolved', []))),
+            {"journal": result['journal'], "target_id": target_id,
+             "track_ids": found_ids},
             label_text=f"Добавление треков в '{target_name}'..."
         )
 
-    def on_import_add_finished(self, count, playlist_name, playlist_id):
+    def _import_add_worker(self, params: dict, **kwargs):
+        """
+        Рабочий метод: добавляет треки импорта, отмечая в журнале каждый
+        добавленный пакет. Пакеты, добавленные до прерывания, пропускаются.
+        """
+        add_planned_tracks(
+            params['journal'], self.spotify_client, params['target_id'], params['track_ids'],
+            kwargs.get('cancellation_check'), kwargs.get('progress_callback'))
+
+    def _is_cached_playlist_fresh(self, playlist_id: str) -> bool:
+        """
+        Совпадает ли snapshot_id плейлиста в кэше с текущим. Версия всегда
+        запрашивается у сервера: по результату решается, что менять в плейлисте.
+        """
+        snapshot_id = self.spotify_client.get_playlist_snapshot_id(playlist_id, fresh=True)
+        return bool(snapshot_id) and self.playlist_cache.get_snapshot_id(playlist_id) == snapshot_id
+
+    def on_import_add_finished(self, count, playlist_name, playlist_id, unresolved_count=0):
         """Вызывается после завершения добавления треков в плейлист."""
-        self.update_status(
-            f"Успешно добавлено {count} треков в плейлист '{playlist_name}'.")
+        message = f"Успешно добавлено {count} треков в плейлист '{playlist_name}'."
+        if unresolved_count:
+            message += f" Не найдено строк: {unresolved_count} (подробности в консоли)."
+        self.update_status(message)
 
         # 1. Инвалидируем кэш для измененного плейлиста
-        if playlist_id in self.playlist_cache:
-            del self.playlist_cache[playlist_id]
+        if self.playlist_cache.discard(playlist_id):
             print(
                 f"Кэш для плейлиста {playlist_id} инвалидирован после импорта.")
 
@@ -1512,7 +1761,8 @@ class SpotifyApp(QObject):
             self.window.playlist_list.setCurrentItem(newly_selected_item)
 
         # Запускаем фоновый процесс синхронизации с новым обработчиком
-        self.run_long_task(
+        self.run_background_task(
+            'sync',
             self._sync_cached_playlists_worker,
             self.on_sync_finished,  # <-- Используем новый обработчик
             playlists,
@@ -1537,7 +1787,8 @@ class SpotifyApp(QObject):
         #    и включен режим показа обложек, запускаем их фоновую дозагрузку.
         if self.is_playlist_view and self.window.show_covers_action.isChecked():
             print("Режим просмотра плейлиста, запускаю проверку и дозагрузку обложек...")
-            self.run_long_task(
+            self.run_background_task(
+                'covers',
                 self._download_covers_worker,
                 self.on_covers_downloaded,
                 label_text="Загрузка обложек..."
@@ -1564,8 +1815,7 @@ class SpotifyApp(QObject):
         """Обработчик после удаления плейлиста. ИНВАЛИДИРУЕТ КЭШ."""
         # ID удаляемого плейлиста мы сохраняли в self.current_playlist_id
         playlist_id_to_invalidate = self.current_playlist_id
-        if playlist_id_to_invalidate in self.playlist_cache:
-            del self.playlist_cache[playlist_id_to_invalidate]
+        if self.playlist_cache.discard(playlist_id_to_invalidate):
             print(
                 f"Кэш для плейлиста {playlist_id_to_invalidate} инвалидирован.")
 
@@ -1577,6 +1827,7 @@ class SpotifyApp(QObject):
 
     def populate_track_table(self, tracks: list[dict]):
         """Очищает и заполняет таблицу треков, правильно масштабируя и скругляя обложки."""
+        self.current_track_ids = [track.get('id') for track in tracks]
         self.window.track_table.blockSignals(True)
         self.window.track_table.setRowCount(0)
         self.window.track_table.setRowCount(len(tracks))
@@ -1617,17 +1868,14 @@ class SpotifyApp(QObject):
         self.settings['show_covers'] = checked
         self.window.track_table.setColumnHidden(0, not checked)
         if checked:
-            self.run_long_task(self._download_covers_worker,
-                               self.on_covers_downloaded, label_text="Загрузка обложек...")
+            self.run_background_task('covers', self._download_covers_worker,
+                                     self.on_covers_downloaded, label_text="Загрузка обложек...")
 
     def _download_covers_worker(self, cancellation_check=None, progress_callback=None, **kwargs):
         """Рабочий метод: скачивает недостающие обложки для всех треков в кэше."""
         os.makedirs(self.covers_dir, exist_ok=True)
 
-        tracks_to_download = [
-            track for track in self.track_cache.values()
-            if track.get('cover_url') and not track.get('cover_path')
-        ]
+        tracks_to_download = self.track_cache.without_cover()
 
         total_covers = len(tracks_to_download)
         for i, track in enumerate(tracks_to_download):
@@ -1638,12 +1886,12 @@ class SpotifyApp(QObject):
 
             filepath = os.path.join(self.covers_dir, f"{track['id']}.jpg")
             try:
-                response = requests.get(track['cover_url'])
+                response = get_session().get(track['cover_url'])
                 response.raise_for_status()
                 with open(filepath, 'wb') as f:
                     f.write(response.content)
                 # Обновляем кэш, добавляя путь к скачанному файлу
-                self.track_cache[track['id']]['cover_path'] = filepath
+                self.track_cache.set_fields(track['id'], cover_path=filepath)
             except requests.RequestException as e:
                 print(f"Не удалось скачать обложку для {track['id']}: {e}")
 
@@ -1674,8 +1922,7 @@ class SpotifyApp(QObject):
 
         # 4. Получаем для них самые свежие данные из глобального кэша треков
         # (включая только что добавленные пути к обложкам)
-        tracks_to_display = [self.track_cache[tid]
-                             for tid in track_ids if tid in self.track_cache]
+        tracks_to_display = self.track_cache.get_many(track_ids)
 
         # 5. Напрямую перерисовываем таблицу с этими данными
         print("Обновление таблицы для отображения скачанных обложек...")
@@ -1740,8 +1987,7 @@ class SpotifyApp(QObject):
         Универсальный обработчик, который вызывается после любого изменения плейлиста.
         """
         # 1. Инвалидируем кэш для того плейлиста, который был изменен
-        if playlist_id_modified in self.playlist_cache:
-            del self.playlist_cache[playlist_id_modified]
+        if self.playlist_cache.discard(playlist_id_modified):
             print(f"Кэш для плейлиста {playlist_id_modified} инвалидирован.")
 
         # 2. Формируем и показываем сообщение в строке состояния
@@ -1792,7 +2038,11 @@ class SpotifyApp(QObject):
     # --> НОВЫЙ МЕТОД, ВЫПОЛНЯЕМЫЙ В ПОТОКЕ (ТОЛЬКО ЧТЕНИЕ) <--
     def _find_duplicates_info(self, playlist_id: str, cancellation_check=None, progress_callback=None, **kwargs) -> tuple:
         """Находит дубликаты и возвращает информацию о них, ничего не удаляя."""
-        from collections import Counter
+        # Состав из кэша актуален - считаем по упакованному массиву ключей
+        if self._is_cached_playlist_fresh(playlist_id):
+            num_duplicates = self.playlist_cache.count_duplicates(playlist_id)
+            if num_duplicates is not None:
+                return (playlist_id, num_duplicates)
 
         # --> ИСПРАВЛЕНИЕ: Вызываем новый правильный метод <--
         track_ids = self.spotify_client.get_playlist_track_ids(
@@ -1801,10 +2051,7 @@ class SpotifyApp(QObject):
         if cancellation_check and cancellation_check():
             raise InterruptedError("Операция отменена.")
 
-        # Теперь нам не нужно извлекать ID, мы их уже получили
-        counts = Counter(track_ids)
-        num_duplicates = sum(
-            count - 1 for count in counts.values() if count > 1)
+        num_duplicates = len(track_ids) - len(set(track_ids))
 
         # Возвращаем ID плейлиста и количество найденных дубликатов
         return (playlist_id, num_duplicates)
@@ -1856,12 +2103,18 @@ if __name__ == '__main__':
     spotify_app = SpotifyApp()
 
     # --> НОВОЕ: Подключаем сохранение кэша к сигналу о выходе <--
+    # Фоновые задачи пишут в кэш - останавливаем их до закрытия базы
+    app.aboutToQuit.connect(spotify_app.stop_background_tasks)
     app.aboutToQuit.connect(spotify_app.save_cache)
+    app.aboutToQuit.connect(spotify_app.search_cache.save)
     app.aboutToQuit.connect(spotify_app.save_settings)
+    app.aboutToQuit.connect(spotify_app.print_network_stats)
 
     if spotify_app.auth_manager.get_cached_token():
         print("Обнаружен кешированный токен, автоматический вход...")
         spotify_app.on_login_success()
 
     spotify_app.window.show()
+    # Срабатывает после первой отрисовки окна, когда им уже можно пользоваться
+    QTimer.singleShot(0, spotify_app.report_time_to_interactive)
     sys.exit(app.exec())
@@ -0,0 +1,161 @@
+# packed_ids.py
+
+import heapq
+import sys
+import threading
+from array import array
+
+# Тип элементов массива: беззнаковое 32-битное целое
+KEY_TYPECODE = 'I'
+
+
+class TrackIdTable:
+    """
+    Глобальная таблица ID треков: каждой 22-символьной строке сопоставлен
+    небольшой целый ключ. Плейлисты хранят массивы ключей, а в строки они
+    превращаются только на границе с API и интерфейсом.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = {}   # ID трека -> ключ
+        self._ids = []    # ключ -> ID трека (None - свободный ключ)
+        self._free = []   # свободные ключи (куча), выдаются повторно
+        self._unsaved = []  # новые пары (ключ, ID), еще не записанные в базу
+
+    def load(self, pairs):
+        """Загружает сохраненные пары (ключ, ID) в таблицу."""
+        with self._lock:
+            for key, track_id in pairs:
+                if key >= len(self._ids):
+                    self._ids.extend([None] * (key + 1 - len(self._ids)))
+                self._ids[key] = track_id
+                self._keys[track_id] = key
+            self._collect_free()
+
+    def reset(self, pairs=()):
+        """Заменяет содержимое таблицы сохраненными парами (ключ, ID)."""
+        with self._lock:
+            self._keys = {}
+            self._ids = []
+            self._unsaved = []
+        self.load(pairs)
+
+    def _collect_free(self):
+        while self._ids and self._ids[-1] is None:
+            self._ids.pop()
+        self._free = [key for key, track_id in enumerate(self._ids) if track_id is None]
+
+    def encode(self, track_ids) -> array:
+        """Превращает ID треков в массив ключей, добавляя новые ID в таблицу."""
+        result = array(KEY_TYPECODE)
+        with self._lock:
+            keys = self._keys
+            for track_id in track_ids:
+                key = keys.get(track_id)
+                if key is None:
+                    if self._free:
+                        key = heapq.heappop(self._free)
+                        self._ids[key] = track_id
+                    else:
+                        key = len(self._ids)
+                        self._ids.append(track_id)
+                    keys[track_id] = key
+                    self._unsaved.append((key, track_id))
+                result.append(key)
+        return result
+
+    def unused_keys(self, referenced: bytearray) -> list[int]:
+        """Занятые ключи, не отмеченные в битовой карте referenced."""
+        with self._lock:
+            return [key for key, track_id in enumerate(self._ids)
+                    if track_id is not None and (key >= len(referenced) or not referenced[key])]
+
+    def discard(self, keys):
+        """Освобождает ключи: их ID удаляются из таблицы, ключи выдаются повторно."""
+        keys = set(keys)
+        if not keys:
+            return
+        with self._lock:
+            for key in keys:
+                track_id = self._ids[key] if key < len(self._ids) else None
+                if track_id is not None:
+                    del self._keys[track_id]
+                    self._ids[key] = None
+            self._unsaved = [pair for pair in self._unsaved if pair[0] not in keys]
+            self._collect_free()
+
+    def key_of(self, track_id: str) -> int | None:
+        """Ключ ID трека или None, если его нет в таблице (таблица не меняется)."""
+        return self._keys.get(track_id)
+
+    def decode(self, keys) -> list[str]:
+        ids = self._ids
+        return [ids[key] for key in keys]
+
+    def take_unsaved(self) -> list[tuple[int, str]]:
+        """Забирает новые пары для записи в базу."""
+        with self._lock:
+            unsaved, self._unsaved = self._unsaved, []
+            return unsaved
+
+    def restore_unsaved(self, pairs):
+        """Возвращает пары, которые не удалось записать (транзакция откатилась)."""
+        with self._lock:
+            self._unsaved[:0] = pairs
+
+    def key_limit(self) -> int:
+        """Все выданные ключи меньше этого числа (размер битовой карты ключей)."""
+        return len(self._ids)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+
+# --- Упаковка для хранения ---
+
+def pack(keys: array) -> bytes:
+    """Массив ключей -> байты (всегда little-endian)."""
+    if sys.byteorder != 'little':
+        keys = array(KEY_TYPECODE, keys)
+        keys.byteswap()
+    return keys.tobytes()
+
+
+def unpack(data: bytes | None) -> array:
+    keys = array(KEY_TYPECODE)
+    if data:
+        keys.frombytes(data)
+        if sys.byteorder != 'little':
+            keys.byteswap()
+    return keys
+
+
+# --- Операции над массивами ключей ---
+# Вместо множеств строк используются битовые карты размером с таблицу ID:
+# проверка принадлежности - обращение по индексу, без хэширования.
+
+def to_bitmap(keys, size: int) -> bytearray:
+    bitmap = bytearray(size)
+    for key in keys:
+        bitmap[key] = 1
+    return bitmap
+
+
+def _bitmap_size(keys) -> int:
+    return max(keys, default=-1) + 1
+
+
+def dedup(keys: array) -> array:
+    """Уникальные ключи в порядке первого появления."""
+    seen = bytearray(_bitmap_size(keys))
+    result = array(KEY_TYPECODE)
+    for key in keys:
+        if not seen[key]:
+            seen[key] = 1
+            result.append(key)
+    return result
+
+
+def count_duplicates(keys: array) -> int:
+    return len(keys) - len(dedup(keys))
@@ -1,16 +1,17 @@
 # paste_text_dialog.py
 
-import os
-
 from PyQt6.QtWidgets import (
     QDialog, QVBoxLayout, QTextEdit, QLabel,
-    QDialogButtonBox, QFileDialog
+    QDialogButtonBox
 )
 
+from importer import parse_pasted_text, LINE_ID, LINE_URI, LINE_URL, LINE_QUERY
+
 
 class PasteTextDialog(QDialog):
     """
-    Диалоговое окно для вставки текста и создания из него CSV-файла.
+    Диалоговое окно для вставки списка треков.
+    Текст разбирается в памяти и передается в импорт без временных файлов.
     """
 
     def __init__(self, parent=None):
@@ -23,7 +24,8 @@ class PasteTextDialog(QDialog):
         info_label = QLabel(
             "Вставьте список треков в поле ниже. "
             "Каждый трек должен быть на новой строке.\n"
-            "Идеальный формат: <b>Исполнитель - Название</b>"
+            "Подходят ссылки open.spotify.com, URI spotify:track:..., ID треков "
+            "и строки вида <b>Исполнитель - Название</b>"
         )
         layout.addWidget(info_label)
 
@@ -32,7 +34,7 @@ class PasteTextDialog(QDialog):
             "Пример:\n"
             "Queen - Bohemian Rhapsody\n"
             "Nirvana - Smells Like Teen Spirit\n"
-            "The Beatles - Hey Jude"
+            "https://open.spotify.com/track/4u7EnebtmKWzUH433cf5Qv"
         )
         layout.addWidget(self.text_edit)
 
@@ -42,57 +44,30 @@ class PasteTextDialog(QDialog):
         button_box.rejected.connect(self.reject)
         layout.addWidget(button_box)
 
-        self.csv_filepath = None
+        self.items = []
+        self.counts = {}
 
     def process_and_accept(self):
-        """Анализирует текст и предлагает сохранить его как CSV."""
-        text = self.text_edit.toPlainText().strip()
-        if not text:
-            self.reject()
-            return
-
-        lines = text.splitlines()
-
-        default_save_path = os.path.join('data', 'temp_import.csv')
-
-        save_path, _ = QFileDialog.getSaveFileName(
-            self,
-            "Сохранить временный CSV-файл",
-            default_save_path,  # Используем новый путь
-            "CSV Files (*.csv)"
-        )
-
-        if not save_path:
+        """Разбирает вставленный текст на строки для импорта."""
+        self.items, self.counts = parse_pasted_text(
+            self.text_edit.toPlainText())
+        if not self.items:
             self.reject()
             return
 
-        # Создаем CSV-файл
-        try:
-            import csv
-            with open(save_path, 'w', newline='', encoding='utf-8-sig') as f:
-                writer = csv.writer(f)
-                writer.writerow(['artist', 'name'])  # Заголовки
-                for line in lines:
-                    line = line.strip()
-                    if not line:
-                        continue
-
-                    # Пытаемся разделить строку по " - "
-                    parts = line.split(' - ', 1)
-                    if len(parts) == 2:
-                        artist, name = parts
-                        writer.writerow([artist.strip(), name.strip()])
-                    else:
-                        # Если разделить не удалось, считаем всю строку названием
-                        writer.writerow(['', line])
-
-            self.csv_filepath = save_path
-            self.accept()  # Закрываем диалог с успехом
-
-        except Exception as e:
-            print(f"Ошибка при создании временного CSV: {e}")
-            self.reject()
-
-    def get_csv_filepath(self):
-        """Возвращает путь к созданному CSV-файлу."""
-        return self.csv_filepath
+        print(
+            f"Вставлено строк: {len(self.items)} (ID: {self.counts[LINE_ID]}, "
+            f"URI: {self.counts[LINE_URI]}, ссылок: {self.counts[LINE_URL]}, "
+            f"запросов: {self.counts[LINE_QUERY]}).")
+        self.accept()
+
+    def get_items(self) -> list[str]:
+        """Возвращает строки для импорта: ID треков и текстовые запросы."""
+        return self.items
+
+    def describe(self) -> str:
+        """Короткое описание вставленного текста для диалога импорта."""
+        direct = self.counts.get(LINE_ID, 0) + \
+            self.counts.get(LINE_URI, 0) + self.counts.get(LINE_URL, 0)
+        return (f"Вставленный текст: {len(self.items)} строк "
+                f"(ссылок и ID: {direct}, запросов: {self.counts.get(LINE_QUERY, 0)})")
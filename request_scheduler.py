@@ -0,0 +1,244 @@
+# request_scheduler.py
+
+import heapq
+import itertools
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Приоритеты запросов: чем меньше число, тем раньше запрос получит токен
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+# 429 означает, что сервер отклонил запрос, не выполняя его, - повтор безопасен
+# для любого метода. После ошибок сервера повторяются только идемпотентные
+# методы: добавление треков (POST) могло уже выполниться.
+THROTTLED_STATUS = 429
+SERVER_ERROR_STATUSES = (500, 502, 503, 504)
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'DELETE'])
+# Шаг, с которым пауза перед повтором проверяет отмену операции
+CANCELLATION_POLL_INTERVAL = 0.2
+
+# Проверка отмены текущей операции (задается рабочим потоком, см. cancellation_scope)
+_cancellation = threading.local()
+
+
+def current_cancellation_check():
+    return getattr(_cancellation, 'check', None)
+
+
+@contextmanager
+def cancellation_scope(cancellation_check):
+    """
+    Связывает проверку отмены с запросами текущего потока: паузы перед
+    повторами и ожидание токена прерываются InterruptedError.
+    """
+    previous = current_cancellation_check()
+    _cancellation.check = cancellation_check
+    try:
+        yield
+    finally:
+        _cancellation.check = previous
+
+
+def _raise_if_cancelled():
+    check = current_cancellation_check()
+    if check and check():
+        raise InterruptedError("Операция отменена.")
+
+
+class RequestScheduler:
+    """
+    Общий планировщик запросов к API: ведро токенов ограничивает частоту,
+    ответ 429 с Retry-After приостанавливает ВСЕ запросы на указанное время,
+    а при ожидании токена первыми проходят запросы с более высоким приоритетом.
+    """
+
+    def __init__(self, rate: float = 8.0, burst: int = 16, max_retries: int = 5,
+                 base_backoff: float = 0.5, max_backoff: float = 30.0):
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+
+        self._cond = threading.Condition()
+        self._tokens = float(burst)
+        self._last_refill = time.monotonic()
+        self._paused_until = 0.0
+        self._waiters = []
+        self._counter = itertools.count()
+        self._local = threading.local()
+
+        self._stats = {'requests': 0, 'throttled': 0,
+                       'retries': 0, 'waited_seconds': 0.0}
+
+    # --- Приоритеты ---
+
+    def current_priority(self) -> int:
+        return getattr(self._local, 'priority', PRIORITY_INTERACTIVE)
+
+    @contextmanager
+    def priority(self, level: int):
+        """Задает приоритет всех запросов текущего потока внутри блока with."""
+        previous = self.current_priority()
+        self._local.priority = level
+        try:
+            yield
+        finally:
+            self._local.priority = previous
+
+    def bind_priority(self, fn):
+        """
+        Возвращает обертку над fn, которая выполняется с приоритетом и
+        проверкой отмены вызывающего потока. Нужна для задач, отправляемых
+        в пулы потоков.
+        """
+        level = self.current_priority()
+        cancellation_check = current_cancellation_check()
+
+        def wrapper(*args, **kwargs):
+            with self.priority(level), cancellation_scope(cancellation_check):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    # --- Ведро токенов ---
+
+    def _refill(self, now: float):
+        elapsed = now - self._last_refill
+        if elapsed > 0:
+            self._tokens = min(float(self.burst),
+                               self._tokens + elapsed * self.rate)
+            self._last_refill = now
+
+    def acquire(self, priority: int | None = None):
+        """Блокирует поток, пока не будет получен токен на один запрос."""
+        if priority is None:
+            priority = self.current_priority()
+        ticket = (priority, next(self._counter))
+        started = time.monotonic()
+
+        with self._cond:
+            heapq.heappush(self._waiters, ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    is_first = self._waiters[0] == ticket
+                    if is_first and now >= self._paused_until and self._tokens >= 1:
+                        self._tokens -= 1
+                        heapq.heappop(self._waiters)
+                        self._stats['requests'] += 1
+                        self._stats['waited_seconds'] += now - started
+                        self._cond.notify_all()
+                        return
+
+                    if not is_first:
+                        timeout = None
+                    elif now < self._paused_until:
+                        timeout = self._paused_until - now
+                    else:
+                        timeout = (1 - self._tokens) / self.rate
+                    if current_cancellation_check():
+                        timeout = min(timeout or CANCELLATION_POLL_INTERVAL,
+                                      CANCELLATION_POLL_INTERVAL)
+                    self._cond.wait(timeout)
+                    _raise_if_cancelled()
+            except BaseException:
+                # Поток прерван во время ожидания - убираем его из очереди
+                if ticket in self._waiters:
+                    self._waiters.remove(ticket)
+                    heapq.heapify(self._waiters)
+                    self._cond.notify_all()
+                raise
+
+    # --- Повторы ---
+
+    def retry_delay(self, attempt: int, retry_after: str | None = None) -> float:
+        """
+        Считает паузу перед повтором: Retry-After от сервера, если он есть,
+        иначе экспоненциальная задержка. В обоих случаях добавляется случайный
+        разброс, чтобы потоки не возвращались одновременно.
+        """
+        try:
+            seconds = float(retry_after) if retry_after is not None else None
+        except ValueError:
+            seconds = None
+
+        if seconds is not None:
+            return seconds + random.uniform(0, 0.1 + seconds * 0.1)
+        delay = min(self.max_backoff, self.base_backoff * (2 ** attempt))
+        return random.uniform(delay / 2, delay)
+
+    def on_throttled(self, attempt: int, status_code: int, retry_after: str | None = None) -> float:
+        """
+        Регистрирует неудачный ответ и возвращает паузу перед повтором.
+        При 429 пауза распространяется на все запросы, а не только на текущий.
+        """
+        delay = self.retry_delay(attempt, retry_after)
+        with self._cond:
+            self._stats['retries'] += 1
+            if status_code == 429:
+                self._stats['throttled'] += 1
+                self._paused_until = max(
+                    self._paused_until, time.monotonic() + delay)
+                self._cond.notify_all()
+        return delay
+
+    def sleep(self, delay: float):
+        """Пауза перед повтором, прерываемая отменой операции."""
+        deadline = time.monotonic() + delay
+        while True:
+            _raise_if_cancelled()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            time.sleep(min(remaining, CANCELLATION_POLL_INTERVAL))
+
+    def stats(self) -> dict:
+        with self._cond:
+            return dict(self._stats)
+
+
+class ScheduledAdapter(HTTPAdapter):
+    """
+    Транспортный адаптер requests, пропускающий каждый запрос через планировщик.
+    После 429 повторяется любой запрос (с паузой из Retry-After), после ошибок
+    сервера - только идемпотентные (GET/HEAD/DELETE).
+    """
+
+    def __init__(self, scheduler: RequestScheduler, **kwargs):
+        self.scheduler = scheduler
+        # Повторы по статусу делает планировщик, urllib3 повторяет только сбои
+        # соединения (и не должен сам обрабатывать Retry-After у 429/503)
+        kwargs.setdefault('max_retries', Retry(
+            total=3, read=False, status=0, backoff_factor=0.3,
+            respect_retry_after_header=False, raise_on_status=False))
+        super().__init__(**kwargs)
+
+    @staticmethod
+    def is_retryable(method: str, status_code: int) -> bool:
+        if status_code == THROTTLED_STATUS:
+            return True
+        return status_code in SERVER_ERROR_STATUSES and method.upper() in IDEMPOTENT_METHODS
+
+    def send(self, request, **kwargs):
+        attempt = 0
+        while True:
+            self.scheduler.acquire()
+            response = super().send(request, **kwargs)
+            if not self.is_retryable(request.method, response.status_code) or \
+                    attempt >= self.scheduler.max_retries:
+                return response
+
+            delay = self.scheduler.on_throttled(
+                attempt, response.status_code, response.headers.get('Retry-After'))
+            print(
+                f"Ответ {response.status_code} от {request.url}, повтор через {delay:.1f} с.")
+            response.close()
+            self.scheduler.sleep(delay)
+            attempt += 1
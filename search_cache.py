@@ -0,0 +1,111 @@
+# search_cache.py
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Сколько живет результат поиска (секунды) и сколько запросов храним
+SEARCH_CACHE_TTL = 7 * 24 * 60 * 60
+SEARCH_CACHE_MAX_ENTRIES = 20000
+
+
+def normalize_query(query: str) -> str:
+    """Приводит запрос к единому виду: регистр и лишние пробелы не важны."""
+    return ' '.join(query.casefold().split())
+
+
+class SearchCache:
+    """
+    Постоянный кэш "запрос -> список ID треков" со сроком жизни записей
+    и ограничением размера (вытесняются давно не использованные запросы).
+    """
+
+    def __init__(self, filepath: str | None = None, ttl: float = SEARCH_CACHE_TTL,
+                 max_entries: int = SEARCH_CACHE_MAX_ENTRIES):
+        self.filepath = filepath
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # ключ -> [время сохранения, список ID]; порядок = порядок использования
+        self._entries = OrderedDict()
+        self._stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0}
+
+    @staticmethod
+    def _key(query: str, limit: int) -> str:
+        return f"{limit}|{normalize_query(query)}"
+
+    def get(self, query: str, limit: int) -> list[str] | None:
+        """Возвращает сохраненный результат или None, если его нет или он устарел."""
+        key = self._key(query, limit)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            if time.time() - entry[0] > self.ttl:
+                del self._entries[key]
+                self._stats['expired'] += 1
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return list(entry[1])
+
+    def put(self, query: str, limit: int, track_ids: list[str]):
+        key = self._key(query, limit)
+        with self._lock:
+            self._entries[key] = [time.time(), list(track_ids)]
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+    def load(self):
+        """Загружает кэш из файла, отбрасывая устаревшие записи."""
+        if not self.filepath or not os.path.exists(self.filepath):
+            return
+        try:
+            with open(self.filepath, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            print(f"Ошибка при чтении кэша поиска: {e}. Кэш поиска будет сброшен.")
+            return
+
+        now = time.time()
+        with self._lock:
+            self._entries.clear()
+            # В файле записи лежат от давно использованных к недавним
+            for key, entry in data.get('entries', []):
+                if now - entry[0] <= self.ttl:
+                    self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        print(f"Кэш поиска загружен: {len(self._entries)} запросов.")
+
+    def save(self):
+        """Сохраняет кэш во временный файл и атомарно подменяет им основной."""
+        if not self.filepath:
+            return
+        with self._lock:
+            entries = list(self._entries.items())
+        tmp_path = self.filepath + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'entries': entries}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.filepath)
+        except IOError as e:
+            print(f"Ошибка при сохранении кэша поиска: {e}")
@@ -0,0 +1,83 @@
+# single_flight.py
+
+import threading
+
+
+class _Call:
+    """Один выполняющийся вызов, результат которого ждут все совпавшие запросы."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.abandoned = False
+
+
+class SingleFlight:
+    """
+    Объединяет одинаковые одновременные вызовы: пока вызов с ключом key
+    выполняется, остальные потоки с тем же ключом не отправляют свой запрос,
+    а ждут и получают тот же результат (или то же исключение).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {'calls': 0, 'executed': 0, 'coalesced': 0}
+
+    def do(self, key, fn, *args, cancellation_check=None, **kwargs):
+        """
+        Выполняет fn(*args, **kwargs) или присоединяется к уже идущему вызову.
+        cancellation_check относится к вызывающему потоку: если первый вызов
+        был отменен, его (возможно неполный) результат остальным не отдается -
+        они выполняют запрос заново.
+        """
+        while True:
+            with self._lock:
+                self._stats['calls'] += 1
+                call = self._calls.get(key)
+                is_leader = call is None
+                if is_leader:
+                    call = _Call()
+                    self._calls[key] = call
+                    self._stats['executed'] += 1
+                else:
+                    self._stats['coalesced'] += 1
+
+            if is_leader:
+                return self._run(key, call, fn, args, kwargs, cancellation_check)
+
+            call.done.wait()
+            if call.abandoned:
+                with self._lock:
+                    # Запрос не сэкономлен - повторяем его сами
+                    self._stats['calls'] -= 1
+                    self._stats['coalesced'] -= 1
+                continue
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+    def _run(self, key, call, fn, args, kwargs, cancellation_check):
+        try:
+            if cancellation_check is not None:
+                kwargs['cancellation_check'] = cancellation_check
+            call.result = fn(*args, **kwargs)
+            if cancellation_check and cancellation_check():
+                call.abandoned = True
+            return call.result
+        except InterruptedError:
+            call.abandoned = True
+            raise
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self) -> dict:
+        """Счетчики: всего вызовов, реально выполнено, сэкономлено объединением."""
+        with self._lock:
+            return dict(self._stats)
@@ -1,7 +1,48 @@
 # spotify_client.py
 
+import time
+import requests
 import spotipy
+from concurrent.futures import ThreadPoolExecutor
 from itertools import islice
+from urllib.parse import urlparse, parse_qs, urlencode, urlunparse
+
+from http_session import get_session, mount_scheduler
+from request_scheduler import RequestScheduler
+from single_flight import SingleFlight
+from liked_index import LikedIndex
+from search_cache import SearchCache
+from track_record import TrackRecord
+
+# Сколько страниц одного списка загружается параллельно
+PAGE_FETCH_WORKERS = 8
+# Параметры пакетной загрузки информации о треках (sp.tracks, до 50 ID)
+TRACK_DETAILS_WORKERS = 4
+TRACK_DETAILS_RETRIES = 2
+# Сколько секунд snapshot_id из индекса плейлистов считается актуальным:
+# плейлист могли изменить в другом приложении, а индекс об этом не узнает
+SNAPSHOT_INDEX_MAX_AGE = 60.0
+# Ограничения API на число треков в одном запросе на изменение
+PLAYLIST_WRITE_LIMIT = 100
+LIBRARY_WRITE_LIMIT = 50
+# Проекция полей плейлиста, достаточная для заполнения кэша треков без sp.tracks
+HYDRATED_PLAYLIST_FIELDS = (
+    'items(track(id,type,is_local,name,artists(name),album(name,images))),next,total')
+
+
+class WriteBatchError(Exception):
+    """
+    Пакет изменений не записан. uncertain=True - ответа нет (таймаут, обрыв
+    соединения, ошибка сервера), и пакет мог быть уже применен: повторять его
+    вслепую нельзя, иначе треки добавятся дважды.
+    """
+
+    def __init__(self, index: int, batch: list, uncertain: bool, cause: Exception):
+        state = "результат неизвестен" if uncertain else "не записан"
+        super().__init__(f"Пакет изменений {index + 1}: {state} ({cause})")
+        self.index = index
+        self.batch = batch
+        self.uncertain = uncertain
 
 
 def chunks(iterable, size=50):
@@ -12,11 +53,28 @@ def chunks(iterable, size=50):
 
 
 class SpotifyClient:
-    def __init__(self, spotipy_oauth_manager):
+    def __init__(self, spotipy_oauth_manager, scheduler: RequestScheduler | None = None,
+                 search_cache: SearchCache | None = None):
+        # Все запросы к API проходят через общий планировщик:
+        # ограничение частоты, Retry-After и приоритеты
+        self.scheduler = scheduler or RequestScheduler()
+        mount_scheduler(self.scheduler)
         self.sp = spotipy.Spotify(
             auth_manager=spotipy_oauth_manager,
+            requests_session=get_session(),
             requests_timeout=10
         )
+        # Индекс плейлистов: id -> {'snapshot_id': ..., 'total': ..., 'indexed_at': ...}.
+        # Заполняется из списка плейлистов и после изменений через API,
+        # чтобы проверка актуальности кэша не требовала отдельных запросов.
+        # Записи старше SNAPSHOT_INDEX_MAX_AGE не используются.
+        self.playlist_index = {}
+        # Одинаковые одновременные запросы на чтение выполняются один раз
+        self.single_flight = SingleFlight()
+        # Локальное множество лайков: проверка статуса без запросов к API
+        self.liked_index = LikedIndex()
+        # Кэш результатов поиска (по умолчанию - только в памяти)
+        self.search_cache = search_cache or SearchCache()
 
     def get_user_playlists(self, cancellation_check=None, progress_callback=None, **kwargs) -> list[dict]:
         """Возвращает список плейлистов пользователя, включая "Понравившиеся треки"."""
@@ -25,20 +83,53 @@ class SpotifyClient:
                            'name': 'Понравившиеся треки (Liked Songs)'}]
 
         # Запрашиваем плейлисты пользователя
-        results = self.sp.current_user_playlists()
+        results = self.sp.current_user_playlists(limit=50)
 
         # Собираем плейлисты со всех страниц ответа
         all_playlist_items = self._get_all_items(
             results, cancellation_check, progress_callback)
 
+        playlist_index = {}
+        indexed_at = time.monotonic()
         for item in all_playlist_items:
             if item:  # Дополнительная проверка на пустые элементы
-                playlists_data.append({'id': item['id'], 'name': item['name']})
-
+                snapshot_id = item.get('snapshot_id')
+                total = (item.get('tracks') or {}).get('total')
+                playlists_data.append({'id': item['id'], 'name': item['name'],
+                                       'snapshot_id': snapshot_id, 'total': total})
+                playlist_index[item['id']] = {
+                    'snapshot_id': snapshot_id, 'total': total, 'indexed_at': indexed_at}
+
+        # Список с сервера полностью заменяет индекс: удаленные плейлисты уходят из него
+        self.playlist_index = playlist_index
         return playlists_data
 
-    def get_playlist_snapshot_id(self, playlist_id: str, **kwargs) -> str | None:
-        """Легковесный запрос для получения только snapshot_id плейлиста."""
+    def get_indexed_snapshot_id(self, playlist_id: str) -> str | None:
+        """
+        Возвращает snapshot_id из индекса плейлистов без обращения к API
+        (None, если записи нет или она старше SNAPSHOT_INDEX_MAX_AGE).
+        """
+        entry = self.playlist_index.get(playlist_id)
+        if not entry or time.monotonic() - entry.get('indexed_at', 0) > SNAPSHOT_INDEX_MAX_AGE:
+            return None
+        return entry.get('snapshot_id')
+
+    def get_playlist_snapshot_id(self, playlist_id: str, fresh: bool = False, **kwargs) -> str | None:
+        """
+        Возвращает snapshot_id плейлиста: из индекса, если запись там свежая,
+        иначе легковесным запросом к API. fresh=True - всегда спросить сервер
+        (явное обновление, проверка перед изменением плейлиста).
+        """
+        if playlist_id != 'liked_songs' and not fresh:
+            indexed_snapshot_id = self.get_indexed_snapshot_id(playlist_id)
+            if indexed_snapshot_id:
+                return indexed_snapshot_id
+
+        return self.single_flight.do(
+            ('snapshot_id', playlist_id), self._probe_snapshot_id, playlist_id)
+
+    def _probe_snapshot_id(self, playlist_id: str) -> str | None:
+        """Запрашивает snapshot_id плейлиста у API."""
         if playlist_id == 'liked_songs':
             # У "Понравившихся" нет snapshot_id, но мы можем использовать
             # общее количество треков и дату добавления последнего как своего рода "хэш"
@@ -49,12 +140,30 @@ class SpotifyClient:
 
         try:
             # Запрашиваем только одно поле для максимальной скорости
-            return self.sp.playlist(playlist_id, fields='snapshot_id').get('snapshot_id')
+            snapshot_id = self.sp.playlist(
+                playlist_id, fields='snapshot_id').get('snapshot_id')
+            self._remember_snapshot(playlist_id, {'snapshot_id': snapshot_id})
+            return snapshot_id
         except Exception:
             return None
 
+    def _remember_snapshot(self, playlist_id: str, response) -> None:
+        """Обновляет индекс по ответу API, содержащему новый snapshot_id."""
+        if isinstance(response, dict) and response.get('snapshot_id'):
+            entry = self.playlist_index.setdefault(playlist_id, {})
+            entry['snapshot_id'] = response['snapshot_id']
+            entry['indexed_at'] = time.monotonic()
+
     def get_playlist_track_ids(self, playlist_id: str, cancellation_check=None, progress_callback=None) -> list[str]:
-        """Загружает ПОЛНЫЙ список ID треков из плейлиста или 'Понравившихся'."""
+        """
+        Загружает ПОЛНЫЙ список ID треков из плейлиста или 'Понравившихся'.
+        Одновременные запросы одного плейлиста объединяются: результат общий, не изменяйте его.
+        """
+        return self.single_flight.do(
+            ('track_ids', playlist_id), self._load_playlist_track_ids, playlist_id,
+            cancellation_check=cancellation_check, progress_callback=progress_callback)
+
+    def _load_playlist_track_ids(self, playlist_id: str, cancellation_check=None, progress_callback=None) -> list[str]:
         if playlist_id == 'liked_songs':
             results = self.sp.current_user_saved_tracks(limit=50)
         else:
@@ -64,73 +173,289 @@ class SpotifyClient:
         all_items = self._get_all_items(
             results, cancellation_check, progress_callback)
 
+        return [track['id'] for track in self._valid_tracks(all_items)]
+
+    def get_playlist_tracks_hydrated(self, playlist_id: str, cancellation_check=None, progress_callback=None) -> tuple[list[str], dict]:
+        """
+        Загружает плейлист за один проход: вместе с ID треков запрашивает
+        название, исполнителей, альбом и обложки, поэтому отдельный вызов
+        get_tracks_details не нужен.
+        Возвращает кортеж (список ID по порядку, словарь с информацией о треках).
+        Одновременные запросы одного плейлиста объединяются.
+        """
+        return self.single_flight.do(
+            ('hydrated', playlist_id), self._load_playlist_tracks_hydrated, playlist_id,
+            cancellation_check=cancellation_check, progress_callback=progress_callback)
+
+    def _load_playlist_tracks_hydrated(self, playlist_id: str, cancellation_check=None, progress_callback=None) -> tuple[list[str], dict]:
+        if playlist_id == 'liked_songs':
+            # Сохраненные треки и так приходят полными объектами
+            results = self.sp.current_user_saved_tracks(limit=50)
+        else:
+            results = self.sp.playlist_tracks(
+                playlist_id, fields=HYDRATED_PLAYLIST_FIELDS, limit=50)
+
+        all_items = self._get_all_items(
+            results, cancellation_check, progress_callback)
+
+        return self._hydrate_items(all_items)
+
+    def _hydrate_items(self, items: list[dict]) -> tuple[list[str], dict]:
+        """Возвращает ID треков по порядку и записи для кэша треков."""
         track_ids = []
-        for item in all_items:
+        tracks_details_dict = {}
+        for track in self._valid_tracks(items):
+            track_ids.append(track['id'])
+            if track['id'] not in tracks_details_dict:
+                tracks_details_dict[track['id']] = self._track_to_details(
+                    track)
+        return track_ids, tracks_details_dict
+
+    def get_liked_tracks_incremental(self, cached_track_ids: list[str], newest_added_at: str | None,
+                                     cancellation_check=None, progress_callback=None) -> dict:
+        """
+        Синхронизирует 'Понравившиеся' с кэшем. Сохраненные треки приходят от новых
+        к старым, поэтому страницы загружаются только до самого нового трека из кэша,
+        а новые треки добавляются в начало списка. Полная загрузка выполняется, если
+        кэша нет или общее количество показывает, что какие-то треки были удалены.
+        Возвращает словарь: track_ids, details (только загруженные треки),
+        newest_added_at и full_rescan.
+        """
+        return self.single_flight.do(
+            ('liked_incremental',), self._load_liked_tracks_incremental,
+            cached_track_ids, newest_added_at,
+            cancellation_check=cancellation_check, progress_callback=progress_callback)
+
+    def _load_liked_tracks_incremental(self, cached_track_ids, newest_added_at,
+                                       cancellation_check=None, progress_callback=None) -> dict:
+        if not cached_track_ids or not newest_added_at:
+            return self._load_liked_tracks_full(cancellation_check, progress_callback)
+
+        cached_ids_set = set(cached_track_ids)
+        new_items = []
+        offset = 0
+        while True:
+            if cancellation_check and cancellation_check():
+                raise InterruptedError("Отменено.")
+
+            page = self.sp.current_user_saved_tracks(limit=50, offset=offset)
+            total = page.get('total', 0)
+            reached_cache = False
+            for item in page.get('items', []):
+                added_at = item.get('added_at') or ''
+                track_id = (item.get('track') or {}).get('id')
+                # Треки с той же секундой добавления сверяем по ID
+                if added_at < newest_added_at or (added_at == newest_added_at and track_id in cached_ids_set):
+                    reached_cache = True
+                    break
+                new_items.append(item)
+
+            if progress_callback and total > 0:
+                progress_callback(min(total, offset + 50), total)
+            if reached_cache or not page.get('next'):
+                break
+            offset += len(page.get('items', []))
+
+        new_track_ids, tracks_details_dict = self._hydrate_items(new_items)
+        new_ids_set = set(new_track_ids)
+        # Повторно лайкнутый трек переезжает в начало списка
+        track_ids = new_track_ids + \
+            [tid for tid in cached_track_ids if tid not in new_ids_set]
+
+        if len(track_ids) != total:
+            print(
+                f"'Понравившиеся': ожидалось {total} треков, получилось {len(track_ids)}. Полная перезагрузка...")
+            return self._load_liked_tracks_full(cancellation_check, progress_callback)
+
+        print(
+            f"'Понравившиеся': догружено {len(new_track_ids)} новых треков без полного обхода.")
+        return {
+            'track_ids': track_ids,
+            'details': tracks_details_dict,
+            'newest_added_at': new_items[0]['added_at'] if new_items else newest_added_at,
+            'full_rescan': False
+        }
+
+    def _load_liked_tracks_full(self, cancellation_check=None, progress_callback=None) -> dict:
+        results = self.sp.current_user_saved_tracks(limit=50)
+        all_items = self._get_all_items(
+            results, cancellation_check, progress_callback)
+        track_ids, tracks_details_dict = self._hydrate_items(all_items)
+        return {
+            'track_ids': track_ids,
+            'details': tracks_details_dict,
+            'newest_added_at': all_items[0].get('added_at') if all_items else None,
+            'full_rescan': True
+        }
+
+    def get_playlist_tracks(self, playlist_id: str, cancellation_check=None, progress_callback=None, **kwargs) -> list[dict]:
+        """Возвращает треки плейлиста в виде записей кэша (id, name, artist, album...)."""
+        track_ids, tracks_details_dict = self.get_playlist_tracks_hydrated(
+            playlist_id, cancellation_check, progress_callback)
+        return [tracks_details_dict[tid] for tid in track_ids]
+
+    def coalescing_stats(self) -> dict:
+        """Сколько запросов на чтение было сделано и сколько сэкономлено объединением."""
+        return self.single_flight.stats()
+
+    @staticmethod
+    def _valid_tracks(items: list[dict]):
+        """Отбирает из элементов страницы только настоящие треки (не локальные, не подкасты)."""
+        for item in items:
             track = item.get('track') or item
             if track and track.get('type') == 'track' and not track.get('is_local') and track.get('id'):
-                track_ids.append(track['id'])
-        return track_ids
+                yield track
 
-    def get_tracks_details(self, track_ids: list[str]) -> dict:
+    def get_tracks_details(self, track_ids: list[str], max_workers: int = TRACK_DETAILS_WORKERS, **kwargs) -> dict:
         """
         Принимает список ID треков и возвращает словарь с их базовой информацией,
         ВКЛЮЧАЯ URL на обложку альбома.
         """
+        tracks_details_dict, failed_ids = self.fetch_tracks_details(
+            track_ids, max_workers=max_workers)
+        if failed_ids:
+            print(
+                f"Не удалось получить информацию о {len(failed_ids)} треках.")
+        return tracks_details_dict
+
+    def fetch_tracks_details(self, track_ids: list[str], max_workers: int = TRACK_DETAILS_WORKERS,
+                             retries: int = TRACK_DETAILS_RETRIES) -> tuple[dict, list[str]]:
+        """
+        Загружает информацию о треках пакетами по 50, отправляя пакеты параллельно.
+        Каждый пакет повторяется до `retries` раз.
+        Возвращает кортеж (словарь с информацией, список ID, которые загрузить не удалось).
+        """
         if not track_ids:
-            return {}
+            return {}, []
 
         tracks_details_dict = {}
-
-        # Запрашиваем информацию о треках пакетами по 50
-        for id_chunk in chunks(track_ids, 50):
+        failed_ids = []
+
+        id_chunks = list(chunks(track_ids, 50))
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            fetch_chunk = self.scheduler.bind_priority(self._fetch_tracks_chunk)
+            results = executor.map(
+                lambda id_chunk: fetch_chunk(id_chunk, retries), id_chunks)
+            for id_chunk, tracks in zip(id_chunks, results):
+                if tracks is None:
+                    failed_ids.extend(id_chunk)
+                    continue
+                for track in tracks:
+                    if track:
+                        tracks_details_dict[track['id']] = self._track_to_details(
+                            track)
+
+        return tracks_details_dict, failed_ids
+
+    def _fetch_tracks_chunk(self, id_chunk: list[str], retries: int) -> list | None:
+        """
+        Запрашивает один пакет треков. При неудаче возвращает None.
+        Повторяются только сбои соединения и таймауты: 429 и ошибки сервера уже
+        повторил планировщик, а ошибка клиента (4xx) при повторе не исчезнет.
+        """
+        for attempt in range(retries + 1):
             try:
-                tracks_info = self.sp.tracks(id_chunk)
-                for track in tracks_info['tracks']:
-                    if not track:
-                        continue
-
-                    # --> ВОЗВРАЩАЕМ ЛОГИКУ ПОИСКА URL ОБЛОЖКИ <--
-                    cover_url = None
-                    if track.get('album') and track['album'].get('images'):
-                        # Берем последнюю картинку в списке, она самая маленькая (64x64)
-                        cover_url = track['album']['images'][-1]['url']
-
-                    # Собираем полную информацию о треке
-                    tracks_details_dict[track['id']] = {
-                        'id': track['id'],
-                        'name': track['name'],
-                        'artist': ', '.join(artist['name'] for artist in track['artists']),
-                        'album': track.get('album', {}).get('name', 'N/A'),
-                        'cover_url': cover_url  # Добавляем URL в данные кэша
-                    }
-            except Exception as e:
+                return self.sp.tracks(id_chunk)['tracks']
+            except (requests.ConnectionError, requests.Timeout) as e:
+                print(
+                    f"Ошибка соединения при получении информации о треках (попытка {attempt + 1}): {e}")
+                if attempt < retries:
+                    # Пауза прерывается отменой операции
+                    self.scheduler.sleep(self.scheduler.retry_delay(attempt))
+            except spotipy.SpotifyException as e:
                 print(f"Ошибка при получении информации о треках: {e}")
+                return None
+        return None
 
-        return tracks_details_dict
+    @staticmethod
+    def _track_to_details(track: dict) -> TrackRecord:
+        """Превращает объект трека из API в компактную запись для кэша треков."""
+        cover_url = None
+        if track.get('album') and track['album'].get('images'):
+            # Берем последнюю картинку в списке, она самая маленькая (64x64)
+            cover_url = track['album']['images'][-1]['url']
+
+        return TrackRecord(
+            id=track['id'],
+            name=track['name'],
+            artist=', '.join(artist['name'] for artist in track['artists']),
+            album=(track.get('album') or {}).get('name', 'N/A'),
+            cover_url=cover_url
+        )
 
     def _get_all_items(self, results, cancellation_check=None, progress_callback=None):
-        """Собирает все элементы со всех страниц ответа API, сообщая о прогрессе."""
+        """
+        Собирает все элементы со всех страниц ответа API, сообщая о прогрессе.
+        Первая страница уже содержит 'total', поэтому смещения остальных страниц
+        известны заранее: они загружаются параллельно и собираются по порядку.
+        """
         total = results.get('total', 0)
         items = results.get('items', [])
         if progress_callback and total > 0:
             progress_callback(len(items), total)
 
-        while results and results.get('next'):
-            if cancellation_check and cancellation_check():
-                print("Загрузка страниц прервана.")
-                break
-            try:
-                results = self.sp.next(results)
-                if results:
-                    new_items = results.get('items', [])
-                    items.extend(new_items)
-                    if progress_callback and total > 0:
-                        progress_callback(len(items), total)
-            except Exception as e:
-                print(f"Ошибка при загрузке следующей страницы: {e}")
+        page_urls = self._remaining_page_urls(results)
+        if not page_urls:
+            return items
+
+        pages = [None] * len(page_urls)
+        loaded_count = len(items)
+        with ThreadPoolExecutor(max_workers=PAGE_FETCH_WORKERS) as executor:
+            fetch_page = self.scheduler.bind_priority(self.sp._get)
+            futures = {executor.submit(fetch_page, url): index
+                       for index, url in enumerate(page_urls)}
+            for future in futures:
+                index = futures[future]
+                if cancellation_check and cancellation_check():
+                    print("Загрузка страниц прервана.")
+                    for pending in futures:
+                        pending.cancel()
+                    break
+                try:
+                    page = future.result()
+                except Exception as e:
+                    # Повторы уже сделал планировщик. Обрезанный список попал бы
+                    # в кэш как полный, поэтому ошибка пробрасывается выше.
+                    print(f"Ошибка при загрузке страницы {index + 2}: {e}")
+                    for pending in futures:
+                        pending.cancel()
+                    raise
+                pages[index] = (page or {}).get('items', [])
+                loaded_count += len(pages[index])
+                if progress_callback and total > 0:
+                    progress_callback(loaded_count, total)
+
+        # Страницы склеиваются строго по порядку (при отмене - до первой незагруженной)
+        for page_items in pages:
+            if page_items is None:
                 break
+            items.extend(page_items)
         return items
 
+    @staticmethod
+    def _remaining_page_urls(results) -> list[str]:
+        """Строит URL всех оставшихся страниц по ссылке 'next' первой страницы."""
+        next_url = results.get('next')
+        total = results.get('total', 0)
+        if not next_url or not total:
+            return []
+
+        parsed = urlparse(next_url)
+        query = parse_qs(parsed.query)
+        first_offset = int(query.get('offset', ['0'])[0])
+        limit = int(query.get('limit', [0])[0]) or len(
+            results.get('items', [])) or first_offset
+        if limit <= 0:
+            return []
+
+        urls = []
+        for offset in range(first_offset, total, limit):
+            query['offset'] = [str(offset)]
+            query['limit'] = [str(limit)]
+            urls.append(urlunparse(
+                parsed._replace(query=urlencode(query, doseq=True, safe='(),'))))
+        return urls
+
     # --- Методы, которые мы пока не трогаем, но они должны принимать **kwargs ---
     def search_tracks(self, query: str, limit: int = 50, **kwargs) -> list[str]:
         """
@@ -139,6 +464,10 @@ class SpotifyClient:
         if not query:
             return []
 
+        cached_ids = self.search_cache.get(query, limit)
+        if cached_ids is not None:
+            return cached_ids
+
         try:
             results = self.sp.search(q=query, type='track', limit=limit)
             track_items = results.get('tracks', {}).get('items', [])
@@ -148,19 +477,32 @@ class SpotifyClient:
                 track['id'] for track in track_items
                 if track and track.get('type') == 'track' and not track.get('is_local') and track.get('id')
             ]
+            self.search_cache.put(query, limit, track_ids)
             return track_ids
         except Exception as e:
             print(f"Ошибка при поиске по запросу '{query}': {e}")
             return []
 
-    def find_track_id(self, query: str, **kwargs) -> str | None:
+    def find_track_id(self, query: str, raise_errors: bool = False, **kwargs) -> str | None:
+        """
+        Возвращает ID первого найденного трека или None.
+        raise_errors=True пробрасывает ошибки API, чтобы отличить их от "не найдено".
+        """
+        cached_ids = self.search_cache.get(query, 1)
+        if cached_ids is not None:
+            return cached_ids[0] if cached_ids else None
+
         try:
             results = self.sp.search(q=query, type='track', limit=1)
             items = results.get('tracks', {}).get('items', [])
-            if items:
-                return items[0].get('id')
+            track_id = items[0].get('id') if items else None
+            # Запоминаем и "не найдено", чтобы повторный импорт не искал снова
+            self.search_cache.put(query, 1, [track_id] if track_id else [])
+            return track_id
         except Exception as e:
             print(f"Ошибка при поиске трека '{query}': {e}")
+            if raise_errors:
+                raise
         return None
 
     # --- Методы для управления плейлистами ---
@@ -174,8 +516,71 @@ class SpotifyClient:
             print(f"Ошибка при создании плейлиста '{name}': {e}")
         return None
 
-    def add_tracks_to_playlist(self, playlist_id: str, track_ids: list[str], **kwargs):
-        return self.sp.playlist_add_items(playlist_id, track_ids)
+    # --- Конвейер записи: пакеты, порядок, повторы и прогресс ---
+
+    def _run_write_batches(self, items: list, batch_size: int, send_batch, cancellation_check=None,
+                           progress_callback=None, start_batch: int = 0, on_batch_committed=None):
+        """
+        Отправляет изменения пакетами по batch_size строго по порядку.
+        send_batch(batch, previous_response) выполняет один запрос; ответ передается
+        следующему пакету (для цепочки snapshot_id). Повторы после 429 делает
+        планировщик запросов, здесь пакет отправляется один раз; при ошибке
+        выбрасывается WriteBatchError. start_batch позволяет пропустить уже
+        записанные пакеты, on_batch_committed(index, batch) вызывается после
+        каждого успешного пакета. Возвращает ответ последнего пакета.
+        """
+        batches = list(chunks(items, batch_size))
+        total = len(items)
+        done = sum(len(batch) for batch in batches[:start_batch])
+        response = None
+
+        for index in range(start_batch, len(batches)):
+            if cancellation_check and cancellation_check():
+                raise InterruptedError("Операция отменена.")
+
+            batch = batches[index]
+            response = self._send_write_batch(
+                send_batch, batch, response, index)
+
+            done += len(batch)
+            if progress_callback and total > 0:
+                progress_callback(done, total)
+            if on_batch_committed:
+                on_batch_committed(index, batch)
+        return response
+
+    @staticmethod
+    def _send_write_batch(send_batch, batch: list, previous_response, index: int):
+        try:
+            return send_batch(batch, previous_response)
+        except (spotipy.SpotifyException, requests.ConnectionError, requests.Timeout) as e:
+            status = getattr(e, 'http_status', None)
+            uncertain = status is None or status >= 500
+            error = WriteBatchError(index, batch, uncertain, e)
+            print(f"Ошибка при записи: {error}")
+            raise error from e
+
+    def add_tracks_to_playlist(self, playlist_id: str, track_ids: list[str], position: int | None = None,
+                               cancellation_check=None, progress_callback=None,
+                               start_batch: int = 0, on_batch_committed=None, **kwargs):
+        """
+        Добавляет треки в плейлист пакетами по 100 с сохранением порядка.
+        Если задана позиция, каждый следующий пакет вставляется сразу за предыдущим.
+        """
+        next_position = position
+
+        def send_batch(batch, previous_response):
+            nonlocal next_position
+            response = self.sp.playlist_add_items(
+                playlist_id, batch, position=next_position)
+            self._remember_snapshot(playlist_id, response)
+            if next_position is not None:
+                next_position += len(batch)
+            return response
+
+        return self._run_write_batches(
+            track_ids, PLAYLIST_WRITE_LIMIT, send_batch, cancellation_check, progress_callback,
+            start_batch=start_batch, on_batch_committed=on_batch_committed)
 
     def deduplicate_playlist(self, playlist_id: str, cancellation_check=None, progress_callback=None, **kwargs):
         """
@@ -194,12 +599,7 @@ class SpotifyClient:
                 f"DEBUG: Шаг 1: Всего загружено {len(all_track_ids)} треков из плейлиста.")
 
             # 2. Собираем уникальные ID в порядке их первого появления
-            seen_ids = set()
-            unique_track_ids = []
-            for track_id in all_track_ids:
-                if track_id not in seen_ids:
-                    unique_track_ids.append(track_id)
-                    seen_ids.add(track_id)
+            unique_track_ids = list(dict.fromkeys(all_track_ids))
 
             num_duplicates = len(all_track_ids) - len(unique_track_ids)
             print(
@@ -209,10 +609,20 @@ class SpotifyClient:
                 print("DEBUG: Дубликаты не найдены, операция завершена.")
                 return 0
 
-            # 3. Полностью заменяем треки в плейлисте на уникальный список
+            # 3. Полностью заменяем треки в плейлисте на уникальный список.
+            #    Замена принимает не больше 100 треков, остальные дописываются по порядку.
             print(
                 f"DEBUG: Шаг 3: Вызываю playlist_replace_items с {len(unique_track_ids)} уникальными ID...")
-            self.sp.playlist_replace_items(playlist_id, unique_track_ids)
+            first_batch = unique_track_ids[:PLAYLIST_WRITE_LIMIT]
+            response = self._send_write_batch(
+                lambda batch, _: self.sp.playlist_replace_items(
+                    playlist_id, batch),
+                first_batch, None, 0)
+            self._remember_snapshot(playlist_id, response)
+            if len(unique_track_ids) > PLAYLIST_WRITE_LIMIT:
+                self.add_tracks_to_playlist(
+                    playlist_id, unique_track_ids[PLAYLIST_WRITE_LIMIT:],
+                    progress_callback=progress_callback)
 
             print("DEBUG: Шаг 4: Вызов API успешно завершен.")
             print("--- УДАЛЕНИЕ ДУБЛИКАТОВ ЗАВЕРШЕНО ---\n")
@@ -225,25 +635,62 @@ class SpotifyClient:
             raise
 
     def check_if_tracks_are_liked(self, track_ids: list[str], **kwargs) -> list[bool]:
-        """Проверяет, находятся ли треки в 'Понравившихся'."""
-        return self.sp.current_user_saved_tracks_contains(track_ids)
-
-    def add_tracks_to_liked(self, track_ids: list[str], **kwargs):
-        """Добавляет треки в 'Понравившиеся'."""
-        return self.sp.current_user_saved_tracks_add(track_ids)
-
-    def remove_tracks_from_liked(self, track_ids: list[str], **kwargs):
-        """Удаляет треки из 'Понравившихся'."""
-        return self.sp.current_user_saved_tracks_delete(track_ids)
+        """
+        Проверяет, находятся ли треки в 'Понравившихся'.
+        Отвечает по локальному индексу; к API (пакетами по 50) обращается,
+        только если индекс устарел.
+        """
+        if not self.liked_index.is_stale():
+            return self.liked_index.contains_many(track_ids)
+
+        is_liked_list = []
+        for id_chunk in chunks(track_ids, LIBRARY_WRITE_LIMIT):
+            chunk_result = self.sp.current_user_saved_tracks_contains(id_chunk)
+            is_liked_list.extend(chunk_result)
+            # Ответ сервера точен для этих треков - сразу поправляем индекс
+            self.liked_index.add(
+                tid for tid, is_liked in zip(id_chunk, chunk_result) if is_liked)
+            self.liked_index.discard(
+                tid for tid, is_liked in zip(id_chunk, chunk_result) if not is_liked)
+        return is_liked_list
+
+    def add_tracks_to_liked(self, track_ids: list[str], cancellation_check=None, progress_callback=None, **kwargs):
+        """Добавляет треки в 'Понравившиеся' пакетами по 50."""
+        return self._run_write_batches(
+            track_ids, LIBRARY_WRITE_LIMIT,
+            lambda batch, _: self.sp.current_user_saved_tracks_add(batch),
+            cancellation_check, progress_callback,
+            on_batch_committed=lambda index, batch: self.liked_index.add(batch))
+
+    def remove_tracks_from_liked(self, track_ids: list[str], cancellation_check=None, progress_callback=None, **kwargs):
+        """Удаляет треки из 'Понравившихся' пакетами по 50."""
+        return self._run_write_batches(
+            track_ids, LIBRARY_WRITE_LIMIT,
+            lambda batch, _: self.sp.current_user_saved_tracks_delete(batch),
+            cancellation_check, progress_callback,
+            on_batch_committed=lambda index, batch: self.liked_index.discard(batch))
 
     def delete_playlist(self, playlist_id: str, **kwargs):
         self.sp.current_user_unfollow_playlist(playlist_id)
+        self.playlist_index.pop(playlist_id, None)
         return True
 
-    def remove_tracks_from_playlist(self, playlist_id: str, track_ids: list[str], **kwargs):
-        """Удаляет все вхождения указанных треков из плейлиста."""
+    def remove_tracks_from_playlist(self, playlist_id: str, track_ids: list[str],
+                                    cancellation_check=None, progress_callback=None, **kwargs):
+        """
+        Удаляет все вхождения указанных треков из плейлиста пакетами по 100.
+        Каждый пакет применяется к версии плейлиста (snapshot_id), полученной после предыдущего.
+        """
         # Этот метод spotipy требует URI треков, а не просто ID.
         track_uris = [f"spotify:track:{track_id}" for track_id in track_ids]
-        self.sp.playlist_remove_all_occurrences_of_items(
-            playlist_id, track_uris)
+
+        def send_batch(batch, previous_response):
+            snapshot_id = (previous_response or {}).get('snapshot_id')
+            response = self.sp.playlist_remove_all_occurrences_of_items(
+                playlist_id, batch, snapshot_id=snapshot_id)
+            self._remember_snapshot(playlist_id, response)
+            return response
+
+        self._run_write_batches(
+            track_uris, PLAYLIST_WRITE_LIMIT, send_batch, cancellation_check, progress_callback)
         return True
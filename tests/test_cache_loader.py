@@ -0,0 +1,80 @@
+# test_cache_loader.py
+
+import json
+import threading
+
+import pytest
+
+import cache_loader
+from cache_loader import CacheLoader
+
+TRACK_IDS = [f'{i:022d}' for i in range(4)]
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return str(tmp_path / 'cache.db'), str(tmp_path / 'cache.json')
+
+
+def _write_legacy(json_path: str, playlist_ids):
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'playlist_cache': {playlist_id: {'snapshot_id': 'snap', 'track_ids': TRACK_IDS}
+                               for playlist_id in playlist_ids},
+            'track_cache': {track_id: {'id': track_id, 'name': 'Song'} for track_id in TRACK_IDS},
+        }, f)
+
+
+def test_migrates_in_background_and_reports_each_playlist(paths):
+    db_path, json_path = paths
+    _write_legacy(json_path, ['a', 'b', 'c'])
+    ready = []
+    finished = threading.Event()
+
+    loader = CacheLoader(db_path, json_path)
+    loader.on_playlist_ready = ready.append
+    loader.on_finished = finished.set
+    loader.start()
+
+    store = loader.wait_for_playlist('b')
+    assert loader.is_playlist_ready('b')
+    assert store.playlists['b']['track_ids'] == TRACK_IDS
+    assert finished.wait(5)
+    assert loader.wait_finished(0)
+    assert sorted(playlist_id for playlist_id in ready if playlist_id) == ['a', 'b', 'c']
+    # None - база открыта, плейлисты из нее уже можно читать
+    assert ready[0] is None
+    loader.store.close()
+
+
+def test_wait_for_playlist_honours_cancellation(paths):
+    db_path, json_path = paths
+    loader = CacheLoader(db_path, json_path)
+    # Загрузка не запускалась - ожидание может прервать только отмена
+
+    with pytest.raises(InterruptedError):
+        loader.wait_for_playlist('a', cancellation_check=lambda: True)
+
+
+def test_failed_load_falls_back_to_memory_store(paths, monkeypatch):
+    db_path, json_path = paths
+    real_store = cache_loader.CacheStore
+
+    def failing_store(path):
+        if path != ':memory:':
+            raise OSError("диск недоступен")
+        return real_store(path)
+
+    monkeypatch.setattr(cache_loader, 'CacheStore', failing_store)
+    ready = []
+    loader = CacheLoader(db_path, json_path)
+    loader.on_playlist_ready = ready.append
+    loader.start()
+
+    assert loader.wait_finished(5)
+    store = loader.wait_until_loaded()
+    assert store.path == ':memory:'
+    assert ready == [None]
+    store.playlists['p'] = {'snapshot_id': 'snap', 'track_ids': []}
+    assert 'p' in store.playlists
+    store.close()
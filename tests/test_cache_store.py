@@ -0,0 +1,502 @@
+# test_cache_store.py
+
+import json
+import os
+import sqlite3
+import threading
+
+import pytest
+
+import cache_store
+from cache_store import SCHEMA_VERSION, CacheStore, TrackMemoryCache
+from packed_ids import TrackIdTable, pack
+from track_record import TrackRecord
+
+TRACK_IDS = [f'{i:022d}' for i in range(10)]
+
+
+def _track(track_id: str) -> dict:
+    return {'id': track_id, 'name': f'Song {track_id[-1]}', 'artist': 'Artist',
+            'album': 'Album', 'cover_url': None}
+
+
+@pytest.fixture
+def store_path(tmp_path):
+    return str(tmp_path / 'cache.db')
+
+
+@pytest.fixture
+def store(store_path):
+    store = CacheStore(store_path)
+    yield store
+    store.close()
+
+
+def test_playlists_and_tracks_behave_like_dicts(store):
+    store.playlists['p'] = {'snapshot_id': 'snap', 'track_ids': TRACK_IDS[:2], 'name': 'Плейлист'}
+    store.tracks.update({track_id: _track(track_id) for track_id in TRACK_IDS[:2]})
+
+    assert store.playlists['p'] == {
+        'snapshot_id': 'snap', 'track_ids': TRACK_IDS[:2], 'name': 'Плейлист'}
+    assert store.playlists.get_snapshot_id('p') == 'snap'
+    assert list(store.playlists) == ['p']
+    # Колонка cover_path есть у каждой строки, поэтому поле всегда присутствует
+    assert dict(store.tracks[TRACK_IDS[0]]) == dict(_track(TRACK_IDS[0]), cover_path=None)
+    assert store.tracks.get('missing') is None
+    assert store.tracks.missing([TRACK_IDS[0], 'missing']) == ['missing']
+
+    del store.playlists['p']
+    with pytest.raises(KeyError):
+        store.playlists['p']
+
+
+def test_changes_survive_reopen(store_path):
+    store = CacheStore(store_path)
+    store.playlists['p'] = {'snapshot_id': 'snap', 'track_ids': TRACK_IDS[:3]}
+    store.tracks.update({track_id: _track(track_id) for track_id in TRACK_IDS[:3]})
+    store.close()
+
+    reopened = CacheStore(store_path)
+    try:
+        assert reopened.playlists['p']['track_ids'] == TRACK_IDS[:3]
+        assert len(reopened.tracks) == 3
+    finally:
+        reopened.close()
+
+
+def test_migrates_legacy_json_once(store, tmp_path):
+    json_path = str(tmp_path / 'cache.json')
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'playlist_cache': {'p': {'snapshot_id': 'snap', 'track_ids': TRACK_IDS[:2]}},
+            'track_cache': {track_id: _track(track_id) for track_id in TRACK_IDS[:3]},
+        }, f)
+
+    assert store.migrate_from_json(json_path)
+
+    assert store.playlists['p']['track_ids'] == TRACK_IDS[:2]
+    assert sorted(store.tracks) == TRACK_IDS[:3]
+    assert not os.path.exists(json_path)
+    assert os.path.exists(json_path + '.migrated')
+    assert not store.needs_migration(json_path)
+
+
+def test_broken_legacy_json_is_skipped(store, tmp_path):
+    json_path = str(tmp_path / 'cache.json')
+    with open(json_path, 'w', encoding='utf-8') as f:
+        f.write('{"playlist_cache": ')
+
+    assert not store.migrate_from_json(json_path)
+    assert os.path.exists(json_path)
+
+
+def _schema_version(path: str) -> str:
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT value FROM meta WHERE key = 'schema_version'").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_schema_version_is_recorded(store_path):
+    CacheStore(store_path).close()
+
+    assert _schema_version(store_path) == str(SCHEMA_VERSION)
+
+
+def _count_from_other_connection(path: str, table: str) -> int:
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_writes_are_committed_in_batches(store, store_path):
+    store.tracks[TRACK_IDS[0]] = _track(TRACK_IDS[0])
+    store.tracks[TRACK_IDS[1]] = _track(TRACK_IDS[1])
+
+    # Изменения копятся в открытой транзакции и видны только после фиксации
+    assert _count_from_other_connection(store_path, 'tracks') == 0
+    store.flush()
+    assert _count_from_other_connection(store_path, 'tracks') == 2
+    assert store.stats()['commits'] == 1
+
+
+def test_commit_after_max_ops(store, store_path, monkeypatch):
+    monkeypatch.setattr(cache_store, 'COMMIT_MAX_OPS', 3)
+
+    for track_id in TRACK_IDS[:3]:
+        store.tracks[track_id] = _track(track_id)
+
+    assert _count_from_other_connection(store_path, 'tracks') == 3
+
+
+def test_close_checkpoints_wal(store_path):
+    store = CacheStore(store_path)
+    store.tracks.update({track_id: _track(track_id) for track_id in TRACK_IDS})
+    store.close()
+
+    wal_path = store_path + '-wal'
+    assert not os.path.exists(wal_path) or os.path.getsize(wal_path) == 0
+    assert _count_from_other_connection(store_path, 'tracks') == len(TRACK_IDS)
+
+
+def test_failed_operation_keeps_pending_neighbours(store):
+    store.tracks[TRACK_IDS[0]] = _track(TRACK_IDS[0])
+    with pytest.raises(RuntimeError):
+        with store.transaction() as conn:
+            conn.execute('DELETE FROM tracks')
+            raise RuntimeError
+
+    store.flush()
+    assert TRACK_IDS[0] in store.tracks
+
+
+def test_upgrade_from_v1_packs_playlist_tracks(store_path):
+    conn = sqlite3.connect(store_path)
+    conn.executescript("""
+        CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+        CREATE TABLE playlists (id TEXT PRIMARY KEY, snapshot_id TEXT, extra TEXT);
+        CREATE TABLE playlist_tracks (playlist_id TEXT, track_id TEXT, position INTEGER);
+        CREATE TABLE tracks (id TEXT PRIMARY KEY, name TEXT, artist TEXT, album TEXT,
+                             cover_url TEXT, cover_path TEXT, extra TEXT);
+        INSERT INTO meta VALUES ('schema_version', '1');
+        INSERT INTO playlists VALUES ('p', 'snap', NULL);
+    """)
+    conn.executemany('INSERT INTO playlist_tracks VALUES (?, ?, ?)',
+                     [('p', TRACK_IDS[1], 1), ('p', TRACK_IDS[0], 0), ('p', TRACK_IDS[0], 2)])
+    conn.commit()
+    conn.close()
+
+    store = CacheStore(store_path)
+    try:
+        assert store.playlists['p'] == {
+            'snapshot_id': 'snap', 'track_ids': [TRACK_IDS[0], TRACK_IDS[1], TRACK_IDS[0]]}
+        assert not store.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'playlist_tracks'")
+    finally:
+        store.close()
+    assert _schema_version(store_path) == str(SCHEMA_VERSION)
+
+
+def test_playlist_members_are_packed_keys(store):
+    store.playlists['p'] = {'snapshot_id': 'snap',
+                            'track_ids': [TRACK_IDS[0], TRACK_IDS[1], TRACK_IDS[0]]}
+    store.playlists['other'] = {'snapshot_id': 'snap', 'track_ids': [TRACK_IDS[2]]}
+
+    members = store.playlists.members('p')
+    assert store.track_ids.decode(members) == [TRACK_IDS[0], TRACK_IDS[1], TRACK_IDS[0]]
+    assert store.playlists.members('missing') is None
+
+
+def test_playlist_membership_checks_use_packed_members(store):
+    store.playlists['p'] = {'snapshot_id': 'snap',
+                            'track_ids': [TRACK_IDS[0], TRACK_IDS[1], TRACK_IDS[0]]}
+    store.playlists['other'] = {'snapshot_id': 'snap', 'track_ids': [TRACK_IDS[2]]}
+
+    assert store.playlists.contains_many('p', [TRACK_IDS[1], TRACK_IDS[2], 'x' * 22]) == \
+        [True, False, False]
+    assert store.playlists.count_duplicates('p') == 1
+    assert store.playlists.contains_many('missing', [TRACK_IDS[0]]) is None
+    assert store.playlists.count_duplicates('missing') is None
+
+
+def _stored_keys(path: str) -> list[str]:
+    conn = sqlite3.connect(path)
+    try:
+        return sorted(row[0] for row in conn.execute('SELECT track_id FROM track_keys'))
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize('clear', ['store', 'playlists'])
+def test_clear_forgets_track_keys(store, store_path, clear):
+    store.playlists['p'] = {'snapshot_id': 'snap', 'track_ids': TRACK_IDS[:3]}
+
+    (store if clear == 'store' else store.playlists).clear()
+    store.flush()
+
+    assert len(store.track_ids) == 0
+    assert _stored_keys(store_path) == []
+    store.playlists['q'] = {'snapshot_id': 'snap', 'track_ids': TRACK_IDS[5:7]}
+    assert store.playlists['q']['track_ids'] == TRACK_IDS[5:7]
+
+
+def test_unreferenced_keys_are_pruned_and_reused(store_path):
+    store = CacheStore(store_path)
+    store.playlists['p'] = {'snapshot_id': 'v1', 'track_ids': TRACK_IDS[:4]}
+    store.playlists['q'] = {'snapshot_id': 'v1', 'track_ids': TRACK_IDS[3:5]}
+    store.playlists['p'] = {'snapshot_id': 'v2', 'track_ids': TRACK_IDS[2:4]}
+
+    assert store.prune_track_keys() == 2
+    assert store.track_ids.key_of(TRACK_IDS[0]) is None
+    # Освобожденные ключи достаются новым ID, остальные плейлисты не портятся
+    store.playlists['r'] = {'snapshot_id': 'v1', 'track_ids': TRACK_IDS[7:9]}
+    assert len(store.track_ids) == 5
+    assert store.playlists['q']['track_ids'] == TRACK_IDS[3:5]
+    assert store.playlists.contains_many('q', [TRACK_IDS[7], TRACK_IDS[4]]) == [False, True]
+    store.close()
+
+    assert _stored_keys(store_path) == TRACK_IDS[2:5] + TRACK_IDS[7:9]
+    reopened = CacheStore(store_path)
+    try:
+        assert len(reopened.track_ids) == 5
+        assert reopened.playlists['r']['track_ids'] == TRACK_IDS[7:9]
+    finally:
+        reopened.close()
+
+
+def test_rolled_back_prune_restores_keys(store):
+    store.playlists['p'] = {'snapshot_id': 'v1', 'track_ids': TRACK_IDS[:2]}
+    with pytest.raises(RuntimeError):
+        with store.transaction() as conn:
+            conn.execute('DELETE FROM playlists')
+            assert store.prune_track_keys() == 2
+            raise RuntimeError
+
+    assert store.playlists['p']['track_ids'] == TRACK_IDS[:2]
+    assert store.track_ids.key_of(TRACK_IDS[1]) is not None
+
+
+def test_upgrade_from_v2_adds_last_used(store_path):
+    table = TrackIdTable()
+    members = pack(table.encode([TRACK_IDS[0]]))
+    conn = sqlite3.connect(store_path)
+    conn.executescript("""
+        CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+        CREATE TABLE playlists (id TEXT PRIMARY KEY, snapshot_id TEXT, extra TEXT, members BLOB);
+        CREATE TABLE track_keys (key INTEGER PRIMARY KEY, track_id TEXT NOT NULL UNIQUE);
+        CREATE TABLE tracks (id TEXT PRIMARY KEY, name TEXT, artist TEXT, album TEXT,
+                             cover_url TEXT, cover_path TEXT, extra TEXT);
+        INSERT INTO meta VALUES ('schema_version', '2');
+    """)
+    conn.executemany('INSERT INTO track_keys VALUES (?, ?)', table.take_unsaved())
+    conn.execute('INSERT INTO playlists VALUES (?, ?, NULL, ?)', ('p', 'snap', members))
+    conn.execute('INSERT INTO tracks (id, name) VALUES (?, ?)', (TRACK_IDS[0], 'Song'))
+    conn.commit()
+    conn.close()
+
+    store = CacheStore(store_path)
+    try:
+        assert store.execute('SELECT COUNT(*) FROM tracks WHERE last_used IS NULL')[0][0] == 0
+        assert store.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'idx_tracks_last_used'")
+        assert store.tracks[TRACK_IDS[0]]['name'] == 'Song'
+        assert store.playlists['p']['track_ids'] == [TRACK_IDS[0]]
+    finally:
+        store.close()
+    assert _schema_version(store_path) == str(SCHEMA_VERSION)
+
+
+def test_memory_cache_is_bounded_by_entries_and_bytes():
+    memory = TrackMemoryCache(max_entries=3, max_bytes=10 ** 6)
+    memory.put_many(TrackRecord(**_track(track_id)) for track_id in TRACK_IDS[:3])
+    memory.get_many([TRACK_IDS[0]])  # первый трек становится недавно использованным
+
+    memory.put_many([TrackRecord(**_track(TRACK_IDS[3]))])
+
+    assert not memory.contains(TRACK_IDS[1])
+    assert memory.contains(TRACK_IDS[0])
+    assert memory.stats()['evictions'] == 1
+
+    small = TrackMemoryCache(max_entries=100, max_bytes=1)
+    small.put_many([TrackRecord(**_track(TRACK_IDS[0]))])
+    assert small.stats()['entries'] == 0
+
+
+def test_memory_cache_returns_copies():
+    memory = TrackMemoryCache()
+    memory.put_many([TrackRecord(**_track(TRACK_IDS[0]))])
+
+    copy = memory.get_many([TRACK_IDS[0]])[TRACK_IDS[0]]
+    copy['name'] = 'Changed'
+
+    assert memory.get_many([TRACK_IDS[0]])[TRACK_IDS[0]]['name'] == _track(TRACK_IDS[0])['name']
+
+
+def test_enforce_budget_evicts_oldest_unpinned_tracks(store, capsys):
+    store.tracks.max_stored = 4
+    store.tracks.update({track_id: _track(track_id) for track_id in TRACK_IDS})
+    with store.transaction() as conn:
+        conn.executemany('UPDATE tracks SET last_used = ? WHERE id = ?',
+                         ((float(i), track_id) for i, track_id in enumerate(TRACK_IDS)))
+    # Самые старые треки входят в плейлист и вытесняться не должны
+    store.playlists['p'] = {'snapshot_id': 'snap', 'track_ids': TRACK_IDS[:2]}
+
+    evicted = store.tracks.enforce_budget()
+
+    # В базе остается EVICTION_LOW_WATER от бюджета (3 трека) плюс закрепленные
+    assert evicted == 7
+    assert sorted(store.tracks) == [TRACK_IDS[0], TRACK_IDS[1], TRACK_IDS[9]]
+    assert 'вытеснено 7' in capsys.readouterr().out
+    assert store.tracks.stats()['store_evictions'] == 7
+
+
+def test_eviction_pass_prunes_keys_of_dropped_playlists(store_path):
+    track_ids = [f'{i:022d}' for i in range(300)]
+    store = CacheStore(store_path)
+    store.tracks.max_stored = 100
+    for n in range(3):
+        playlist = track_ids[n * 100:(n + 1) * 100]
+        store.upsert_playlist(f'p{n}', {'snapshot_id': 'v1', 'track_ids': playlist},
+                              {track_id: _track(track_id) for track_id in playlist})
+    del store.playlists['p0']
+    store.playlists['p1'] = {'snapshot_id': 'v2', 'track_ids': track_ids[100:110]}
+
+    store.tracks.enforce_budget()
+
+    # Остались ключи только тех треков, что входят в плейлисты
+    assert len(store.track_ids) == 110
+    assert store.track_ids.key_of(track_ids[0]) is None
+    store.close()
+
+    reopened = CacheStore(store_path)
+    try:
+        assert len(reopened.track_ids) == 110
+        assert reopened.playlists['p2']['track_ids'] == track_ids[200:]
+    finally:
+        reopened.close()
+
+
+def test_enforce_budget_records_recent_use(store):
+    store.tracks.max_stored = 2
+    store.tracks.update({track_id: _track(track_id) for track_id in TRACK_IDS[:3]})
+    with store.transaction() as conn:
+        conn.execute('UPDATE tracks SET last_used = 0')
+    store.tracks._memory.clear()
+    store.tracks.get_many([TRACK_IDS[0]])
+
+    store.tracks.enforce_budget()
+
+    assert TRACK_IDS[0] in store.tracks
+
+
+def test_enforce_budget_is_silent_when_everything_is_pinned(store, capsys):
+    store.tracks.max_stored = 2
+    store.tracks.update({track_id: _track(track_id) for track_id in TRACK_IDS[:4]})
+    store.playlists['p'] = {'snapshot_id': 'snap', 'track_ids': TRACK_IDS[:4]}
+    capsys.readouterr()
+
+    assert store.tracks.enforce_budget() == 0
+    assert len(store.tracks) == 4
+    assert capsys.readouterr().out == ''
+
+
+def test_nested_failure_rolls_back_only_inner_operation(store):
+    with store.transaction():
+        store.tracks[TRACK_IDS[0]] = _track(TRACK_IDS[0])
+        with pytest.raises(RuntimeError):
+            with store.transaction():
+                store.tracks[TRACK_IDS[1]] = _track(TRACK_IDS[1])
+                raise RuntimeError
+
+    assert TRACK_IDS[0] in store.tracks
+    assert TRACK_IDS[1] not in store.tracks
+
+
+def test_outer_failure_rolls_back_nested_operations(store_path):
+    store = CacheStore(store_path)
+    with pytest.raises(RuntimeError):
+        with store.transaction():
+            store.upsert_playlist('p', {'snapshot_id': 'snap', 'track_ids': TRACK_IDS[:2]},
+                                  {track_id: _track(track_id) for track_id in TRACK_IDS[:2]})
+            raise RuntimeError
+
+    assert 'p' not in store.playlists
+    assert len(store.tracks) == 0
+    assert store.tracks.get(TRACK_IDS[0]) is None
+
+    # Ключи ID из отката записываются со следующей операцией
+    store.playlists['q'] = {'snapshot_id': 'snap', 'track_ids': TRACK_IDS[:2]}
+    store.close()
+
+    reopened = CacheStore(store_path)
+    try:
+        assert reopened.playlists['q']['track_ids'] == TRACK_IDS[:2]
+    finally:
+        reopened.close()
+
+
+def test_set_fields_changes_only_given_fields(store_path):
+    store = CacheStore(store_path)
+    store.tracks[TRACK_IDS[0]] = _track(TRACK_IDS[0])
+
+    assert store.tracks.set_fields(TRACK_IDS[0], cover_path='cover.jpg')
+    assert not store.tracks.set_fields('missing', cover_path='cover.jpg')
+    with pytest.raises(ValueError):
+        store.tracks.set_fields(TRACK_IDS[0], popularity=10)
+    store.close()
+
+    reopened = CacheStore(store_path)
+    try:
+        track = reopened.tracks[TRACK_IDS[0]]
+        assert track['cover_path'] == 'cover.jpg'
+        assert track['name'] == _track(TRACK_IDS[0])['name']
+    finally:
+        reopened.close()
+
+
+def test_add_missing_keeps_existing_tracks(store):
+    store.tracks[TRACK_IDS[0]] = dict(_track(TRACK_IDS[0]), cover_path='cover.jpg')
+
+    added = store.tracks.add_missing(
+        (track_id, _track(track_id)) for track_id in TRACK_IDS[:2])
+
+    assert added == 1
+    assert store.tracks[TRACK_IDS[0]]['cover_path'] == 'cover.jpg'
+
+
+def test_upsert_playlist_keeps_known_covers(store):
+    store.tracks[TRACK_IDS[0]] = dict(_track(TRACK_IDS[0]), cover_path='cover.jpg')
+
+    store.upsert_playlist('p', {'snapshot_id': 'snap', 'track_ids': TRACK_IDS[:2]},
+                          {track_id: _track(track_id) for track_id in TRACK_IDS[:2]})
+
+    assert store.playlists['p']['track_ids'] == TRACK_IDS[:2]
+    assert store.tracks[TRACK_IDS[0]]['cover_path'] == 'cover.jpg'
+    assert TRACK_IDS[1] in store.tracks
+
+
+def test_discard_reports_whether_playlist_existed(store):
+    store.playlists['p'] = {'snapshot_id': 'snap', 'track_ids': []}
+
+    assert store.playlists.discard('p')
+    assert not store.playlists.discard('p')
+
+
+def test_concurrent_writers_and_readers(store):
+    errors = []
+
+    def writer(offset):
+        try:
+            for i in range(50):
+                track_id = f'{offset:02d}{i:020d}'
+                store.upsert_playlist(f'p{offset}', {'snapshot_id': str(i), 'track_ids': [track_id]},
+                                      {track_id: _track(track_id)})
+                store.tracks.set_fields(track_id, cover_path=f'{track_id}.jpg')
+        except Exception as e:
+            errors.append(e)
+
+    def reader():
+        try:
+            for _ in range(100):
+                with store.read_view():
+                    for playlist_id in list(store.playlists):
+                        entry = store.playlists[playlist_id]
+                        # Плейлист никогда не виден без своих треков
+                        assert not store.tracks.missing(entry['track_ids'])
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(4)]
+    threads.append(threading.Thread(target=reader))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+
+    assert errors == []
+    assert len(store.playlists) == 4
+    assert len(store.tracks) == 200
+    assert all(track['cover_path'] for track in store.tracks.values())
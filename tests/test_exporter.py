@@ -0,0 +1,99 @@
+# test_exporter.py
+
+import csv
+import io
+import json
+
+import pytest
+
+import exporter
+from exporter import export_cached_tracks, iter_cached_tracks, write_cached_tracks, write_json
+
+TRACKS = {
+    f'{n:022d}': {'id': f'{n:022d}', 'name': f'Песня "{n}"', 'artist': 'Artist, Band',
+                  'album': 'Album', 'cover_url': None}
+    for n in range(5)
+}
+TRACK_IDS = list(TRACKS)
+
+
+def _export(settings: dict, track_ids=TRACK_IDS) -> str:
+    stream = io.StringIO()
+    write_cached_tracks(stream, track_ids, TRACKS, settings)
+    return stream.getvalue()
+
+
+def test_tracks_come_from_cache_and_missing_ones_are_skipped():
+    records = list(iter_cached_tracks([TRACK_IDS[1], 'missing', TRACK_IDS[0]], TRACKS))
+
+    assert [record['id'] for record in records] == [TRACK_IDS[1], TRACK_IDS[0]]
+    assert set(records[0]) == set(exporter.EXPORT_FIELDS)
+
+
+def test_csv_uses_selected_columns():
+    text = _export({'format': 'csv', 'columns': ['name', 'artist']})
+
+    rows = list(csv.DictReader(io.StringIO(text)))
+    assert rows[0] == {'name': 'Песня "0"', 'artist': 'Artist, Band'}
+    assert len(rows) == len(TRACK_IDS)
+
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_streamed_json_matches_json_dump(compact):
+    records = list(iter_cached_tracks(TRACK_IDS, TRACKS))
+
+    text = _export({'format': 'json', 'compact': compact})
+
+    if compact:
+        assert text == json.dumps(records, ensure_ascii=False, separators=(',', ':'))
+    else:
+        assert text == json.dumps(records, ensure_ascii=False, indent=4)
+
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_empty_json_is_an_empty_array(compact):
+    stream = io.StringIO()
+
+    assert write_json(stream, iter([]), compact=compact) == 0
+    assert json.loads(stream.getvalue()) == []
+
+
+def test_jsonl_writes_one_track_per_line():
+    lines = _export({'format': 'jsonl'}).splitlines()
+
+    assert [json.loads(line)['id'] for line in lines] == TRACK_IDS
+
+
+def test_txt_template_skips_bad_keys():
+    text = _export({'format': 'txt', 'template': '{artist} - {name}'})
+
+    assert text.splitlines()[0] == 'Artist, Band - Песня "0"'
+    assert _export({'format': 'txt', 'template': '{popularity}'}) == ''
+
+
+def test_progress_and_cancellation_every_step(monkeypatch):
+    monkeypatch.setattr(exporter, 'EXPORT_PROGRESS_STEP', 2)
+    progress = []
+
+    write_cached_tracks(io.StringIO(), TRACK_IDS, TRACKS, {'format': 'jsonl'},
+                        progress_callback=lambda done, total: progress.append((done, total)))
+    assert progress == [(2, 5), (4, 5), (5, 5)]
+
+    with pytest.raises(InterruptedError):
+        write_cached_tracks(io.StringIO(), TRACK_IDS, TRACKS, {'format': 'jsonl'},
+                            cancellation_check=lambda: True)
+
+
+def test_export_to_file_uses_format_encoding(tmp_path):
+    path = tmp_path / 'tracks.csv'
+
+    assert export_cached_tracks(TRACK_IDS, TRACKS, str(path),
+                                {'format': 'csv', 'columns': ['id']})
+
+    # CSV пишется с BOM, чтобы Excel понял кодировку
+    assert path.read_bytes().startswith(b'\xef\xbb\xbf')
+
+
+def test_unknown_format_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        export_cached_tracks(TRACK_IDS, TRACKS, str(tmp_path / 'tracks.xml'), {'format': 'xml'})
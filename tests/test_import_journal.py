@@ -0,0 +1,146 @@
+# test_import_journal.py
+
+import os
+
+import pytest
+
+from import_journal import ImportJournal, add_planned_tracks, prepare_import
+from import_resolver import REASON_NOT_FOUND, REASON_SEARCH_ERROR
+from request_scheduler import RequestScheduler
+from spotify_client import SpotifyClient
+
+SETTINGS = {'items': ['Artist - Song', 'Artist - Other'], 'mode': 'new', 'target': None}
+
+
+@pytest.fixture
+def journal_dir(tmp_path):
+    return str(tmp_path / 'imports')
+
+
+def test_resume_restores_checkpoints(journal_dir):
+    journal = ImportJournal(SETTINGS, journal_dir)
+    journal.record_resolved('Artist - Song', 'A' * 22)
+    journal.record_resolved('Artist - Missing', None, REASON_NOT_FOUND)
+    journal.record_resolved('Artist - Other', None, f"{REASON_SEARCH_ERROR}: timeout")
+    journal.record_target('playlist', 'Импорт')
+    journal.record_plan(['A' * 22, 'B' * 22])
+    journal.record_batch(0)
+    journal.record_batch(1)
+    journal.record_uncertain(2)
+    journal.close()
+
+    resumed = ImportJournal(SETTINGS, journal_dir)
+    assert resumed.load()
+    # Ошибки поиска не запоминаются: такие строки ищутся заново
+    assert resumed.resolved == {'artist - song': 'A' * 22, 'artist - missing': None}
+    assert (resumed.target_id, resumed.target_name) == ('playlist', 'Импорт')
+    assert resumed.plan == ['A' * 22, 'B' * 22]
+    assert resumed.next_batch == 2
+    assert resumed.uncertain_batches == {2}
+
+
+def test_confirmed_batch_clears_uncertain_mark(journal_dir):
+    journal = ImportJournal(SETTINGS, journal_dir)
+    journal.record_plan(['A' * 22])
+    journal.record_uncertain(0)
+    journal.record_batch(0)
+    journal.close()
+
+    resumed = ImportJournal(SETTINGS, journal_dir)
+    resumed.load()
+    assert resumed.uncertain_batches == set()
+    assert resumed.next_batch == 1
+
+
+def test_new_plan_resets_batches(journal_dir):
+    journal = ImportJournal(SETTINGS, journal_dir)
+    journal.record_plan(['A' * 22])
+    journal.record_batch(0)
+    journal.record_uncertain(1)
+    journal.record_plan(['B' * 22])
+
+    assert journal.next_batch == 0
+    assert journal.uncertain_batches == set()
+    journal.close()
+
+
+def test_truncated_last_line_is_ignored(journal_dir):
+    journal = ImportJournal(SETTINGS, journal_dir)
+    journal.record_target('playlist', 'Импорт')
+    journal.record_batch(0)
+    journal.close()
+    with open(journal.path, 'a', encoding='utf-8') as f:
+        f.write('{"type": "batch", "ind')
+
+    resumed = ImportJournal(SETTINGS, journal_dir)
+    assert resumed.load()
+    assert resumed.target_id == 'playlist'
+    assert resumed.next_batch == 1
+
+
+def test_other_import_does_not_resume(journal_dir):
+    journal = ImportJournal(SETTINGS, journal_dir)
+    journal.record_batch(0)
+    journal.close()
+
+    other = ImportJournal(dict(SETTINGS, target='playlist'), journal_dir)
+    assert not other.load()
+
+
+def test_complete_removes_journal(journal_dir):
+    journal = ImportJournal(SETTINGS, journal_dir)
+    journal.record_batch(0)
+    journal.complete()
+
+    assert not os.path.exists(journal.path)
+    assert not ImportJournal(SETTINGS, journal_dir).load()
+
+
+# --- Продолжение импорта целиком ---
+
+class FakePlaylistWrites:
+    """Вместо spotipy.Spotify: запоминает добавленные пакеты."""
+
+    def __init__(self):
+        self.added = []
+
+    def playlist_add_items(self, playlist_id, items, position=None):
+        self.added.append(list(items))
+        return {'snapshot_id': f'snap-{len(self.added)}'}
+
+
+def _client(sp) -> SpotifyClient:
+    client = SpotifyClient(None, scheduler=RequestScheduler(rate=1000, burst=100))
+    client.sp = sp
+    return client
+
+
+def test_interrupted_add_import_resumes_at_next_batch(journal_dir):
+    track_ids = [f'{n:022d}' for n in range(250)]
+    settings = {'items': track_ids, 'mode': 'add', 'target': 'playlist'}
+    playlists = [{'id': 'playlist', 'name': 'Мой плейлист'}]
+    sp = FakePlaylistWrites()
+    client = _client(sp)
+
+    journal = ImportJournal(settings, journal_dir)
+    journal.load()
+    result = prepare_import(settings, journal, client, playlists)
+    assert result['target_name'] == 'Мой плейлист'
+    journal.record_plan(result['found_ids'])
+    # Импорт прерван после первого пакета
+    with pytest.raises(InterruptedError):
+        add_planned_tracks(journal, client, result['target_id'], result['found_ids'],
+                           cancellation_check=lambda: len(sp.added) >= 1)
+
+    resumed = ImportJournal(settings, journal_dir)
+    assert resumed.load()
+    result = prepare_import(settings, resumed, client, playlists)
+
+    assert result['resume'] is True
+    assert (result['target_id'], result['target_name']) == ('playlist', 'Мой плейлист')
+    assert result['found_ids'] == track_ids
+    assert resumed.next_batch == 1
+    add_planned_tracks(resumed, client, result['target_id'], result['found_ids'])
+
+    assert sp.added == [track_ids[:100], track_ids[100:200], track_ids[200:]]
+    assert not os.path.exists(resumed.path)
@@ -0,0 +1,113 @@
+# test_import_resolver.py
+
+import threading
+
+import pytest
+
+from import_resolver import REASON_EMPTY, REASON_NOT_FOUND, REASON_SEARCH_ERROR, resolve_queries
+from search_cache import normalize_query
+
+ID_A = 'A' * 22
+ID_B = 'B' * 22
+
+
+class FakeSearch:
+    def __init__(self, answers):
+        self.answers = answers
+        self.queries = []
+        self._lock = threading.Lock()
+
+    def __call__(self, query):
+        with self._lock:
+            self.queries.append(query)
+        answer = self.answers.get(query)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+
+def test_resolves_in_row_order_and_searches_each_query_once():
+    search = FakeSearch({'Artist - Song': ID_B, 'Artist - Missing': None})
+    items = [
+        f'spotify:track:{ID_A}',
+        'Artist - Song',
+        '',
+        'artist - song',
+        'Artist - Missing',
+        f'https://open.spotify.com/track/{ID_A}',
+    ]
+
+    result = resolve_queries(items, search, max_workers=2)
+
+    assert result['track_ids'] == [ID_A, ID_B, ID_B, ID_A]
+    assert result['unresolved'] == [
+        (3, '', REASON_EMPTY), (5, 'Artist - Missing', REASON_NOT_FOUND)]
+    assert result['rows'] == 6
+    # Запросы, отличающиеся только регистром, ищутся один раз
+    assert result['searched'] == 2
+    assert sorted(search.queries) == ['Artist - Missing', 'Artist - Song']
+
+
+def test_known_answers_are_not_searched_again():
+    search = FakeSearch({})
+    known = {normalize_query('Artist - Song'): ID_B}
+    resolved = []
+
+    result = resolve_queries(['Artist - Song'], search, known=known,
+                             on_resolved=lambda *args: resolved.append(args))
+
+    assert result['track_ids'] == [ID_B]
+    assert search.queries == []
+    assert resolved == []
+
+
+def test_search_error_is_reported_per_row():
+    search = FakeSearch({'Artist - Song': RuntimeError('timeout')})
+    resolved = []
+
+    result = resolve_queries(['Artist - Song'], search,
+                             on_resolved=lambda *args: resolved.append(args))
+
+    assert result['track_ids'] == []
+    (row, query, reason), = result['unresolved']
+    assert (row, query) == (1, 'Artist - Song')
+    assert reason.startswith(REASON_SEARCH_ERROR)
+    assert resolved == [('Artist - Song', None, reason)]
+
+
+def test_progress_total_is_indeterminate_until_input_is_read():
+    search = FakeSearch({f'Artist - Song {i}': ID_B for i in range(50)})
+    reports = []
+
+    def rows():
+        # Генератор: число строк заранее неизвестно
+        for i in range(50):
+            yield f'Artist - Song {i}'
+
+    resolve_queries(rows(), search, max_workers=1,
+                    progress_callback=lambda done, total: reports.append((done, total)))
+
+    totals = [total for _, total in reports]
+    assert totals[-1] == 50
+    # Общее число не меняется задним числом: сначала 0, затем только итоговое
+    assert set(totals) <= {0, 50}
+    assert totals == sorted(totals)
+    assert reports[-1] == (50, 50)
+
+
+def test_progress_total_known_for_lists():
+    search = FakeSearch({})
+    reports = []
+
+    resolve_queries(['Artist - Song', ID_A], search,
+                    progress_callback=lambda done, total: reports.append((done, total)))
+
+    assert {total for _, total in reports} == {2}
+
+
+def test_cancellation_stops_resolving():
+    search = FakeSearch({})
+
+    with pytest.raises(InterruptedError):
+        resolve_queries([f'Artist - Song {i}' for i in range(100)], search,
+                        max_workers=1, cancellation_check=lambda: True)
@@ -0,0 +1,132 @@
+# test_importer.py
+
+import io
+import json
+
+import pytest
+
+from importer import (LINE_ID, LINE_QUERY, LINE_URI, LINE_URL, _iter_json_array, classify_line,
+                      extract_track_id, iter_file, iter_json, parse_pasted_text)
+
+TRACK_ID = '4uLU6hMCjMI75M1A2tKUQC'
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 7, 64 * 1024])
+def test_json_array_streamed_in_any_chunk_size(chunk_size):
+    items = [{'name': 'Трек, "с кавычками"', 'artist': 'A [B]'},
+             12345, 1.5e3, 'строка', [1, [2]], None, True]
+    text = json.dumps(items, ensure_ascii=False, indent=1)
+
+    assert list(_iter_json_array(io.StringIO(text), chunk_size)) == items
+
+
+def test_json_array_number_split_between_chunks():
+    # Число на границе блока не должно обрезаться
+    assert list(_iter_json_array(io.StringIO('[123456,7]'), chunk_size=4)) == [123456, 7]
+
+
+@pytest.mark.parametrize('text', ['{"a": 1}', '[]', '  [ ] ', ''])
+def test_json_array_requires_non_empty_list(text):
+    with pytest.raises(TypeError):
+        list(_iter_json_array(io.StringIO(text), chunk_size=2))
+
+
+def test_json_array_truncated_file_raises():
+    with pytest.raises(json.JSONDecodeError):
+        list(_iter_json_array(io.StringIO('[{"a": 1}, {"b": '), chunk_size=3))
+
+
+def test_json_array_missing_separator_raises():
+    with pytest.raises(json.JSONDecodeError):
+        list(_iter_json_array(io.StringIO('[1 2]'), chunk_size=2))
+
+
+def test_iter_json_builds_queries(tmp_path):
+    path = tmp_path / 'tracks.json'
+    path.write_text(json.dumps([
+        {'Track_Name': 'Song', 'Artist_Name': 'Artist', 'uri': None},
+        {'Track_Name': 'Other', 'Artist_Name': 'Artist', 'uri': f'spotify:track:{TRACK_ID}'},
+        'не запись',
+        {'Track_Name': '', 'Artist_Name': 'Artist', 'uri': None},
+    ]), encoding='utf-8')
+
+    queries = list(iter_json(str(path)))
+
+    assert queries[0] == 'Artist - Song'
+    assert extract_track_id(queries[1]) == TRACK_ID
+    assert len(queries) == 2
+
+
+def test_iter_csv_streams_rows(tmp_path):
+    path = tmp_path / 'tracks.csv'
+    path.write_text('\ufeffTrack_Name,Artist_Name,Track_URI\n'
+                    'Song,Artist,\n'
+                    f'Other,Artist,spotify:track:{TRACK_ID}\n'
+                    ',,\n', encoding='utf-8')
+
+    queries = iter_file(str(path))
+
+    assert next(queries) == 'Artist - Song'
+    assert extract_track_id(next(queries)) == TRACK_ID
+    assert list(queries) == []
+
+
+def test_iter_jsonl_skips_blank_lines(tmp_path):
+    path = tmp_path / 'tracks.jsonl'
+    path.write_text('{"track_id": "%s"}\n\n{"track_id": "%s"}\n' % (TRACK_ID, TRACK_ID),
+                    encoding='utf-8')
+
+    assert list(iter_file(str(path))) == [TRACK_ID, TRACK_ID]
+
+
+def test_iter_file_rejects_unknown_extension(tmp_path):
+    with pytest.raises(ValueError):
+        iter_file(str(tmp_path / 'tracks.xlsx'))
+
+
+@pytest.mark.parametrize('text', [
+    TRACK_ID,
+    f'spotify:track:{TRACK_ID}',
+    f'https://open.spotify.com/intl-de/track/{TRACK_ID}?si=abc',
+    f'track:{TRACK_ID}',
+])
+def test_extract_track_id(text):
+    assert extract_track_id(text) == TRACK_ID
+
+
+def test_extract_track_id_ignores_text_query():
+    assert extract_track_id('Artist - Song') is None
+
+
+@pytest.mark.parametrize('line, expected', [
+    (f'  {TRACK_ID} ', (LINE_ID, TRACK_ID)),
+    (f'spotify:track:{TRACK_ID}', (LINE_URI, TRACK_ID)),
+    (f'track:{TRACK_ID}', (LINE_URI, TRACK_ID)),
+    (f'https://open.spotify.com/track/{TRACK_ID}?si=abc', (LINE_URL, TRACK_ID)),
+    (f'open.spotify.com/intl-pt-BR/track/{TRACK_ID}', (LINE_URL, TRACK_ID)),
+    ('Artist - Song', (LINE_QUERY, 'Artist - Song')),
+    # 23 символа - уже не ID трека
+    (f'spotify:track:{TRACK_ID}x', (LINE_QUERY, f'spotify:track:{TRACK_ID}x')),
+    ('   ', None),
+])
+def test_classify_line(line, expected):
+    assert classify_line(line) == expected
+
+
+@pytest.mark.parametrize('line', [
+    TRACK_ID, f'spotify:track:{TRACK_ID}', f'https://open.spotify.com/track/{TRACK_ID}',
+    'Artist - Song', f'Artist - Song {TRACK_ID}x',
+])
+def test_classify_line_agrees_with_extract_track_id(line):
+    kind, value = classify_line(line)
+
+    assert extract_track_id(line) == (None if kind == LINE_QUERY else value)
+
+
+def test_parse_pasted_text_counts_kinds():
+    text = f'{TRACK_ID}\n\nspotify:track:{TRACK_ID}\nhttps://open.spotify.com/track/{TRACK_ID}\nArtist - Song\n'
+
+    items, counts = parse_pasted_text(text)
+
+    assert items == [TRACK_ID, TRACK_ID, TRACK_ID, 'Artist - Song']
+    assert counts == {LINE_ID: 1, LINE_URI: 1, LINE_URL: 1, LINE_QUERY: 1}
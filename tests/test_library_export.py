@@ -0,0 +1,104 @@
+# test_library_export.py
+
+import json
+import tarfile
+import threading
+import zipfile
+
+import pytest
+
+from library_export import MANIFEST_NAME, _member_name, export_library
+
+TRACKS = {f'{n:022d}': {'id': f'{n:022d}', 'name': f'Song {n}', 'artist': 'Artist', 'album': 'Album'}
+          for n in range(6)}
+TRACK_IDS = list(TRACKS)
+PLAYLISTS = [
+    {'id': 'liked_songs', 'name': 'Понравившиеся треки'},
+    {'id': 'fresh', 'name': 'Актуальный', 'snapshot_id': 'v1'},
+    {'id': 'stale', 'name': 'Устаревший: a/b', 'snapshot_id': 'v2'},
+    {'id': 'broken', 'name': 'Устаревший', 'snapshot_id': 'v2'},
+]
+
+
+@pytest.fixture
+def playlist_cache():
+    return {
+        'liked_songs': {'snapshot_id': 'liked-1', 'track_ids': TRACK_IDS[:2]},
+        'fresh': {'snapshot_id': 'v1', 'track_ids': TRACK_IDS[2:4]},
+        'stale': {'snapshot_id': 'v1', 'track_ids': TRACK_IDS[:1]},
+    }
+
+
+def _export(playlist_cache, archive_path, settings=None, **kwargs):
+    refreshed = []
+    lock = threading.Lock()
+
+    def refresh_playlist(playlist_id, snapshot_id, cancellation_check=None):
+        with lock:
+            refreshed.append(playlist_id)
+        if playlist_id == 'broken':
+            raise ConnectionError("нет сети")
+        playlist_cache[playlist_id] = {'snapshot_id': snapshot_id, 'track_ids': TRACK_IDS[4:]}
+
+    stats = export_library(
+        PLAYLISTS, playlist_cache, TRACKS, str(archive_path), settings or {'format': 'jsonl'},
+        get_snapshot_id=lambda playlist_id: 'liked-1', refresh_playlist=refresh_playlist,
+        **kwargs)
+    return stats, sorted(refreshed)
+
+
+def test_zip_export_refreshes_only_stale_playlists(tmp_path, playlist_cache):
+    archive_path = tmp_path / 'library.zip'
+
+    stats, refreshed = _export(playlist_cache, archive_path)
+
+    assert refreshed == ['broken', 'stale']
+    assert (stats['refreshed'], stats['from_cache'], stats['failed']) == (1, 2, 1)
+    assert stats['tracks'] == 6
+
+    with zipfile.ZipFile(archive_path) as archive:
+        manifest = json.loads(archive.read(MANIFEST_NAME))
+        entries = {entry['id']: entry for entry in manifest['playlists']}
+        assert entries['broken']['file'] is None
+        assert 'нет сети' in entries['broken']['error']
+        assert entries['stale']['refreshed'] is True
+        assert entries['fresh']['refreshed'] is False
+        # Имя файла не содержит символов, недопустимых в путях
+        assert entries['stale']['file'] == '003 Устаревший_ a_b.jsonl'
+        lines = archive.read(entries['stale']['file']).decode('utf-8').splitlines()
+        assert [json.loads(line)['id'] for line in lines] == TRACK_IDS[4:]
+
+
+@pytest.mark.parametrize('name', ['library.tar', 'library.tar.gz'])
+def test_tar_export(tmp_path, playlist_cache, name):
+    archive_path = tmp_path / name
+
+    _export(playlist_cache, archive_path, {'format': 'csv', 'columns': ['id', 'name']})
+
+    with tarfile.open(archive_path) as archive:
+        names = archive.getnames()
+        assert MANIFEST_NAME in names
+        member = next(name for name in names if name.startswith('002 '))
+        text = archive.extractfile(member).read().decode('utf-8-sig')
+    assert text.splitlines()[0] == 'id,name'
+    assert len(text.splitlines()) == 3
+
+
+def test_unknown_archive_extension_is_rejected(tmp_path, playlist_cache):
+    with pytest.raises(ValueError):
+        _export(playlist_cache, tmp_path / 'library.rar')
+
+
+def test_cancellation_stops_export(tmp_path, playlist_cache):
+    with pytest.raises(InterruptedError):
+        _export(playlist_cache, tmp_path / 'library.zip', cancellation_check=lambda: True)
+
+
+def test_member_names_are_unique():
+    used = set()
+
+    first = _member_name(1, 'Mix', 'csv', used)
+    second = _member_name(1, 'Mix', 'csv', used)
+
+    assert (first, second) == ('001 Mix.csv', '001 Mix (2).csv')
+    assert _member_name(2, ' ... ', 'csv', used) == '002 playlist.csv'
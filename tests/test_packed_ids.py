@@ -0,0 +1,92 @@
+# test_packed_ids.py
+
+from array import array
+
+from packed_ids import KEY_TYPECODE, TrackIdTable, count_duplicates, dedup, pack, to_bitmap, unpack
+
+TRACK_IDS = [f'{i:022d}' for i in range(5)]
+
+
+def test_encode_assigns_stable_keys():
+    table = TrackIdTable()
+
+    keys = table.encode([TRACK_IDS[0], TRACK_IDS[1], TRACK_IDS[0]])
+
+    assert list(keys) == [0, 1, 0]
+    assert list(table.encode([TRACK_IDS[1], TRACK_IDS[2]])) == [1, 2]
+    assert table.decode(keys) == [TRACK_IDS[0], TRACK_IDS[1], TRACK_IDS[0]]
+    assert table.key_of(TRACK_IDS[2]) == 2
+    assert table.key_of(TRACK_IDS[3]) is None
+    assert len(table) == 3
+
+
+def test_unsaved_pairs_are_taken_once_and_can_be_restored():
+    table = TrackIdTable()
+    table.encode(TRACK_IDS[:2])
+
+    pairs = table.take_unsaved()
+    assert pairs == [(0, TRACK_IDS[0]), (1, TRACK_IDS[1])]
+    assert table.take_unsaved() == []
+
+    # Транзакция откатилась - пары нужно записать со следующей
+    table.restore_unsaved(pairs)
+    table.encode([TRACK_IDS[2]])
+    assert table.take_unsaved() == pairs + [(2, TRACK_IDS[2])]
+
+
+def test_load_restores_saved_pairs():
+    table = TrackIdTable()
+    table.load([(3, TRACK_IDS[3]), (0, TRACK_IDS[0])])
+
+    assert table.decode([3, 0]) == [TRACK_IDS[3], TRACK_IDS[0]]
+    # Пропуски между загруженными ключами выдаются новым ID
+    assert list(table.encode([TRACK_IDS[4], TRACK_IDS[1], TRACK_IDS[2]])) == [1, 2, 4]
+
+
+def test_discarded_keys_are_reused():
+    table = TrackIdTable()
+    table.encode(TRACK_IDS[:4])
+    table.take_unsaved()
+
+    table.discard([1, 3])
+
+    assert table.key_of(TRACK_IDS[1]) is None
+    assert table.unused_keys(bytearray([1, 0, 0])) == [2]
+    # Свободный ключ в конце таблицы убирается, в середине - выдается повторно
+    assert (len(table), table.key_limit()) == (2, 3)
+    assert list(table.encode([TRACK_IDS[4], 'x' * 22])) == [1, 3]
+    assert table.decode([0, 1, 2, 3]) == [TRACK_IDS[0], TRACK_IDS[4], TRACK_IDS[2], 'x' * 22]
+
+
+def test_discard_drops_unsaved_pairs_and_reset_empties_table():
+    table = TrackIdTable()
+    table.encode(TRACK_IDS[:2])
+
+    table.discard([1])
+    assert table.take_unsaved() == [(0, TRACK_IDS[0])]
+
+    table.reset([(5, TRACK_IDS[4])])
+    assert table.key_of(TRACK_IDS[0]) is None
+    assert list(table.encode([TRACK_IDS[0]])) == [0]
+
+
+def test_pack_round_trip():
+    keys = array(KEY_TYPECODE, [0, 7, 2 ** 32 - 1, 7])
+
+    data = pack(keys)
+
+    assert len(data) == 4 * len(keys)
+    assert unpack(data) == keys
+    assert unpack(None) == array(KEY_TYPECODE)
+
+
+def test_dedup_and_duplicates_keep_first_occurrence():
+    keys = array(KEY_TYPECODE, [5, 1, 5, 2, 1, 5])
+
+    assert list(dedup(keys)) == [5, 1, 2]
+    assert count_duplicates(keys) == 3
+    assert count_duplicates(array(KEY_TYPECODE)) == 0
+
+
+def test_bitmap_marks_members():
+    assert to_bitmap([0, 3], 5) == bytearray([1, 0, 0, 1, 0])
@@ -0,0 +1,152 @@
+# test_request_scheduler.py
+
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from http_session import mount_scheduler
+from request_scheduler import RequestScheduler, cancellation_scope
+
+
+class FakeApi:
+    """
+    Локальный HTTP-сервер вместо API: отвечает по заранее заданному
+    сценарию [(статус, заголовки), ...] и запоминает полученные запросы.
+    Когда сценарий исчерпан, отвечает 200.
+    """
+
+    def __init__(self):
+        self.responses = []
+        self.requests = []
+        self._lock = threading.Lock()
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                if length:
+                    self.rfile.read(length)
+                with api._lock:
+                    api.requests.append((self.command, self.path))
+                    status, headers = api.responses.pop(0) if api.responses else (200, {})
+                body = b'{}'
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_GET = do_POST = do_PUT = do_DELETE = _reply
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/'
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def api():
+    fake = FakeApi()
+    yield fake
+    fake.close()
+
+
+@pytest.fixture
+def scheduler():
+    return RequestScheduler(rate=1000, burst=100, base_backoff=0.01, max_backoff=0.05)
+
+
+@pytest.fixture
+def session(api, scheduler):
+    session = requests.Session()
+    mount_scheduler(scheduler, prefix=api.url, session=session)
+    yield session
+    session.close()
+
+
+def test_throttled_request_waits_retry_after_and_pauses_scheduler(api, scheduler, session):
+    api.responses = [(429, {'Retry-After': '0.3'})]
+
+    started = time.monotonic()
+    response = session.post(api.url + 'v1/playlists/p/tracks', json={}, timeout=5)
+
+    assert response.status_code == 200
+    assert time.monotonic() - started >= 0.3
+    # 429 повторяется для любого метода: сервер запрос не выполнял
+    assert [method for method, _ in api.requests] == ['POST', 'POST']
+    assert scheduler.stats()['throttled'] == 1
+
+
+def test_server_error_retried_for_get(api, session):
+    api.responses = [(503, {}), (502, {})]
+
+    response = session.get(api.url + 'v1/me', timeout=5)
+
+    assert response.status_code == 200
+    assert len(api.requests) == 3
+
+
+def test_server_error_not_retried_for_post(api, session):
+    api.responses = [(503, {'Retry-After': '0'})]
+
+    response = session.post(api.url + 'v1/playlists/p/tracks', json={}, timeout=5)
+
+    # Добавление могло выполниться - повтор создал бы дубликаты
+    assert response.status_code == 503
+    assert len(api.requests) == 1
+
+
+def test_retries_stop_after_max_retries(api, scheduler, session):
+    scheduler.max_retries = 2
+    api.responses = [(500, {})] * 5
+
+    response = session.get(api.url + 'v1/me', timeout=5)
+
+    assert response.status_code == 500
+    assert len(api.requests) == 3
+
+
+def test_cancellation_interrupts_retry_after_sleep(api, session):
+    api.responses = [(429, {'Retry-After': '30'})]
+    cancelled = threading.Event()
+    threading.Timer(0.3, cancelled.set).start()
+
+    started = time.monotonic()
+    with cancellation_scope(cancelled.is_set), pytest.raises(InterruptedError):
+        session.get(api.url + 'v1/me', timeout=5)
+
+    assert time.monotonic() - started < 5
+    assert len(api.requests) == 1
+
+
+def test_interactive_priority_served_first():
+    scheduler = RequestScheduler(rate=20, burst=1)
+    scheduler.acquire()  # ведро пустое, следующий токен через 50 мс
+    order = []
+
+    def worker(level, name):
+        with scheduler.priority(level):
+            scheduler.acquire()
+        order.append(name)
+
+    background = threading.Thread(target=worker, args=(10, 'background'))
+    background.start()
+    time.sleep(0.01)
+    interactive = threading.Thread(target=worker, args=(0, 'interactive'))
+    interactive.start()
+    background.join(5)
+    interactive.join(5)
+
+    assert order == ['interactive', 'background']
@@ -0,0 +1,121 @@
+# test_search_cache.py
+
+import json
+
+import search_cache
+from search_cache import SearchCache, normalize_query
+
+
+class Clock:
+    """Подменяет time.time() в search_cache."""
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+
+def _with_clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(search_cache.time, 'time', clock.time)
+    return clock
+
+
+def test_normalize_query_ignores_case_and_spacing():
+    assert normalize_query('  Artist   -  SONG ') == 'artist - song'
+
+
+def test_hit_is_keyed_by_normalized_query_and_limit():
+    cache = SearchCache()
+    cache.put('Artist - Song', 1, ['a'])
+
+    assert cache.get('artist  -  song', 1) == ['a']
+    assert cache.get('Artist - Song', 50) is None
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+
+def test_empty_result_is_cached():
+    cache = SearchCache()
+    cache.put('Unknown', 1, [])
+
+    # "Не найдено" тоже ответ: повторный поиск не нужен
+    assert cache.get('Unknown', 1) == []
+
+
+def test_returned_list_is_a_copy():
+    cache = SearchCache()
+    cache.put('Artist - Song', 50, ['a', 'b'])
+
+    cache.get('Artist - Song', 50).append('c')
+
+    assert cache.get('Artist - Song', 50) == ['a', 'b']
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    clock = _with_clock(monkeypatch)
+    cache = SearchCache(ttl=60)
+    cache.put('Artist - Song', 1, ['a'])
+
+    clock.now += 59
+    assert cache.get('Artist - Song', 1) == ['a']
+    clock.now += 2
+    assert cache.get('Artist - Song', 1) is None
+    assert cache.stats()['expired'] == 1
+    assert cache.stats()['entries'] == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = SearchCache(max_entries=2)
+    cache.put('first', 1, ['a'])
+    cache.put('second', 1, ['b'])
+    cache.get('first', 1)
+
+    cache.put('third', 1, ['c'])
+
+    assert cache.get('second', 1) is None
+    assert cache.get('first', 1) == ['a']
+    assert cache.get('third', 1) == ['c']
+    assert cache.stats()['evictions'] == 1
+
+
+def test_save_and_load_keep_order_and_drop_expired(tmp_path, monkeypatch):
+    clock = _with_clock(monkeypatch)
+    path = str(tmp_path / 'search_cache.json')
+    cache = SearchCache(path, ttl=60, max_entries=10)
+    cache.put('old', 1, ['a'])
+    clock.now += 50
+    cache.put('second', 1, ['b'])
+    cache.put('third', 1, ['c'])
+    cache.save()
+
+    clock.now += 20
+    loaded = SearchCache(path, ttl=60, max_entries=1)
+    loaded.load()
+
+    # 'old' устарел, из оставшихся помещается только самый недавний
+    assert loaded.get('old', 1) is None
+    assert loaded.get('second', 1) is None
+    assert loaded.get('third', 1) == ['c']
+
+
+def test_broken_file_is_ignored(tmp_path):
+    path = tmp_path / 'search_cache.json'
+    path.write_text('{"entries": [', encoding='utf-8')
+
+    cache = SearchCache(str(path))
+    cache.load()
+
+    assert cache.stats()['entries'] == 0
+
+
+def test_save_replaces_file_atomically(tmp_path):
+    path = tmp_path / 'search_cache.json'
+    cache = SearchCache(str(path))
+    cache.put('Artist - Song', 1, ['a'])
+
+    cache.save()
+
+    assert json.loads(path.read_text(encoding='utf-8'))['entries'][0][1][1] == ['a']
+    assert not (tmp_path / 'search_cache.json.tmp').exists()
@@ -0,0 +1,100 @@
+# test_single_flight.py
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+def _run_concurrently(flight, key, fn, callers, **kwargs):
+    with ThreadPoolExecutor(max_workers=callers) as executor:
+        futures = [executor.submit(flight.do, key, fn, **kwargs) for _ in range(callers)]
+        return [future.result(timeout=5) for future in futures]
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        release.wait(5)
+        return 'result'
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(flight.do, 'key', fetch) for _ in range(4)]
+        # Даем всем потокам присоединиться к первому вызову
+        while flight.stats()['calls'] < 4:
+            threading.Event().wait(0.01)
+        release.set()
+        results = [future.result(timeout=5) for future in futures]
+
+    assert results == ['result'] * 4
+    assert len(calls) == 1
+    assert flight.stats() == {'calls': 4, 'executed': 1, 'coalesced': 3}
+
+
+def test_error_is_shared_with_waiters():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def fail():
+        release.wait(5)
+        raise ValueError('boom')
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        futures = [executor.submit(flight.do, 'key', fail) for _ in range(3)]
+        while flight.stats()['calls'] < 3:
+            threading.Event().wait(0.01)
+        release.set()
+        for future in futures:
+            with pytest.raises(ValueError):
+                future.result(timeout=5)
+
+
+def test_sequential_calls_are_not_cached():
+    flight = SingleFlight()
+    counter = iter(range(10))
+
+    assert flight.do('key', lambda: next(counter)) == 0
+    assert flight.do('key', lambda: next(counter)) == 1
+
+
+def test_cancelled_leader_result_is_not_shared():
+    flight = SingleFlight()
+    leader_started = threading.Event()
+    release = threading.Event()
+    cancelled = threading.Event()
+    results = {}
+
+    def fetch(cancellation_check=None):
+        if cancellation_check is not None:
+            leader_started.set()
+            release.wait(5)
+            return 'partial'
+        return 'complete'
+
+    def leader():
+        results['leader'] = flight.do(
+            'key', fetch, cancellation_check=cancelled.is_set)
+
+    def follower():
+        results['follower'] = flight.do('key', fetch)
+
+    leader_thread = threading.Thread(target=leader)
+    leader_thread.start()
+    assert leader_started.wait(5)
+    follower_thread = threading.Thread(target=follower)
+    follower_thread.start()
+    while flight.stats()['calls'] < 2:
+        threading.Event().wait(0.01)
+    cancelled.set()
+    release.set()
+    leader_thread.join(5)
+    follower_thread.join(5)
+
+    # Отмененный вызов мог вернуть неполный результат - ожидающий повторяет запрос сам
+    assert results == {'leader': 'partial', 'follower': 'complete'}
@@ -0,0 +1,442 @@
+# test_spotify_client.py
+
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+import requests
+import spotipy
+
+import request_scheduler
+import spotify_client
+from request_scheduler import RequestScheduler
+from spotify_client import SpotifyClient, WriteBatchError
+
+API = 'https://api.spotify.com/v1'
+
+
+def _item(n: int) -> dict:
+    return {'track': {'id': f'{n:022d}', 'type': 'track', 'is_local': False,
+                      'name': f'Song {n}', 'artists': [{'name': 'Artist'}],
+                      'album': {'name': 'Album', 'images': []}}}
+
+
+class FakePages:
+    """
+    Вместо spotipy.Spotify: отдает список элементов страницами по limit,
+    по адресу с offset и limit, как настоящий API. delays задает задержку
+    ответа для отдельных смещений, failing - смещение, на котором запрос падает.
+    """
+
+    def __init__(self, count: int, limit: int = 50, delays=None, failing=None):
+        self.items = [_item(n) for n in range(count)]
+        self.limit = limit
+        self.delays = delays or {}
+        self.failing = failing
+        self.requested = []
+        self._lock = threading.Lock()
+
+    def page(self, offset: int, limit: int, path: str = '/playlists/p/tracks') -> dict:
+        next_offset = offset + limit
+        return {
+            'items': self.items[offset:offset + limit],
+            'total': len(self.items),
+            'next': (f'{API}{path}?offset={next_offset}&limit={limit}'
+                     '&fields=items(track(id)),next,total'
+                     if next_offset < len(self.items) else None),
+        }
+
+    def playlist_tracks(self, playlist_id, fields=None, limit=50):
+        return self.page(0, self.limit)
+
+    def _get(self, url, args=None, payload=None, **kwargs):
+        query = parse_qs(urlparse(url).query)
+        offset = int(query['offset'][0])
+        limit = int(query['limit'][0])
+        with self._lock:
+            self.requested.append(offset)
+        time.sleep(self.delays.get(offset, 0))
+        if offset == self.failing:
+            raise ConnectionError("обрыв соединения")
+        return self.page(offset, limit)
+
+
+def make_client(sp) -> SpotifyClient:
+    client = SpotifyClient(None, scheduler=RequestScheduler(rate=1000, burst=100))
+    client.sp = sp
+    return client
+
+
+# --- Параллельная загрузка страниц ---
+
+def test_remaining_page_urls_cover_every_offset():
+    first = FakePages(230).page(0, 50)
+
+    urls = SpotifyClient._remaining_page_urls(first)
+
+    offsets = [int(parse_qs(urlparse(url).query)['offset'][0]) for url in urls]
+    assert offsets == [50, 100, 150, 200]
+    # Проекция полей сохраняется в ссылках на остальные страницы
+    assert all('fields=items(track(id)),next,total' in url for url in urls)
+
+
+def test_single_page_has_no_remaining_urls():
+    assert SpotifyClient._remaining_page_urls(FakePages(20).page(0, 50)) == []
+
+
+def test_pages_are_joined_in_order_when_they_arrive_out_of_order():
+    # Ранние страницы отвечают дольше поздних
+    sp = FakePages(300, delays={50: 0.2, 100: 0.1})
+    client = make_client(sp)
+    progress = []
+
+    track_ids = client.get_playlist_track_ids(
+        'p', progress_callback=lambda done, total: progress.append((done, total)))
+
+    assert track_ids == [f'{n:022d}' for n in range(300)]
+    assert sorted(sp.requested) == [50, 100, 150, 200, 250]
+    assert progress[-1] == (300, 300)
+
+
+def test_cancellation_keeps_only_contiguous_pages():
+    sp = FakePages(300, delays={100: 0.3})
+    client = make_client(sp)
+    loaded = []
+
+    def cancellation_check():
+        # Отмена, когда догружена вторая страница: следующие могли прийти раньше третьей
+        return len(loaded) >= 2
+
+    items = client._get_all_items(
+        sp.page(0, 50), cancellation_check,
+        progress_callback=lambda done, total: loaded.append(done))
+
+    assert [item['track']['id'] for item in items] == [f'{n:022d}' for n in range(100)]
+
+
+def test_failed_page_is_not_cached_as_a_short_list():
+    client = make_client(FakePages(300, failing=150))
+
+    with pytest.raises(ConnectionError):
+        client.get_playlist_track_ids('p')
+
+
+# --- Индекс плейлистов ---
+
+class FakePlaylists(FakePages):
+    """Список плейлистов пользователя и запрос snapshot_id одного плейлиста."""
+
+    def __init__(self):
+        super().__init__(0)
+        self.items = [{'id': 'p', 'name': 'Mix', 'snapshot_id': 'v1', 'tracks': {'total': 3}}]
+        self.server_snapshot = 'v1'
+        self.probes = 0
+
+    def current_user_playlists(self, limit=50):
+        return self.page(0, limit, path='/me/playlists')
+
+    def playlist(self, playlist_id, fields=None):
+        self.probes += 1
+        return {'snapshot_id': self.server_snapshot}
+
+
+def test_indexed_snapshot_is_used_without_request():
+    sp = FakePlaylists()
+    client = make_client(sp)
+    client.get_user_playlists()
+
+    assert client.get_indexed_snapshot_id('p') == 'v1'
+    assert client.get_playlist_snapshot_id('p') == 'v1'
+    assert sp.probes == 0
+
+
+def test_fresh_snapshot_skips_index_and_updates_it():
+    sp = FakePlaylists()
+    client = make_client(sp)
+    client.get_user_playlists()
+    # Плейлист изменили в другом приложении
+    sp.server_snapshot = 'v2'
+
+    assert client.get_playlist_snapshot_id('p', fresh=True) == 'v2'
+    assert client.get_indexed_snapshot_id('p') == 'v2'
+    assert sp.probes == 1
+
+
+def test_old_index_entry_is_not_trusted():
+    sp = FakePlaylists()
+    client = make_client(sp)
+    client.get_user_playlists()
+    sp.server_snapshot = 'v2'
+    client.playlist_index['p']['indexed_at'] -= spotify_client.SNAPSHOT_INDEX_MAX_AGE + 1
+
+    assert client.get_indexed_snapshot_id('p') is None
+    assert client.get_playlist_snapshot_id('p') == 'v2'
+    assert sp.probes == 1
+
+
+# --- Информация о треках ---
+
+class FakeTracks:
+    """sp.tracks, который падает ошибками из errors по очереди, затем отвечает."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def tracks(self, id_chunk):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return {'tracks': [_item(int(track_id))['track'] for track_id in id_chunk]}
+
+
+def _fast_retries(client):
+    client.scheduler.base_backoff = 0.01
+    return client
+
+
+def test_connection_errors_are_retried():
+    sp = FakeTracks(requests.ConnectionError('reset'), requests.Timeout('read timeout'))
+    client = _fast_retries(make_client(sp))
+
+    details, failed = client.fetch_tracks_details(_ids(1, 2), retries=2)
+
+    assert set(details) == set(_ids(1, 2))
+    assert failed == []
+    assert sp.calls == 3
+
+
+def test_client_errors_are_not_retried():
+    sp = FakeTracks(spotipy.SpotifyException(400, -1, 'invalid id'))
+    client = _fast_retries(make_client(sp))
+
+    details, failed = client.fetch_tracks_details(_ids(1, 2), retries=2)
+
+    assert details == {}
+    assert failed == _ids(1, 2)
+    assert sp.calls == 1
+
+
+def test_retry_pause_is_interrupted_by_cancellation():
+    sp = FakeTracks(*[requests.ConnectionError('reset')] * 3)
+    client = make_client(sp)
+    client.scheduler.base_backoff = 30
+    cancelled = threading.Event()
+    threading.Timer(0.1, cancelled.set).start()
+
+    started = time.monotonic()
+    with request_scheduler.cancellation_scope(cancelled.is_set):
+        with pytest.raises(InterruptedError):
+            client._fetch_tracks_chunk(_ids(1), 2)
+
+    assert time.monotonic() - started < 5
+    assert sp.calls == 1
+
+
+# --- Конвейер записи ---
+
+class FakeWrites:
+    """Записывает вызовы изменяющих методов; fail_on - {номер вызова: исключение}."""
+
+    def __init__(self, fail_on=None):
+        self.calls = []
+        self.fail_on = fail_on or {}
+
+    def _call(self, name, *args, **kwargs):
+        self.calls.append((name, args, kwargs))
+        error = self.fail_on.get(len(self.calls) - 1)
+        if error is not None:
+            raise error
+        return {'snapshot_id': f'snap-{len(self.calls)}'}
+
+    def playlist_add_items(self, playlist_id, items, position=None):
+        return self._call('add', playlist_id, list(items), position=position)
+
+    def playlist_remove_all_occurrences_of_items(self, playlist_id, items, snapshot_id=None):
+        return self._call('remove', playlist_id, list(items), snapshot_id=snapshot_id)
+
+    def current_user_saved_tracks_add(self, tracks):
+        return self._call('like', list(tracks))
+
+
+TRACKS_250 = [f'{n:022d}' for n in range(250)]
+
+
+def test_add_tracks_splits_into_ordered_batches_and_advances_position():
+    sp = FakeWrites()
+    client = make_client(sp)
+    progress = []
+
+    client.add_tracks_to_playlist('p', TRACKS_250, position=5,
+                                  progress_callback=lambda done, total: progress.append((done, total)))
+
+    assert [len(args[1]) for _, args, _ in sp.calls] == [100, 100, 50]
+    assert [args[1] for _, args, _ in sp.calls] == [
+        TRACKS_250[:100], TRACKS_250[100:200], TRACKS_250[200:]]
+    assert [kwargs['position'] for _, _, kwargs in sp.calls] == [5, 105, 205]
+    assert progress == [(100, 250), (200, 250), (250, 250)]
+    # Индекс плейлистов знает версию после последнего пакета
+    assert client.get_indexed_snapshot_id('p') == 'snap-3'
+
+
+def test_start_batch_skips_committed_batches():
+    sp = FakeWrites()
+    client = make_client(sp)
+    committed = []
+
+    client.add_tracks_to_playlist('p', TRACKS_250, start_batch=1,
+                                  on_batch_committed=lambda index, batch: committed.append(index))
+
+    assert [args[1] for _, args, _ in sp.calls] == [TRACKS_250[100:200], TRACKS_250[200:]]
+    assert committed == [1, 2]
+
+
+def test_remove_batches_chain_snapshot_ids():
+    sp = FakeWrites()
+    client = make_client(sp)
+
+    client.remove_tracks_from_playlist('p', TRACKS_250)
+
+    assert [kwargs['snapshot_id'] for _, _, kwargs in sp.calls] == [None, 'snap-1', 'snap-2']
+    assert sp.calls[0][1][1][0] == f'spotify:track:{TRACKS_250[0]}'
+
+
+@pytest.mark.parametrize('error, uncertain', [
+    (spotipy.SpotifyException(500, -1, 'server error'), True),
+    (requests.Timeout('read timeout'), True),
+    (requests.ConnectionError('reset'), True),
+    (spotipy.SpotifyException(400, -1, 'invalid id'), False),
+])
+def test_failed_batch_is_sent_once_and_reported(error, uncertain):
+    sp = FakeWrites(fail_on={1: error})
+    client = make_client(sp)
+    committed = []
+
+    with pytest.raises(WriteBatchError) as info:
+        client.add_tracks_to_playlist('p', TRACKS_250,
+                                      on_batch_committed=lambda index, batch: committed.append(index))
+
+    # Пакет не повторяется: после таймаута или 5xx он мог уже примениться
+    assert len(sp.calls) == 2
+    assert committed == [0]
+    assert info.value.index == 1
+    assert info.value.batch == TRACKS_250[100:200]
+    assert info.value.uncertain is uncertain
+
+
+def test_cancellation_stops_between_batches():
+    sp = FakeWrites()
+    client = make_client(sp)
+
+    with pytest.raises(InterruptedError):
+        client.add_tracks_to_playlist('p', TRACKS_250,
+                                      cancellation_check=lambda: len(sp.calls) >= 1)
+
+    assert len(sp.calls) == 1
+
+
+def test_liked_batches_update_liked_index():
+    sp = FakeWrites()
+    client = make_client(sp)
+
+    client.add_tracks_to_liked(TRACKS_250[:120])
+
+    assert [len(args[0]) for _, args, _ in sp.calls] == [50, 50, 20]
+    assert TRACKS_250[119] in client.liked_index
+
+
+# --- Инкрементальная синхронизация 'Понравившихся' ---
+
+class FakeLiked(FakePages):
+    """Сохраненные треки от новых к старым; у каждого есть added_at."""
+
+    def __init__(self, entries):
+        super().__init__(0)
+        self.items = [dict(_item(n), added_at=added_at) for n, added_at in entries]
+        self.saved_tracks_offsets = []
+
+    def current_user_saved_tracks(self, limit=50, offset=0):
+        self.saved_tracks_offsets.append(offset)
+        return self.page(offset, limit, path='/me/tracks')
+
+
+def _ids(*numbers) -> list[str]:
+    return [f'{n:022d}' for n in numbers]
+
+
+def _liked_entries(count: int, newest: int = 0) -> list[tuple[int, str]]:
+    # Трек n добавлен в момент n: более новые идут первыми
+    return [(n, f'2024-01-01T00:{n // 60:02d}:{n % 60:02d}Z')
+            for n in range(newest + count - 1, newest - 1, -1)]
+
+
+def test_incremental_sync_loads_only_new_tracks():
+    cached = _ids(*range(119, -1, -1))
+    sp = FakeLiked(_liked_entries(123))
+    client = make_client(sp)
+
+    result = client.get_liked_tracks_incremental(cached, sp.items[3]['added_at'])
+
+    assert result['full_rescan'] is False
+    assert result['track_ids'] == _ids(122, 121, 120) + cached
+    assert set(result['details']) == set(_ids(122, 121, 120))
+    assert result['newest_added_at'] == sp.items[0]['added_at']
+    # Хватило первой страницы
+    assert sp.saved_tracks_offsets == [0]
+    assert sp.requested == []
+
+
+def test_incremental_sync_walks_pages_until_cached_track():
+    cached = _ids(9, 8, 7, 6, 5, 4, 3, 2, 1, 0)
+    sp = FakeLiked(_liked_entries(130))
+    client = make_client(sp)
+
+    result = client.get_liked_tracks_incremental(cached, sp.items[120]['added_at'])
+
+    assert result['full_rescan'] is False
+    assert result['track_ids'] == _ids(*range(129, -1, -1))
+    assert sp.saved_tracks_offsets == [0, 50, 100]
+
+
+def test_same_second_is_resolved_by_track_id():
+    entries = [(2, '2024-01-01T00:00:05Z'), (1, '2024-01-01T00:00:05Z'), (0, '2024-01-01T00:00:04Z')]
+    client = make_client(FakeLiked(entries))
+
+    result = client.get_liked_tracks_incremental(_ids(1, 0), '2024-01-01T00:00:05Z')
+
+    assert result['track_ids'] == _ids(2, 1, 0)
+    assert result['full_rescan'] is False
+
+
+def test_relike_moves_track_to_front():
+    entries = [(0, '2024-01-01T00:00:09Z'), (2, '2024-01-01T00:00:05Z'), (1, '2024-01-01T00:00:04Z')]
+    client = make_client(FakeLiked(entries))
+
+    result = client.get_liked_tracks_incremental(_ids(2, 1, 0), '2024-01-01T00:00:05Z')
+
+    assert result['track_ids'] == _ids(0, 2, 1)
+    assert result['full_rescan'] is False
+
+
+def test_removed_likes_fall_back_to_full_rescan():
+    # Из кэша пропал трек 5: общее число не сходится
+    cached = _ids(*range(9, -1, -1))
+    sp = FakeLiked([entry for entry in _liked_entries(10) if entry[0] != 5])
+    client = make_client(sp)
+
+    result = client.get_liked_tracks_incremental(cached, sp.items[0]['added_at'])
+
+    assert result['full_rescan'] is True
+    assert result['track_ids'] == _ids(9, 8, 7, 6, 4, 3, 2, 1, 0)
+
+
+def test_empty_cache_loads_everything():
+    sp = FakeLiked(_liked_entries(120))
+    client = make_client(sp)
+
+    result = client.get_liked_tracks_incremental([], None)
+
+    assert result['full_rescan'] is True
+    assert result['track_ids'] == _ids(*range(119, -1, -1))
+    assert result['newest_added_at'] == sp.items[0]['added_at']
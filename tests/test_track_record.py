@@ -0,0 +1,62 @@
+# test_track_record.py
+
+import pytest
+
+from track_record import TrackRecord
+
+TRACK = {'id': '0' * 22, 'name': 'Song', 'artist': 'Artist', 'album': 'Album', 'cover_url': None}
+
+
+def test_record_behaves_like_dict():
+    record = TrackRecord.from_mapping(TRACK)
+
+    assert record == TRACK
+    assert 'cover_path' not in record
+    assert record.get('cover_path') is None
+    assert '{artist} - {name}'.format(**record) == 'Artist - Song'
+
+
+@pytest.mark.parametrize('key', ['name', 'cover_url', 'cover_path'])
+def test_deleted_field_is_absent(key):
+    record = TrackRecord.from_mapping(dict(TRACK, cover_path='cover.jpg'))
+
+    del record[key]
+
+    assert key not in record
+    assert key not in dict(record)
+    assert record.get(key, 'default') == 'default'
+    with pytest.raises(KeyError):
+        record[key]
+    with pytest.raises(KeyError):
+        del record[key]
+
+
+def test_pop_removes_field_and_extra_key():
+    record = TrackRecord.from_mapping(dict(TRACK, popularity=70))
+
+    assert record.pop('name') == 'Song'
+    assert record.pop('name', None) is None
+    assert record.pop('popularity') == 70
+    assert set(record) == {'id', 'artist', 'album', 'cover_url'}
+
+    # После удаления поле можно задать снова, в том числе значением None
+    record['name'] = None
+    assert record['name'] is None
+
+
+def test_copy_is_independent():
+    record = TrackRecord.from_mapping(dict(TRACK, popularity=70))
+
+    clone = record.copy()
+    del clone['album']
+    clone['popularity'] = 10
+
+    assert record['album'] == 'Album'
+    assert record['popularity'] == 70
+
+
+def test_repeated_strings_are_shared():
+    first = TrackRecord.from_mapping(dict(TRACK, artist=''.join(['Art', 'ist'])))
+    second = TrackRecord.from_mapping(dict(TRACK, artist=''.join(['Art', 'ist'])))
+
+    assert first['artist'] is second['artist']
@@ -0,0 +1,144 @@
+# track_record.py
+
+import sys
+from collections.abc import MutableMapping
+
+
+def _intern(value):
+    """Интернирует строку: одинаковые исполнители и альбомы хранятся в одном экземпляре."""
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class TrackRecord(MutableMapping):
+    """
+    Компактная запись о треке вместо словаря: поля в __slots__, строки
+    исполнителя, альбома и ссылки на обложку интернированы.
+
+    Ведет себя как словарь (track['name'], track.get('cover_path'),
+    template.format(**track), dict(track)), поэтому остальной код не
+    различает записи и обычные словари. Поля, которых нет в __slots__,
+    хранятся в маленьком словаре extra, создаваемом только при необходимости.
+    """
+
+    FIELDS = ('id', 'name', 'artist', 'album', 'cover_url', 'cover_path')
+    _INTERNED = ('artist', 'album', 'cover_url')
+    # Значение отсутствующего поля: cover_path, пока обложка не задана,
+    # и любое поле после del record[key]. None - обычное значение поля.
+    _MISSING = object()
+
+    __slots__ = FIELDS + ('extra',)
+
+    def __init__(self, id=None, name=None, artist=None, album=None,
+                 cover_url=None, cover_path=_MISSING, **extra):
+        self.id = id
+        self.name = name
+        self.artist = _intern(artist)
+        self.album = _intern(album)
+        self.cover_url = _intern(cover_url)
+        self.cover_path = cover_path
+        self.extra = extra or None
+
+    @classmethod
+    def from_mapping(cls, data) -> 'TrackRecord':
+        if isinstance(data, TrackRecord):
+            return data
+        return cls(**data)
+
+    def copy(self) -> 'TrackRecord':
+        """Независимая копия записи (строки общие, словарь extra копируется)."""
+        clone = TrackRecord.__new__(TrackRecord)
+        for slot in self.__slots__:
+            setattr(clone, slot, getattr(self, slot))
+        if self.extra:
+            clone.extra = dict(self.extra)
+        return clone
+
+    def _has(self, key) -> bool:
+        if key in self.FIELDS:
+            return getattr(self, key) is not self._MISSING
+        return bool(self.extra) and key in self.extra
+
+    def __getitem__(self, key):
+        if key in self.FIELDS:
+            if not self._has(key):
+                raise KeyError(key)
+            return getattr(self, key)
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key in self.FIELDS:
+            setattr(self, key, _intern(value)
+                    if key in self._INTERNED else value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __delitem__(self, key):
+        if key in self.FIELDS:
+            if not self._has(key):
+                raise KeyError(key)
+            setattr(self, key, self._MISSING)
+        elif self.extra and key in self.extra:
+            del self.extra[key]
+        else:
+            raise KeyError(key)
+
+    def __contains__(self, key) -> bool:
+        return self._has(key)
+
+    def __iter__(self):
+        for key in self.FIELDS:
+            if self._has(key):
+                yield key
+        if self.extra:
+            yield from self.extra
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __eq__(self, other):
+        if isinstance(other, (TrackRecord, dict)):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    def __repr__(self):
+        return f"TrackRecord({dict(self.items())!r})"
+
+
+if __name__ == '__main__':
+    # Сравнение памяти: словари против TrackRecord на типичной библиотеке
+    import tracemalloc
+
+    TRACKS = 60000
+    ARTISTS = 3000
+    ALBUMS = 6000
+
+    def make_source(i):
+        # Строки собираются заново для каждого трека, как при разборе ответа API
+        artist_no, album_no = i % ARTISTS, i % ALBUMS
+        return {
+            'id': f"{i:022d}",
+            'name': f"Track number {i}",
+            'artist': ''.join(['Artist ', str(artist_no)]),
+            'album': ''.join(['Album ', str(album_no)]),
+            'cover_url': ''.join(['https://i.scdn.co/image/ab67616d00004851', f"{album_no:024x}"]),
+            'cover_path': None,
+        }
+
+    def measure(factory):
+        tracemalloc.start()
+        records = [factory(make_source(i)) for i in range(TRACKS)]
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del records
+        return current
+
+    dict_bytes = measure(dict)
+    record_bytes = measure(TrackRecord.from_mapping)
+    print(f"Треков: {TRACKS}")
+    print(f"  словари:     {dict_bytes / 1024 / 1024:.1f} МБ")
+    print(f"  TrackRecord: {record_bytes / 1024 / 1024:.1f} МБ "
+          f"({record_bytes / dict_bytes:.0%} от словарей)")
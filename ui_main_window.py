@@ -76,6 +76,11 @@ class MainWindow(QMainWindow):
             qta.icon('fa5s.file-csv', color='#E0E0E0'), "")
         self.export_button.setToolTip("Экспорт в файл...")
         self.export_button.setEnabled(False)
+        self.export_library_button = QPushButton(
+            qta.icon('fa5s.archive', color='#E0E0E0'), "")
+        self.export_library_button.setToolTip(
+            "Экспорт всей библиотеки в архив...")
+        self.export_library_button.setEnabled(False)
         button_layout.addWidget(self.login_button)
         button_layout.addWidget(self.refresh_button)
         button_layout.addWidget(self.cache_all_button)
@@ -86,6 +91,7 @@ class MainWindow(QMainWindow):
         button_layout.addWidget(self.import_button)
         button_layout.addWidget(self.paste_text_button)
         button_layout.addWidget(self.export_button)
+        button_layout.addWidget(self.export_library_button)
         main_layout.addLayout(button_layout)
 
         # --- Разделитель ---